@@ -12,7 +12,10 @@ Uses:
 
 import subprocess
 import re
-from typing import List, Dict, Optional
+import socket
+import tempfile
+import threading
+from typing import Callable, List, Dict, Optional, Tuple
 import os
 
 import sys
@@ -22,16 +25,99 @@ from fantasma_core import (
     PlatformAdapter, NetworkInterface, ConnectionType,
     FantasmaConfig, NetworkMode
 )
+from fantasma_accounting import SharedFlowMonitor
+
+
+def json_key(step: Dict[str, any]) -> Tuple:
+    """Hashable identity of a journal step (ignores the pid of daemons)"""
+    return tuple(sorted((key, str(value)) for key, value in step.items() if key != 'pid'))
+
+
+class LinkEventMonitor:
+    """Reports link and address changes from `ip monitor` as adapter events"""
+
+    def __init__(self, emit: Callable[[str], None]):
+        self.emit = emit
+        self._proc: Optional[subprocess.Popen] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start the monitor thread"""
+        self._stop.clear()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        """Stop monitoring"""
+        self._stop.set()
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+        self._proc = None
+
+    def _run(self):
+        try:
+            self._proc = subprocess.Popen(
+                ['ip', '-o', 'monitor', 'link', 'address'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+        except OSError:
+            return
+        for line in self._proc.stdout:
+            if self._stop.is_set():
+                break
+            # Bridge state is part of status, so link changes affect both
+            self.emit('interfaces')
 
 
 class LinuxAdapter(PlatformAdapter):
-    """Linux-specific implementation"""
+    """
+    Linux-specific implementation
 
-    def __init__(self):
+    Each adapter instance is one sharing session. Its bridge, configuration
+    and pid files, and iptables chains are named after the session, and
+    stopping it only touches those, so sessions run side by side. The
+    default session (no session_id) keeps the historical names.
+
+    Standby (prepare) starts hostapd with its BSS disabled, dnsmasq behind
+    a DHCP drop rule, and loads the NAT chains without hooking them;
+    activate() then hooks the chains, lifts the drop rule, enables
+    forwarding and turns on beaconing.
+
+    Steps are recorded through _journal_step before they are applied, so a
+    later process can adopt the session or undo exactly those steps.
+    """
+
+    supports_standby = True
+
+    # hostapd control sockets, one per interface
+    HOSTAPD_CTRL_DIR = "/var/run/hostapd"
+
+    # Sessions in this process that need net.ipv4.ip_forward
+    _forwarding = set()
+    _forwarding_lock = threading.Lock()
+
+    def __init__(self, session_id: Optional[str] = None):
         super().__init__()
-        self.hostapd_conf = "/tmp/fantasma_hostapd.conf"
-        self.dnsmasq_conf = "/tmp/fantasma_dnsmasq.conf"
-        self.bridge_name = "br-fantasma"
+        self.session_id = session_id
+        if session_id is None:
+            prefix = "/tmp/fantasma"
+            self.bridge_name = "br-fantasma"
+            self.chain = "FANTASMA"
+        else:
+            prefix = f"/tmp/fantasma-{session_id}"
+            self.bridge_name = f"br-{session_id}"    # IFNAMSIZ: ids are at most 12 chars
+            self.chain = f"FANTASMA-{session_id}"
+        # Holds DHCP back while in standby (hooked into INPUT)
+        self.standby_chain = f"{self.chain}-SB"
+        self.hostapd_conf = f"{prefix}_hostapd.conf"
+        self.dnsmasq_conf = f"{prefix}_dnsmasq.conf"
+        self._root = self
+        self._flow_monitor: Optional[SharedFlowMonitor] = None
+
+    def for_session(self, session_id: str) -> 'LinuxAdapter':
+        """Adapter for an additional session, sharing this one's conntrack monitor"""
+        adapter = LinuxAdapter(session_id)
+        adapter._root = self._root
+        return adapter
 
     def detect_interfaces(self) -> List[NetworkInterface]:
         """Detect network interfaces using ip command"""
@@ -113,22 +199,30 @@ class LinuxAdapter(PlatformAdapter):
         
         try:
             # 1. Configure target interface
-            self._configure_interface(config.target_interface.name, "192.168.137.1")
+            self._report_progress('interface', f"Configuring {config.target_interface.name}")
+            self._configure_interface(config.target_interface.name, f"{config.gateway}/{config.network.prefixlen}")
             
             # 2. Setup DHCP server (dnsmasq)
+            self._report_progress('dhcp', "Starting dnsmasq")
             if not self._setup_dnsmasq(config):
+                self.stop_sharing()
                 return False
             
             # 3. Setup WiFi AP (hostapd) if target is WiFi
             if config.target_interface.type == ConnectionType.WIFI:
+                self._report_progress('access_point', f"Starting hostapd ({config.ssid})")
                 if not self._setup_hostapd(config):
+                    self.stop_sharing()
                     return False
             
             # 4. Enable IP forwarding
-            subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=1'], check=True)
+            self._report_progress('ip_forward', "Enabling IP forwarding")
+            self._enable_forwarding()
             
             # 5. Setup NAT with iptables
-            if not self._setup_nat_iptables(config.source_interface.name, config.target_interface.name):
+            self._report_progress('nat', f"Masquerading via {config.source_interface.name}")
+            if not self._setup_nat_iptables(config):
+                self.stop_sharing()
                 return False
             
             self.logger.info("Hotspot mode started successfully")
@@ -158,17 +252,111 @@ class LinuxAdapter(PlatformAdapter):
             self.logger.error(f"Error starting bridge: {e}")
             return False
 
+    def prepare(self, config: FantasmaConfig) -> bool:
+        """
+        Pre-warm sharing for config without serving clients
+
+        Hotspot: address configured, dnsmasq running behind a DHCP drop
+        rule, hostapd running with beacons off, NAT chains loaded but not
+        hooked. Bridge: bridge created (down, no ports) - enslaving the
+        uplink is left to activate() so the host keeps its connection.
+        """
+        self.logger.info(f"Preparing standby: {config.source_interface.name} -> {config.target_interface.name}")
+        
+        # Replace any previous standby of this session
+        for conf in (self.hostapd_conf, self.dnsmasq_conf):
+            self._kill_daemon(conf)
+        for command in self._nat_teardown_commands():
+            subprocess.run(command, capture_output=True, check=False)
+        
+        try:
+            if config.mode == NetworkMode.BRIDGE:
+                self._report_progress('bridge', f"Creating {self.bridge_name}")
+                self._journal_step('bridge', name=self.bridge_name)
+                if self._has_command('brctl'):
+                    subprocess.run(['sudo', 'brctl', 'addbr', self.bridge_name], capture_output=True, check=False)
+                else:
+                    subprocess.run(['sudo', 'ip', 'link', 'add', 'name', self.bridge_name, 'type', 'bridge'],
+                                   capture_output=True, check=False)
+                return os.path.exists(f'/sys/class/net/{self.bridge_name}')
+            
+            self._report_progress('interface', f"Configuring {config.target_interface.name}")
+            self._configure_interface(config.target_interface.name, f"{config.gateway}/{config.network.prefixlen}")
+            
+            self._report_progress('dhcp', "Starting dnsmasq (DHCP held back)")
+            self._journal_step('chain', table='filter', chain=self.standby_chain, hook='INPUT')
+            for command, fatal in self._standby_guard_commands(config):
+                subprocess.run(command, capture_output=not fatal, check=fatal)
+            if not self._setup_dnsmasq(config):
+                self.stop_sharing()
+                return False
+            
+            if config.target_interface.type == ConnectionType.WIFI:
+                self._report_progress('access_point', f"Starting hostapd ({config.ssid}) with beacons off")
+                if not self._setup_hostapd(config, standby=True):
+                    self.stop_sharing()
+                    return False
+            
+            self._report_progress('nat', "Loading NAT chains")
+            self._journal_chains()
+            for command, fatal in self._nat_chain_commands(config):
+                subprocess.run(command, capture_output=not fatal, check=fatal)
+            
+            self.logger.info("Standby prepared")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error preparing standby: {e}")
+            self.stop_sharing()
+            return False
+
+    def activate(self, config: FantasmaConfig) -> bool:
+        """Start serving the standby prepared for config"""
+        self.logger.info("Activating standby")
+        
+        try:
+            if config.mode == NetworkMode.BRIDGE:
+                return self.start_bridge(config)
+            
+            self._report_progress('nat', "Hooking NAT chains")
+            for command in self._nat_hook_commands():
+                subprocess.run(command, check=True)
+            
+            self._report_progress('ip_forward', "Enabling IP forwarding")
+            self._enable_forwarding()
+            
+            self._report_progress('dhcp', "Releasing DHCP")
+            subprocess.run(['sudo', 'iptables', '-D', 'INPUT', '-j', self.standby_chain], check=True)
+            
+            if config.target_interface.type == ConnectionType.WIFI:
+                self._report_progress('access_point', "Enabling beacons")
+                if not self._hostapd_command(config.target_interface.name, 'UPDATE_BEACON'):
+                    self.stop_sharing()
+                    return False
+            
+            self.logger.info("Standby activated")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error activating standby: {e}")
+            self.stop_sharing()
+            return False
+
     def _bridge_with_brctl(self, config: FantasmaConfig) -> bool:
         """Create bridge using brctl"""
         try:
             # Create bridge
+            self._report_progress('bridge', f"Creating {self.bridge_name} with brctl")
+            self._journal_step('bridge', name=self.bridge_name)
             subprocess.run(['sudo', 'brctl', 'addbr', self.bridge_name], check=False)
             
             # Add interfaces to bridge
+            self._report_progress('bridge_ports', f"Adding {config.source_interface.name} and {config.target_interface.name}")
             subprocess.run(['sudo', 'brctl', 'addif', self.bridge_name, config.source_interface.name], check=True)
             subprocess.run(['sudo', 'brctl', 'addif', self.bridge_name, config.target_interface.name], check=True)
             
             # Bring bridge up
+            self._report_progress('bridge_up', f"Bringing {self.bridge_name} up")
             subprocess.run(['sudo', 'ip', 'link', 'set', self.bridge_name, 'up'], check=True)
             
             self.logger.info("Bridge created with brctl")
@@ -181,13 +369,17 @@ class LinuxAdapter(PlatformAdapter):
         """Create bridge using ip command"""
         try:
             # Create bridge
+            self._report_progress('bridge', f"Creating {self.bridge_name} with ip link")
+            self._journal_step('bridge', name=self.bridge_name)
             subprocess.run(['sudo', 'ip', 'link', 'add', 'name', self.bridge_name, 'type', 'bridge'], check=False)
             
             # Add interfaces to bridge
+            self._report_progress('bridge_ports', f"Adding {config.source_interface.name} and {config.target_interface.name}")
             subprocess.run(['sudo', 'ip', 'link', 'set', config.source_interface.name, 'master', self.bridge_name], check=True)
             subprocess.run(['sudo', 'ip', 'link', 'set', config.target_interface.name, 'master', self.bridge_name], check=True)
             
             # Bring bridge up
+            self._report_progress('bridge_up', f"Bringing {self.bridge_name} up")
             subprocess.run(['sudo', 'ip', 'link', 'set', self.bridge_name, 'up'], check=True)
             
             self.logger.info("Bridge created with ip command")
@@ -197,35 +389,32 @@ class LinuxAdapter(PlatformAdapter):
             return False
 
     def stop_sharing(self) -> bool:
-        """Stop all network sharing"""
+        """Stop this session's sharing (other sessions keep running)"""
         self.logger.info("Stopping network sharing")
         
         try:
-            # Kill hostapd
-            subprocess.run(['sudo', 'killall', 'hostapd'], capture_output=True, check=False)
-            
-            # Kill dnsmasq
-            subprocess.run(['sudo', 'killall', 'dnsmasq'], capture_output=True, check=False)
+            # Kill hostapd and dnsmasq
+            self._report_progress('daemons', "Stopping hostapd and dnsmasq")
+            for conf in (self.hostapd_conf, self.dnsmasq_conf):
+                self._kill_daemon(conf)
             
             # Remove iptables rules
-            subprocess.run(
-                ['sudo', 'iptables', '-t', 'nat', '-F', 'POSTROUTING'],
-                capture_output=True, check=False
-            )
-            subprocess.run(
-                ['sudo', 'iptables', '-F', 'FORWARD'],
-                capture_output=True, check=False
-            )
+            self._report_progress('nat', "Removing NAT rules")
+            for command in self._nat_teardown_commands():
+                subprocess.run(command, capture_output=True, check=False)
             
             # Delete bridge
+            self._report_progress('bridge', f"Removing {self.bridge_name}")
             if self._has_command('brctl'):
-                subprocess.run(['sudo', 'ip', 'link', 'set', self.bridge_name, 'down'], check=False)
+                subprocess.run(['sudo', 'ip', 'link', 'set', self.bridge_name, 'down'], capture_output=True, check=False)
                 subprocess.run(['sudo', 'brctl', 'delbr', self.bridge_name], capture_output=True, check=False)
             else:
                 subprocess.run(['sudo', 'ip', 'link', 'delete', self.bridge_name], capture_output=True, check=False)
             
-            # Disable IP forwarding
-            subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=0'], check=False)
+            # Disable IP forwarding once no session needs it
+            if self._release_forwarding():
+                self._report_progress('ip_forward', "Disabling IP forwarding")
+                subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=0'], check=False)
             
             self.logger.info("Network sharing stopped")
             return True
@@ -235,86 +424,148 @@ class LinuxAdapter(PlatformAdapter):
             return False
 
     def get_status(self) -> Dict[str, any]:
-        """Get current sharing status"""
+        """
+        Get this session's sharing status
+
+        Reads pid files, /proc and /sys only - no processes are spawned, so
+        status stays cheap with many sessions.
+        """
         status = {
             'platform': 'Linux',
-            'hostapd_running': False,
-            'dnsmasq_running': False,
-            'bridge_active': False,
-            'ip_forward_enabled': False
+            'hostapd_running': self._daemon_running(self.hostapd_conf),
+            'dnsmasq_running': self._daemon_running(self.dnsmasq_conf),
+            'bridge_active': os.path.exists(f'/sys/class/net/{self.bridge_name}'),
+            'ip_forward_enabled': self._read_forwarding() == '1'
         }
         
-        # Check hostapd
-        try:
-            result = subprocess.run(['pgrep', 'hostapd'], capture_output=True)
-            status['hostapd_running'] = result.returncode == 0
-        except:
-            pass
-        
-        # Check dnsmasq
-        try:
-            result = subprocess.run(['pgrep', 'dnsmasq'], capture_output=True)
-            status['dnsmasq_running'] = result.returncode == 0
-        except:
-            pass
-        
-        # Check bridge
-        try:
-            result = subprocess.run(['ip', 'link', 'show', self.bridge_name], capture_output=True)
-            status['bridge_active'] = result.returncode == 0
-        except:
-            pass
-        
-        # Check IP forwarding
-        try:
-            with open('/proc/sys/net/ipv4/ip_forward', 'r') as f:
-                status['ip_forward_enabled'] = f.read().strip() == '1'
-        except:
-            pass
-        
         return status
 
+    def adopt(self, config: FantasmaConfig, steps: List[Dict[str, any]]) -> bool:
+        """
+        Take over a session a dead process left running if its daemons and
+        bridge are still there (pid files, /proc and /sys; nothing spawned)
+        """
+        for step in steps:
+            if step['kind'] == 'daemon' and not self._daemon_running(step['conf']):
+                return False
+            if step['kind'] == 'bridge' and not os.path.exists(f"/sys/class/net/{step['name']}"):
+                return False
+        if any(step['kind'] == 'sysctl' for step in steps):
+            self._hold_forwarding()
+        return True
+
+    def rollback(self, steps: List[Dict[str, any]]) -> bool:
+        """Undo journal steps in reverse order (each at most once)"""
+        done = set()
+        for step in reversed(steps):
+            key = json_key(step)
+            if key in done:
+                continue
+            done.add(key)
+            kind = step['kind']
+            if kind == 'daemon':
+                self._kill_daemon(step['conf'])
+            elif kind == 'chain':
+                iptables = ['sudo', 'iptables', '-t', step['table']]
+                for args in (['-D', step['hook'], '-j', step['chain']], ['-F', step['chain']], ['-X', step['chain']]):
+                    subprocess.run(iptables + args, capture_output=True, check=False)
+            elif kind == 'bridge':
+                subprocess.run(['sudo', 'ip', 'link', 'delete', step['name']], capture_output=True, check=False)
+            elif kind == 'address':
+                subprocess.run(['sudo', 'ip', 'addr', 'del', step['address'], 'dev', step['interface']],
+                               capture_output=True, check=False)
+            elif kind == 'sysctl':
+                if self._release_forwarding() and step.get('old') and step['old'] != self._read_forwarding():
+                    subprocess.run(['sudo', 'sysctl', '-w', f"{step['key']}={step['old']}"],
+                                   capture_output=True, check=False)
+        self.logger.info(f"Rolled back {len(done)} steps")
+        return True
+
     def is_supported(self) -> bool:
         """Check if running on Linux"""
         import platform
         return platform.system() == 'Linux'
 
+    def create_event_monitor(self):
+        """Link/address events from `ip monitor`"""
+        return LinkEventMonitor(self._emit_event)
+
+    def create_flow_monitor(self, callback):
+        """Feed per-client accounting from conntrack, if available (one stream for all sessions)"""
+        if not self._has_command('conntrack'):
+            self.logger.warning("conntrack not found - traffic accounting disabled")
+            return None
+        root = self._root
+        if root._flow_monitor is None:
+            from fantasma_accounting import ConntrackMonitor
+            root._flow_monitor = SharedFlowMonitor(ConntrackMonitor)
+        return root._flow_monitor.subscribe(callback)
+
+    def create_capture_monitor(self, interface, consumers, bpf_filter=None):
+        """Passive capture through an AF_PACKET TPACKET_V3 ring"""
+        from fantasma_capture import PacketCaptureMonitor, is_capture_supported
+        if not is_capture_supported():
+            self.logger.warning("AF_PACKET capture needs root - passive monitoring disabled")
+            return None
+        return PacketCaptureMonitor(interface, consumers, bpf_filter=bpf_filter)
+
+    def read_interface_counters(self) -> Dict[str, Dict[str, int]]:
+        """Counters of every interface from /proc/net/dev (one read, nothing spawned)"""
+        counters = {}
+        try:
+            with open('/proc/net/dev', 'r') as f:
+                lines = f.readlines()[2:]
+        except OSError:
+            return counters
+        for line in lines:
+            name, _, data = line.partition(':')
+            fields = data.split()
+            if len(fields) < 10:
+                continue
+            counters[name.strip()] = {
+                'rx_bytes': int(fields[0]),
+                'rx_packets': int(fields[1]),
+                'tx_bytes': int(fields[8]),
+                'tx_packets': int(fields[9])
+            }
+        return counters
+
+    def read_conntrack_usage(self) -> Optional[Tuple[int, int]]:
+        """nf_conntrack_count and nf_conntrack_max (None without the module loaded)"""
+        try:
+            with open('/proc/sys/net/netfilter/nf_conntrack_count', 'r') as f:
+                count = int(f.read())
+            with open('/proc/sys/net/netfilter/nf_conntrack_max', 'r') as f:
+                maximum = int(f.read())
+        except (OSError, ValueError):
+            return None
+        return count, maximum
+
     # Helper methods
 
-    def _configure_interface(self, interface: str, ip_address: str):
-        """Configure interface with IP address"""
+    def _configure_interface(self, interface: str, address: str):
+        """Configure interface with an address in CIDR notation"""
+        self._journal_step('address', interface=interface, address=address)
         subprocess.run(['sudo', 'ip', 'addr', 'flush', 'dev', interface], check=False)
-        subprocess.run(['sudo', 'ip', 'addr', 'add', f'{ip_address}/24', 'dev', interface], check=True)
+        subprocess.run(['sudo', 'ip', 'addr', 'add', address, 'dev', interface], check=True)
         subprocess.run(['sudo', 'ip', 'link', 'set', interface, 'up'], check=True)
 
-    def _setup_dnsmasq(self, config: FantasmaConfig) -> bool:
-        """Setup dnsmasq DHCP server"""
-        try:
-            dnsmasq_config = f"""
+    def _dnsmasq_config(self, config: FantasmaConfig) -> str:
+        """Render the dnsmasq configuration file"""
+        return f"""
 interface={config.target_interface.name}
+bind-interfaces
 dhcp-range={config.dhcp_start},{config.dhcp_end},12h
-dhcp-option=3,192.168.137.1
+dhcp-option=3,{config.gateway}
 dhcp-option=6,8.8.8.8,8.8.4.4
 """
-            with open(self.dnsmasq_conf, 'w') as f:
-                f.write(dnsmasq_config)
-            
-            subprocess.run(
-                ['sudo', 'dnsmasq', '-C', self.dnsmasq_conf, '-d'],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False
-            )
-            return True
-        except Exception as e:
-            self.logger.error(f"Error setting up dnsmasq: {e}")
-            return False
 
-    def _setup_hostapd(self, config: FantasmaConfig) -> bool:
-        """Setup hostapd for WiFi AP"""
-        try:
-            hostapd_config = f"""
+    def _hostapd_config(self, config: FantasmaConfig, standby: bool = False) -> str:
+        """Render the hostapd configuration file (standby: BSS up, no beacons)"""
+        return f"""
 interface={config.target_interface.name}
+ctrl_interface={self.HOSTAPD_CTRL_DIR}
+start_disabled={int(standby)}
 driver=nl80211
 ssid={config.ssid}
 hw_mode=g
@@ -329,44 +580,211 @@ wpa_key_mgmt=WPA-PSK
 wpa_pairwise=TKIP
 rsn_pairwise=CCMP
 """
+
+    def _setup_dnsmasq(self, config: FantasmaConfig) -> bool:
+        """Setup dnsmasq DHCP server"""
+        try:
+            with open(self.dnsmasq_conf, 'w') as f:
+                f.write(self._dnsmasq_config(config))
+            
+            self._spawn(['sudo', 'dnsmasq', '-C', self.dnsmasq_conf, '-d'], self.dnsmasq_conf)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error setting up dnsmasq: {e}")
+            return False
+
+    def _setup_hostapd(self, config: FantasmaConfig, standby: bool = False) -> bool:
+        """Setup hostapd for WiFi AP"""
+        try:
             with open(self.hostapd_conf, 'w') as f:
-                f.write(hostapd_config)
+                f.write(self._hostapd_config(config, standby))
             
-            subprocess.Popen(
-                ['sudo', 'hostapd', self.hostapd_conf],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            self._spawn(['sudo', 'hostapd', self.hostapd_conf], self.hostapd_conf)
             return True
         except Exception as e:
             self.logger.error(f"Error setting up hostapd: {e}")
             return False
 
-    def _setup_nat_iptables(self, source: str, target: str) -> bool:
+    # Chains of a session and the built-in chains that jump to them
+    NAT_HOOKS = (('nat', 'POSTROUTING'), ('filter', 'FORWARD'))
+
+    def _nat_commands(self, config: FantasmaConfig) -> List[Tuple[List[str], bool]]:
+        """
+        iptables commands (with whether failure is fatal) that set up this
+        session's NAT and forwarding rules in its own chains
+        """
+        return self._nat_chain_commands(config) + [(command, True) for command in self._nat_hook_commands()]
+
+    def _nat_chain_commands(self, config: FantasmaConfig) -> List[Tuple[List[str], bool]]:
+        """Commands loading this session's chains, left unhooked"""
+        source = config.source_interface.name
+        target = config.target_interface.name
+        chain = self.chain
+        rules = {
+            'nat': [
+                ['-s', config.ip_range, '-o', source, '-j', 'MASQUERADE']
+            ],
+            'filter': [
+                ['-i', source, '-o', target, '-m', 'state', '--state', 'RELATED,ESTABLISHED', '-j', 'ACCEPT'],
+                ['-i', target, '-o', source, '-j', 'ACCEPT']
+            ]
+        }
+        commands = []
+        for table, hook in self.NAT_HOOKS:
+            iptables = ['sudo', 'iptables', '-t', table]
+            commands.append((iptables + ['-N', chain], False))      # may already exist
+            commands.append((iptables + ['-F', chain], True))
+            commands.extend((iptables + ['-A', chain] + rule, True) for rule in rules[table])
+            commands.append((iptables + ['-D', hook, '-j', chain], False))  # no duplicate jumps
+        return commands
+
+    def _nat_hook_commands(self) -> List[List[str]]:
+        """Commands hooking this session's chains into the built-in ones"""
+        return [['sudo', 'iptables', '-t', table, '-A', hook, '-j', self.chain]
+                for table, hook in self.NAT_HOOKS]
+
+    def _standby_guard_commands(self, config: FantasmaConfig) -> List[Tuple[List[str], bool]]:
+        """Commands dropping DHCP requests on the target while in standby"""
+        iptables = ['sudo', 'iptables']
+        chain = self.standby_chain
+        return [
+            (iptables + ['-N', chain], False),
+            (iptables + ['-F', chain], True),
+            (iptables + ['-A', chain, '-i', config.target_interface.name,
+                         '-p', 'udp', '--dport', '67', '-j', 'DROP'], True),
+            (iptables + ['-D', 'INPUT', '-j', chain], False),
+            (iptables + ['-I', 'INPUT', '-j', chain], True)
+        ]
+
+    def _nat_teardown_commands(self) -> List[List[str]]:
+        """iptables commands removing this session's chains (failures are harmless)"""
+        commands = []
+        for table, hook in self.NAT_HOOKS + (('filter', 'INPUT'),):
+            chain = self.standby_chain if hook == 'INPUT' else self.chain
+            iptables = ['sudo', 'iptables', '-t', table]
+            commands.append(iptables + ['-D', hook, '-j', chain])
+            commands.append(iptables + ['-F', chain])
+            commands.append(iptables + ['-X', chain])
+        return commands
+
+    def _setup_nat_iptables(self, config: FantasmaConfig) -> bool:
         """Setup NAT using iptables"""
         try:
-            # Enable masquerading
-            subprocess.run(
-                ['sudo', 'iptables', '-t', 'nat', '-A', 'POSTROUTING', '-o', source, '-j', 'MASQUERADE'],
-                check=True
-            )
-            
-            # Allow forwarding
-            subprocess.run(
-                ['sudo', 'iptables', '-A', 'FORWARD', '-i', source, '-o', target, '-m', 'state', 
-                 '--state', 'RELATED,ESTABLISHED', '-j', 'ACCEPT'],
-                check=True
-            )
-            subprocess.run(
-                ['sudo', 'iptables', '-A', 'FORWARD', '-i', target, '-o', source, '-j', 'ACCEPT'],
-                check=True
-            )
-            
+            self._journal_chains()
+            for command, fatal in self._nat_commands(config):
+                subprocess.run(command, capture_output=not fatal, check=fatal)
             return True
         except subprocess.CalledProcessError as e:
             self.logger.error(f"Error setting up iptables: {e}")
             return False
 
+    def _journal_chains(self):
+        """Journal this session's NAT chains and their hooks"""
+        for table, hook in self.NAT_HOOKS:
+            self._journal_step('chain', table=table, chain=self.chain, hook=hook)
+
+    @staticmethod
+    def _read_forwarding() -> Optional[str]:
+        """Current net.ipv4.ip_forward ('0' or '1'), None if unreadable"""
+        try:
+            with open('/proc/sys/net/ipv4/ip_forward', 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _enable_forwarding(self):
+        """Turn on IP forwarding for this session, journaling the previous value"""
+        self._hold_forwarding()
+        self._journal_step('sysctl', key='net.ipv4.ip_forward', old=self._read_forwarding())
+        subprocess.run(['sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=1'], capture_output=True, check=True)
+
+    def _hold_forwarding(self):
+        """Record that this session needs IP forwarding"""
+        with LinuxAdapter._forwarding_lock:
+            LinuxAdapter._forwarding.add(self.chain)
+
+    def _release_forwarding(self) -> bool:
+        """Drop this session's need for IP forwarding; True if no session needs it"""
+        with LinuxAdapter._forwarding_lock:
+            LinuxAdapter._forwarding.discard(self.chain)
+            return not LinuxAdapter._forwarding
+
+    @staticmethod
+    def _pid_file(conf: str) -> str:
+        return os.path.splitext(conf)[0] + '.pid'
+
+    def _spawn(self, command: List[str], conf: str) -> subprocess.Popen:
+        """Start a sharing daemon, recording its pid next to its configuration file"""
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._journal_step('daemon', conf=conf, pid=process.pid)
+        with open(self._pid_file(conf), 'w') as f:
+            f.write(str(process.pid))
+        self._watch_process(process)
+        return process
+
+    def _daemon_running(self, conf: str) -> bool:
+        """True if the daemon started with conf is alive (pid file + /proc, no subprocess)"""
+        try:
+            with open(self._pid_file(conf)) as f:
+                pid = int(f.read())
+            # The configuration path is unique to the session, which also
+            # rules out a recycled pid
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                return conf.encode() in f.read()
+        except (OSError, ValueError):
+            return False
+
+    def _kill_daemon(self, conf: str):
+        """Kill the daemon started with conf, also if another process started it"""
+        pattern = conf.replace('.', r'\.')
+        subprocess.run(['sudo', 'pkill', '-f', pattern], capture_output=True, check=False)
+        try:
+            os.remove(self._pid_file(conf))
+        except OSError:
+            pass
+
+    def _hostapd_command(self, interface: str, command: str) -> bool:
+        """
+        Send a command to hostapd's control interface; True on "OK"
+
+        Talks to the control socket directly when it is accessible (root),
+        else goes through hostapd_cli under sudo.
+        """
+        path = os.path.join(self.HOSTAPD_CTRL_DIR, interface)
+        if os.access(path, os.W_OK):
+            local = os.path.join(tempfile.gettempdir(), f"fantasma-ctrl-{os.getpid()}-{threading.get_ident()}")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                try:
+                    sock.bind(local)
+                    sock.settimeout(5.0)
+                    sock.sendto(command.encode(), path)
+                    reply = sock.recv(4096)
+                except OSError as e:
+                    self.logger.error(f"hostapd {command} failed: {e}")
+                    return False
+                finally:
+                    try:
+                        os.remove(local)
+                    except OSError:
+                        pass
+        else:
+            result = subprocess.run(
+                ['sudo', 'hostapd_cli', '-p', self.HOSTAPD_CTRL_DIR, '-i', interface, command.lower()],
+                capture_output=True
+            )
+            reply = result.stdout
+        if reply.strip() != b'OK':
+            self.logger.error(f"hostapd {command} failed: {reply.decode(errors='replace').strip()}")
+            return False
+        return True
+
+    def _watch_process(self, process: subprocess.Popen):
+        """Emit a status event when a sharing daemon exits"""
+        def wait():
+            process.wait()
+            self._emit_event('status')
+        threading.Thread(target=wait, daemon=True).start()
+
     def _has_command(self, command: str) -> bool:
         """Check if command exists"""
         try:
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Async Linux Platform Adapter for FantasmaWiFi-Pro
+
+Native asyncio implementation of the Linux adapter:
+- Interfaces and bridge state from an rtnetlink link dump on a
+  non-blocking socket (no `ip link show` process)
+- hostapd, dnsmasq, iptables, sysctl through asyncio subprocesses
+- Independent cleanup steps run concurrently
+- Session resources (bridge, files, chains) come from the wrapped LinuxAdapter
+"""
+
+from typing import Dict, List, Optional
+import asyncio
+import shutil
+import socket
+import struct
+import subprocess
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fantasma_core import ConnectionType, FantasmaConfig, NetworkInterface
+from fantasma_async import AsyncPlatformAdapter, run_command
+from adapters.linux_adapter import LinuxAdapter
+
+_NLMSGHDR = struct.Struct('=IHHII')   # length, type, flags, seq, pid
+_IFINFOMSG = struct.Struct('=BxHiII')  # family, type, index, flags, change
+_RTATTR = struct.Struct('=HH')         # length, type
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFF_UP = 0x1
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def parse_links(data: bytes, links: List[dict]) -> bool:
+    """
+    Parse one rtnetlink datagram of RTM_NEWLINK messages into links
+
+    Returns:
+        bool: True once the dump is complete
+    """
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            return True
+        if msg_type == NLMSG_DONE:
+            return True
+        if msg_type == NLMSG_ERROR:
+            error = struct.unpack_from('=i', data, offset + _NLMSGHDR.size)[0]
+            raise OSError(-error, os.strerror(-error))
+        if msg_type == RTM_NEWLINK:
+            body = offset + _NLMSGHDR.size
+            _, _, index, flags, _ = _IFINFOMSG.unpack_from(data, body)
+            link = {'index': index, 'flags': flags, 'name': None, 'mac': None}
+            attr = body + _IFINFOMSG.size
+            end = offset + length
+            while attr + _RTATTR.size <= end:
+                attr_len, attr_type = _RTATTR.unpack_from(data, attr)
+                if attr_len < _RTATTR.size:
+                    break
+                value = data[attr + _RTATTR.size:attr + attr_len]
+                if attr_type == IFLA_IFNAME:
+                    link['name'] = value.rstrip(b'\0').decode()
+                elif attr_type == IFLA_ADDRESS:
+                    link['mac'] = ':'.join(f'{b:02x}' for b in value)
+                attr += _align(attr_len)
+            links.append(link)
+        offset += _align(length)
+    return False
+
+
+async def netlink_links() -> List[dict]:
+    """Dump all links (index, name, flags, mac) over a non-blocking rtnetlink socket"""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK, socket.NETLINK_ROUTE)
+    try:
+        sock.bind((0, 0))
+        request = _NLMSGHDR.pack(
+            _NLMSGHDR.size + _IFINFOMSG.size, RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP, 1, 0
+        ) + _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        await loop.sock_sendall(sock, request)
+        links: List[dict] = []
+        while not parse_links(await loop.sock_recv(sock, 65536), links):
+            pass
+        return links
+    finally:
+        sock.close()
+
+
+class AsyncLinuxAdapter(AsyncPlatformAdapter):
+    """Linux adapter on asyncio subprocesses and rtnetlink"""
+
+    adapter: LinuxAdapter
+
+    def __init__(self, adapter: Optional[LinuxAdapter] = None):
+        super().__init__(adapter or LinuxAdapter())
+        self._children: List[asyncio.subprocess.Process] = []
+
+    async def detect_interfaces(self) -> List[NetworkInterface]:
+        """Detect network interfaces from an rtnetlink link dump"""
+        try:
+            links = await netlink_links()
+        except OSError as e:
+            self.logger.error(f"Error detecting interfaces: {e}")
+            return []
+
+        interfaces = []
+        for link in links:
+            name = link['name']
+            # Skip loopback and virtual interfaces
+            if not name or name == 'lo' or name.startswith('vir'):
+                continue
+            interface = NetworkInterface(
+                name=name,
+                type=self.adapter._determine_interface_type(name),
+                mac_address=link['mac']
+            )
+            interface.is_active = bool(link['flags'] & IFF_UP)
+            interfaces.append(interface)
+
+        self.logger.info(f"Detected {len(interfaces)} interfaces")
+        return interfaces
+
+    async def get_status(self) -> Dict[str, any]:
+        """Get this session's sharing status (pid files, /proc and /sys; nothing to await)"""
+        return self.adapter.get_status()
+
+    async def start_hotspot(self, config: FantasmaConfig) -> bool:
+        """Start hotspot mode using hostapd + dnsmasq + iptables"""
+        source = config.source_interface.name
+        target = config.target_interface.name
+        self.logger.info(f"Starting hotspot mode: {source} -> {target}")
+        progress = self.adapter._report_progress
+
+        try:
+            # 1. Configure target interface
+            progress('interface', f"Configuring {target}")
+            await run_command('sudo', 'ip', 'addr', 'flush', 'dev', target)
+            address = f"{config.gateway}/{config.network.prefixlen}"
+            self.adapter._journal_step('address', interface=target, address=address)
+            await run_command('sudo', 'ip', 'addr', 'add', address, 'dev', target, check=True)
+            await run_command('sudo', 'ip', 'link', 'set', target, 'up', check=True)
+
+            # 2. Setup DHCP server (dnsmasq)
+            progress('dhcp', "Starting dnsmasq")
+            with open(self.adapter.dnsmasq_conf, 'w') as f:
+                f.write(self.adapter._dnsmasq_config(config))
+            await self._spawn(self.adapter.dnsmasq_conf, 'sudo', 'dnsmasq', '-C', self.adapter.dnsmasq_conf, '-d')
+
+            # 3. Setup WiFi AP (hostapd) if target is WiFi
+            if config.target_interface.type == ConnectionType.WIFI:
+                progress('access_point', f"Starting hostapd ({config.ssid})")
+                with open(self.adapter.hostapd_conf, 'w') as f:
+                    f.write(self.adapter._hostapd_config(config))
+                await self._spawn(self.adapter.hostapd_conf, 'sudo', 'hostapd', self.adapter.hostapd_conf)
+
+            # 4. Enable IP forwarding
+            progress('ip_forward', "Enabling IP forwarding")
+            self.adapter._hold_forwarding()
+            self.adapter._journal_step('sysctl', key='net.ipv4.ip_forward', old=self.adapter._read_forwarding())
+            await run_command('sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=1', check=True)
+
+            # 5. Setup NAT with iptables (in this session's chains)
+            progress('nat', f"Masquerading via {source}")
+            self.adapter._journal_chains()
+            for command, fatal in self.adapter._nat_commands(config):
+                await run_command(*command, check=fatal)
+
+            self.logger.info("Hotspot mode started successfully")
+            return True
+
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.error(f"Error starting hotspot: {e}")
+            await self.stop_sharing()
+            return False
+
+    async def start_bridge(self, config: FantasmaConfig) -> bool:
+        """Start bridge mode using brctl or ip link"""
+        bridge = self.adapter.bridge_name
+        source = config.source_interface.name
+        target = config.target_interface.name
+        self.logger.info(f"Starting bridge mode: {source} <-> {target}")
+
+        progress = self.adapter._report_progress
+        try:
+            progress('bridge', f"Creating {bridge}")
+            self.adapter._journal_step('bridge', name=bridge)
+            if shutil.which('brctl'):
+                await run_command('sudo', 'brctl', 'addbr', bridge)
+                await run_command('sudo', 'brctl', 'addif', bridge, source, check=True)
+                await run_command('sudo', 'brctl', 'addif', bridge, target, check=True)
+            else:
+                await run_command('sudo', 'ip', 'link', 'add', 'name', bridge, 'type', 'bridge')
+                await run_command('sudo', 'ip', 'link', 'set', source, 'master', bridge, check=True)
+                await run_command('sudo', 'ip', 'link', 'set', target, 'master', bridge, check=True)
+            progress('bridge_up', f"Bringing {bridge} up")
+            await run_command('sudo', 'ip', 'link', 'set', bridge, 'up', check=True)
+
+            self.logger.info("Bridge created")
+            return True
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.error(f"Error starting bridge: {e}")
+            return False
+
+    async def stop_sharing(self) -> bool:
+        """Stop this session's sharing; independent cleanup steps run concurrently"""
+        self.logger.info("Stopping network sharing")
+        adapter = self.adapter
+        bridge = adapter.bridge_name
+
+        async def kill_daemon(conf: str):
+            await run_command('sudo', 'pkill', '-f', conf.replace('.', r'\.'))
+            try:
+                os.remove(adapter._pid_file(conf))
+            except OSError:
+                pass
+
+        async def remove_chains():
+            # Sequential: iptables serializes on the xtables lock anyway
+            for command in adapter._nat_teardown_commands():
+                await run_command(*command)
+
+        async def delete_bridge():
+            if shutil.which('brctl'):
+                await run_command('sudo', 'ip', 'link', 'set', bridge, 'down')
+                await run_command('sudo', 'brctl', 'delbr', bridge)
+            else:
+                await run_command('sudo', 'ip', 'link', 'delete', bridge)
+
+        async def release_forwarding():
+            if adapter._release_forwarding():
+                await run_command('sudo', 'sysctl', '-w', 'net.ipv4.ip_forward=0')
+
+        adapter._report_progress('cleanup', "Stopping daemons, NAT rules, bridge and forwarding")
+        results = await asyncio.gather(
+            kill_daemon(adapter.hostapd_conf),
+            kill_daemon(adapter.dnsmasq_conf),
+            remove_chains(),
+            delete_bridge(),
+            release_forwarding(),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            self.logger.error(f"Error stopping sharing: {errors[0]}")
+            return False
+
+        self.logger.info("Network sharing stopped")
+        return True
+
+    async def _spawn(self, conf: str, *args: str):
+        """Start a long-running daemon, record its pid and emit a status event when it exits"""
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.adapter._journal_step('daemon', conf=conf, pid=process.pid)
+        with open(self.adapter._pid_file(conf), 'w') as f:
+            f.write(str(process.pid))
+        self._children.append(process)
+
+        async def watch():
+            await process.wait()
+            self._children.remove(process)
+            self.adapter._emit_event('status')
+        asyncio.ensure_future(watch())
+
+
+if __name__ == "__main__":
+    # Test adapter
+    import logging
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        adapter = AsyncLinuxAdapter()
+        interfaces, status = await asyncio.gather(adapter.detect_interfaces(), adapter.get_status())
+        print("Interfaces:")
+        for iface in interfaces:
+            print(f"  {iface}")
+        print(f"\nStatus: {status}")
+
+    asyncio.run(main())
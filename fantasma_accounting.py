@@ -0,0 +1,479 @@
+"""
+FantasmaWiFi-Pro Traffic Accounting
+Per-client byte/packet totals and rates with bounded memory
+
+Flow observations (conntrack NEW/UPDATE/DESTROY events or periodic table
+dumps) are turned into counter deltas by a bounded FlowTable and folded into
+one fixed-size account per client. Each account keeps running totals plus a
+ring of per-interval byte/packet buckets, so memory depends only on
+max_clients, max_flows and the ring size - never on how many flows pass.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+import ipaddress
+import logging
+import re
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FlowEvent:
+    """A single conntrack flow observation with cumulative counters"""
+    event: str  # 'new', 'update' or 'destroy'
+    protocol: str
+    src: str
+    dst: str
+    sport: int = 0
+    dport: int = 0
+    orig_packets: int = 0
+    orig_bytes: int = 0
+    reply_packets: int = 0
+    reply_bytes: int = 0
+    flow_id: Optional[int] = None
+    timestamp: float = 0.0
+
+
+_KV_RE = re.compile(r'(\w+)=(\S+)')
+_EVENT_RE = re.compile(r'\[(NEW|UPDATE|DESTROY)\]')
+_PROTOCOLS = ('tcp', 'udp', 'icmp', 'icmpv6', 'sctp', 'dccp', 'gre', 'udplite')
+
+
+def parse_conntrack_line(line: str, timestamp: Optional[float] = None) -> Optional[FlowEvent]:
+    """
+    Parse one line of `conntrack -L` / `conntrack -E` output
+
+    The first src/dst/sport/dport/packets/bytes group belongs to the original
+    direction, the second one to the reply direction.
+
+    Returns:
+        FlowEvent, or None if the line is not a flow entry
+    """
+    protocol = next((tok for tok in line.split() if tok in _PROTOCOLS), None)
+    if protocol is None:
+        return None
+
+    match = _EVENT_RE.search(line)
+    event = match.group(1).lower() if match else 'update'
+
+    orig: Dict[str, str] = {}
+    reply: Dict[str, str] = {}
+    flow_id = None
+    for key, value in _KV_RE.findall(line):
+        if key == 'id':
+            flow_id = int(value) if value.isdigit() else None
+        elif key in ('src', 'dst', 'sport', 'dport', 'packets', 'bytes'):
+            (orig if key not in orig else reply).setdefault(key, value)
+
+    if 'src' not in orig or 'dst' not in orig:
+        return None
+
+    def as_int(fields: Dict[str, str], key: str) -> int:
+        value = fields.get(key, '0')
+        return int(value) if value.isdigit() else 0
+
+    return FlowEvent(
+        event=event,
+        protocol=protocol,
+        src=orig['src'],
+        dst=orig['dst'],
+        sport=as_int(orig, 'sport'),
+        dport=as_int(orig, 'dport'),
+        orig_packets=as_int(orig, 'packets'),
+        orig_bytes=as_int(orig, 'bytes'),
+        reply_packets=as_int(reply, 'packets'),
+        reply_bytes=as_int(reply, 'bytes'),
+        flow_id=flow_id,
+        timestamp=timestamp if timestamp is not None else time.time()
+    )
+
+
+class ClientAccount:
+    """Totals and a ring of per-interval rate buckets for one client"""
+
+    __slots__ = (
+        'client', 'first_seen', 'last_seen',
+        'tx_bytes', 'rx_bytes', 'tx_packets', 'rx_packets',
+        '_bucket_seconds', '_epochs', '_tx', '_rx', '_pkts'
+    )
+
+    def __init__(self, client: str, bucket_seconds: float, buckets: int, now: float):
+        self.client = client
+        self.first_seen = now
+        self.last_seen = now
+        self.tx_bytes = 0  # client -> internet (original direction)
+        self.rx_bytes = 0  # internet -> client (reply direction)
+        self.tx_packets = 0
+        self.rx_packets = 0
+        self._bucket_seconds = bucket_seconds
+        self._epochs = [-1] * buckets
+        self._tx = [0] * buckets
+        self._rx = [0] * buckets
+        self._pkts = [0] * buckets
+
+    def add(self, tx_bytes: int, rx_bytes: int, tx_packets: int, rx_packets: int, now: float):
+        """Account a byte/packet delta observed at `now`"""
+        self.tx_bytes += tx_bytes
+        self.rx_bytes += rx_bytes
+        self.tx_packets += tx_packets
+        self.rx_packets += rx_packets
+        self.last_seen = now
+
+        epoch = int(now // self._bucket_seconds)
+        slot = epoch % len(self._epochs)
+        if self._epochs[slot] != epoch:
+            self._epochs[slot] = epoch
+            self._tx[slot] = self._rx[slot] = self._pkts[slot] = 0
+        self._tx[slot] += tx_bytes
+        self._rx[slot] += rx_bytes
+        self._pkts[slot] += tx_packets + rx_packets
+
+    def window(self, seconds: float, now: float) -> Dict[str, float]:
+        """Sum the buckets that fall inside the last `seconds` seconds"""
+        current = int(now // self._bucket_seconds)
+        count = max(1, min(len(self._epochs), int(round(seconds / self._bucket_seconds))))
+        oldest = current - count + 1
+        tx = rx = pkts = 0
+        for slot, epoch in enumerate(self._epochs):
+            if oldest <= epoch <= current:
+                tx += self._tx[slot]
+                rx += self._rx[slot]
+                pkts += self._pkts[slot]
+        span = count * self._bucket_seconds
+        return {
+            'window_seconds': span,
+            'tx_bytes': tx,
+            'rx_bytes': rx,
+            'packets': pkts,
+            'tx_bps': tx * 8 / span,
+            'rx_bps': rx * 8 / span
+        }
+
+    def to_dict(self, now: float) -> Dict[str, float]:
+        """Point-in-time totals plus the rate over the last completed bucket"""
+        previous = self.window(self._bucket_seconds * 2, now)
+        current = self.window(self._bucket_seconds, now)
+        return {
+            'client': self.client,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'tx_bytes': self.tx_bytes,
+            'rx_bytes': self.rx_bytes,
+            'tx_packets': self.tx_packets,
+            'rx_packets': self.rx_packets,
+            'tx_bps': (previous['tx_bytes'] - current['tx_bytes']) * 8 / self._bucket_seconds,
+            'rx_bps': (previous['rx_bytes'] - current['rx_bytes']) * 8 / self._bucket_seconds
+        }
+
+
+class FlowTable:
+    """
+    Turns cumulative conntrack counters into per-observation deltas
+
+    Holds the last seen counters of at most max_flows flows; the least
+    recently updated flows are dropped first.
+    """
+
+    def __init__(self, max_flows: int = 65536):
+        self.max_flows = max_flows
+        self._lock = threading.Lock()
+        self._flows: 'OrderedDict[tuple, tuple]' = OrderedDict()
+
+    def observe(self, event: FlowEvent) -> FlowEvent:
+        """Return a copy of event whose counters are deltas since the last observation"""
+        key = (event.flow_id, event.protocol, event.src, event.sport, event.dst, event.dport)
+        counters = (event.orig_bytes, event.reply_bytes, event.orig_packets, event.reply_packets)
+
+        with self._lock:
+            seen = self._flows.pop(key, (0, 0, 0, 0))
+            if event.event != 'destroy':
+                self._flows[key] = counters
+                while len(self._flows) > self.max_flows:
+                    self._flows.popitem(last=False)
+
+        # A counter below the last one was reset (conntrack -Z, or the id
+        # reused by a new flow): it counts from zero again
+        deltas = [current - last if current >= last else current for current, last in zip(counters, seen)]
+        return replace(
+            event,
+            orig_bytes=deltas[0],
+            reply_bytes=deltas[1],
+            orig_packets=deltas[2],
+            reply_packets=deltas[3],
+            timestamp=event.timestamp or time.time()
+        )
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def clear(self):
+        """Forget all tracked flows"""
+        with self._lock:
+            self._flows.clear()
+
+
+class TrafficAccountant:
+    """
+    Aggregates flow deltas (see FlowTable) into per-client accounts
+
+    Memory is bounded by max_clients accounts; the least recently seen
+    clients are evicted first, as are clients idle longer than idle_timeout.
+    """
+
+    def __init__(
+        self,
+        subnet: str = "192.168.137.0/24",
+        bucket_seconds: float = 10.0,
+        buckets: int = 60,
+        max_clients: int = 1024,
+        idle_timeout: float = 600.0
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.evicted_clients = 0
+        self._lock = threading.Lock()
+        self._clients: 'OrderedDict[str, ClientAccount]' = OrderedDict()
+        self.set_subnet(subnet)
+
+    def set_subnet(self, subnet: str):
+        """Set the shared subnet used to tell clients from remote hosts"""
+        self._network = ipaddress.ip_network(subnet, strict=False)
+
+    def _client_of(self, event: FlowEvent) -> Optional[str]:
+        try:
+            if ipaddress.ip_address(event.src) in self._network:
+                return event.src
+        except ValueError:
+            pass
+        return None
+
+    def process_event(self, delta: FlowEvent):
+        """Fold one flow delta into its client's account"""
+        client = self._client_of(delta)
+        if client is None:
+            return
+        self.account(
+            client, delta.orig_bytes, delta.reply_bytes,
+            delta.orig_packets, delta.reply_packets, delta.timestamp or time.time()
+        )
+
+    def account(self, client: str, tx_bytes: int, rx_bytes: int,
+                tx_packets: int, rx_packets: int, now: float):
+        """
+        Add a byte/packet delta to a client's account
+
+        Args:
+            client: Client key (IP address, or MAC address for captured frames)
+        """
+        with self._lock:
+            account = self._clients.get(client)
+            if account is None:
+                account = ClientAccount(client, self.bucket_seconds, self.buckets, now)
+                self._clients[client] = account
+                self._evict(now)
+            else:
+                self._clients.move_to_end(client)
+            account.add(tx_bytes, rx_bytes, tx_packets, rx_packets, now)
+
+    def _evict(self, now: float):
+        """Drop idle clients and enforce max_clients (caller holds the lock)"""
+        while self._clients:
+            oldest = next(iter(self._clients.values()))
+            if len(self._clients) <= self.max_clients and now - oldest.last_seen < self.idle_timeout:
+                break
+            del self._clients[oldest.client]
+            self.evicted_clients += 1
+
+    def expire_idle(self, now: Optional[float] = None):
+        """Evict clients that have been idle longer than idle_timeout"""
+        with self._lock:
+            self._evict(now or time.time())
+
+    def get_client(self, client: str, window: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """
+        Get accounting data for one client
+
+        Args:
+            client: Client IP address
+            window: Optional window in seconds; adds a 'window' section
+        """
+        now = time.time()
+        with self._lock:
+            account = self._clients.get(client)
+            if account is None:
+                return None
+            data = account.to_dict(now)
+            if window:
+                data['window'] = account.window(window, now)
+        return data
+
+    def get_clients(self, window: Optional[float] = None) -> List[Dict[str, float]]:
+        """Get accounting data for all tracked clients"""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            clients = []
+            for account in self._clients.values():
+                data = account.to_dict(now)
+                if window:
+                    data['window'] = account.window(window, now)
+                clients.append(data)
+        return clients
+
+    def get_summary(self) -> Dict[str, int]:
+        """Get accountant bookkeeping counters"""
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'evicted_clients': self.evicted_clients,
+                'max_clients': self.max_clients
+            }
+
+    def reset(self):
+        """Forget all clients"""
+        with self._lock:
+            self._clients.clear()
+
+
+class ConntrackMonitor:
+    """
+    Feeds FlowEvents from the Linux conntrack table
+
+    Runs `conntrack -E` for NEW/DESTROY events (final counters need
+    net.netfilter.nf_conntrack_acct=1) and periodically dumps the table with
+    `conntrack -L` so long-lived flows report rates before they end.
+    """
+
+    def __init__(self, callback: Callable[[FlowEvent], None], poll_interval: float = 10.0):
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._events_proc: Optional[subprocess.Popen] = None
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Start event and polling threads"""
+        self._stop.clear()
+        subprocess.run(
+            ['sudo', 'sysctl', '-w', 'net.netfilter.nf_conntrack_acct=1'],
+            capture_output=True, check=False
+        )
+        self._threads = [
+            threading.Thread(target=self._event_loop, daemon=True),
+            threading.Thread(target=self._poll_loop, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop monitoring"""
+        self._stop.set()
+        if self._events_proc and self._events_proc.poll() is None:
+            self._events_proc.terminate()
+        self._events_proc = None
+
+    def _emit(self, line: str):
+        event = parse_conntrack_line(line)
+        if event:
+            try:
+                self.callback(event)
+            except Exception as e:
+                logger.error(f"Error processing flow event: {e}")
+
+    def _event_loop(self):
+        try:
+            self._events_proc = subprocess.Popen(
+                ['sudo', 'conntrack', '-E', '-e', 'NEW,DESTROY', '-o', 'extended,id'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+        except OSError as e:
+            logger.error(f"Cannot start conntrack event stream: {e}")
+            return
+
+        for line in self._events_proc.stdout:
+            if self._stop.is_set():
+                break
+            self._emit(line)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                result = subprocess.run(
+                    ['sudo', 'conntrack', '-L', '-o', 'extended,id'],
+                    capture_output=True, text=True, timeout=self.poll_interval
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.error(f"Error dumping conntrack table: {e}")
+                continue
+            for line in result.stdout.split('\n'):
+                self._emit(line)
+
+
+class SharedFlowMonitor:
+    """
+    One flow monitor fanned out to several subscribers
+
+    Concurrent sharing sessions all watch the same host conntrack table.
+    Subscribing them to one underlying monitor (created by factory(callback)
+    on the first start, stopped after the last stop) avoids one event stream
+    and one table dump per session. Each subscriber's TrafficAccountant
+    keeps only its own subnet.
+    """
+
+    def __init__(self, factory: Callable[[Callable[[FlowEvent], None]], object]):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[FlowEvent], None]] = []
+        self._monitor = None
+
+    def subscribe(self, callback: Callable[[FlowEvent], None]) -> 'FlowSubscription':
+        """Monitor-like handle (start/stop) delivering events to callback"""
+        return FlowSubscription(self, callback)
+
+    def _add(self, callback: Callable[[FlowEvent], None]):
+        with self._lock:
+            # Copy on write: _dispatch iterates without the lock
+            self._subscribers = self._subscribers + [callback]
+            if self._monitor is None:
+                self._monitor = self.factory(self._dispatch)
+                self._monitor.start()
+
+    def _remove(self, callback: Callable[[FlowEvent], None]):
+        with self._lock:
+            self._subscribers = [cb for cb in self._subscribers if cb is not callback]
+            if not self._subscribers and self._monitor is not None:
+                self._monitor.stop()
+                self._monitor = None
+
+    def _dispatch(self, event: FlowEvent):
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Error processing flow event: {e}")
+
+
+class FlowSubscription:
+    """A subscriber's handle on a SharedFlowMonitor"""
+
+    def __init__(self, shared: SharedFlowMonitor, callback: Callable[[FlowEvent], None]):
+        self.shared = shared
+        self.callback = callback
+        self._started = False
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            self.shared._add(self.callback)
+
+    def stop(self):
+        if self._started:
+            self._started = False
+            self.shared._remove(self.callback)
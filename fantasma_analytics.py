@@ -0,0 +1,285 @@
+"""
+FantasmaWiFi-Pro Streaming Analytics
+Heavy-hitter detection over the flow event stream with fixed memory
+
+- CountMinSketch: frequency estimates for any key (never underestimates)
+- SpaceSaving: top-k candidates with per-entry error bounds
+- HeavyHitterTracker: top talkers, destinations and ports over a ring of
+  mergeable time windows
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import heapq
+import math
+import threading
+import time
+
+from fantasma_accounting import FlowEvent
+
+
+class CountMinSketch:
+    """Count-Min sketch with depth rows of width counters"""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> 'CountMinSketch':
+        """
+        Size a sketch so estimates exceed the true count by at most
+        epsilon * total with probability 1 - delta
+        """
+        return cls(width=math.ceil(math.e / epsilon), depth=math.ceil(math.log(1 / delta)))
+
+    def _indexes(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.width for i in range(self.depth))
+
+    def add(self, key: str, count: int = 1):
+        """Add count occurrences of key"""
+        self.total += count
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += count
+
+    def estimate(self, key: str) -> int:
+        """Estimated count of key"""
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def merge(self, other: 'CountMinSketch'):
+        """Add another sketch of identical shape into this one"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge sketches of different shapes")
+        self.total += other.total
+        for row, other_row in zip(self._rows, other._rows):
+            for i, value in enumerate(other_row):
+                if value:
+                    row[i] += value
+
+    def memory_bytes(self) -> int:
+        """Approximate memory used by the counters"""
+        return self.width * self.depth * 8
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary
+
+    Keeps at most capacity counters. A new key replaces the smallest counter
+    and inherits its count as error, so count - error is a guaranteed lower
+    bound and count an upper bound of the true frequency.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._counts: Dict[str, List[int]] = {}  # key -> [count, error]
+        self._heap: List[Tuple[int, str]] = []   # lazy min-heap of (count, key)
+
+    def add(self, key: str, count: int = 1):
+        """Add count occurrences of key"""
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = [count, 0]
+        else:
+            floor, victim = self._pop_min()
+            del self._counts[victim]
+            self._counts[key] = [floor + count, floor]
+        heapq.heappush(self._heap, (self._counts[key][0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(entry[0], k) for k, entry in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self._counts.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+
+    def min_count(self) -> int:
+        """Smallest tracked count (0 while the summary is not full)"""
+        if len(self._counts) < self.capacity:
+            return 0
+        return min(entry[0] for entry in self._counts.values())
+
+    def merge(self, other: 'SpaceSaving'):
+        """Merge another summary into this one, keeping the top capacity keys"""
+        own_floor, other_floor = self.min_count(), other.min_count()
+        merged: Dict[str, List[int]] = {}
+        for key in set(self._counts) | set(other._counts):
+            mine = self._counts.get(key, [own_floor, own_floor])
+            theirs = other._counts.get(key, [other_floor, other_floor])
+            merged[key] = [mine[0] + theirs[0], mine[1] + theirs[1]]
+        top = heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0])
+        self._counts = {key: entry for key, entry in top}
+        self._heap = [(entry[0], key) for key, entry in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """Top k entries as (key, count, error), largest first"""
+        return [
+            (key, entry[0], entry[1])
+            for key, entry in heapq.nlargest(k, self._counts.items(), key=lambda item: item[1][0])
+        ]
+
+    def copy(self) -> 'SpaceSaving':
+        """Independent copy of this summary"""
+        clone = SpaceSaving(self.capacity)
+        clone._counts = {key: list(entry) for key, entry in self._counts.items()}
+        clone._heap = list(self._heap)
+        return clone
+
+    def memory_entries(self) -> int:
+        """Number of tracked counters"""
+        return len(self._counts)
+
+
+class _WindowSummary:
+    """Sketches for one time window and all dimensions"""
+
+    def __init__(self, epoch: int, capacity: int, width: int, depth: int):
+        self.epoch = epoch
+        self.summaries = {dim: SpaceSaving(capacity) for dim in HeavyHitterTracker.DIMENSIONS}
+        self.sketches = {dim: CountMinSketch(width, depth) for dim in HeavyHitterTracker.DIMENSIONS}
+
+
+class HeavyHitterTracker:
+    """
+    Top talkers, destinations and ports over a sliding set of windows
+
+    Memory is fixed at windows x dimensions x (capacity counters + one
+    width x depth Count-Min sketch), independent of the number of flows.
+    Queries merge the windows they cover, so any span up to
+    windows x window_seconds can be answered.
+    """
+
+    DIMENSIONS = ('talkers', 'destinations', 'ports')
+
+    def __init__(
+        self,
+        capacity: int = 64,
+        epsilon: float = 0.005,
+        delta: float = 0.01,
+        window_seconds: float = 60.0,
+        windows: int = 10
+    ):
+        self.capacity = capacity
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.events = 0
+        self._lock = threading.Lock()
+        self._ring: List[Optional[_WindowSummary]] = [None] * windows
+
+    @staticmethod
+    def keys_for(event: FlowEvent) -> Dict[str, str]:
+        """Map a flow to its key in each dimension"""
+        return {
+            'talkers': event.src,
+            'destinations': event.dst,
+            'ports': f"{event.protocol}/{event.dport}"
+        }
+
+    def _window_for(self, now: float) -> _WindowSummary:
+        epoch = int(now // self.window_seconds)
+        slot = epoch % self.windows
+        window = self._ring[slot]
+        if window is None or window.epoch != epoch:
+            window = _WindowSummary(epoch, self.capacity, self.width, self.depth)
+            self._ring[slot] = window
+        return window
+
+    def process_event(self, delta: FlowEvent):
+        """Account the bytes of one flow delta (see FlowTable)"""
+        weight = delta.orig_bytes + delta.reply_bytes
+        if weight <= 0:
+            return
+        with self._lock:
+            self.events += 1
+            window = self._window_for(delta.timestamp or time.time())
+            for dimension, key in self.keys_for(delta).items():
+                window.summaries[dimension].add(key, weight)
+                window.sketches[dimension].add(key, weight)
+
+    def _covering(self, seconds: Optional[float], now: float) -> List[_WindowSummary]:
+        current = int(now // self.window_seconds)
+        count = self.windows if not seconds else max(1, min(self.windows, math.ceil(seconds / self.window_seconds)))
+        return [
+            window for window in self._ring
+            if window is not None and current - count < window.epoch <= current
+        ]
+
+    def top(self, dimension: str = 'talkers', k: int = 10, window: Optional[float] = None) -> List[Dict[str, int]]:
+        """
+        Top k keys in a dimension
+
+        Args:
+            dimension: 'talkers', 'destinations' or 'ports'
+            k: Number of entries to return (at most capacity)
+            window: Seconds to look back; None covers all retained windows
+
+        Returns:
+            List of dicts with key, bytes (upper bound) and error
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+
+        with self._lock:
+            covered = self._covering(window, time.time())
+            if not covered:
+                return []
+            merged = covered[0].summaries[dimension].copy()
+            sketch = CountMinSketch(self.width, self.depth)
+            for part in covered:
+                sketch.merge(part.sketches[dimension])
+            for part in covered[1:]:
+                merged.merge(part.summaries[dimension])
+
+        results = []
+        for key, count, error in merged.top(k):
+            estimate = min(count, sketch.estimate(key))
+            results.append({
+                'key': key,
+                'bytes': estimate,
+                'error': min(error, estimate)
+            })
+        return results
+
+    def estimate(self, dimension: str, key: str, window: Optional[float] = None) -> int:
+        """Estimated bytes for any key, tracked in the top-k or not"""
+        with self._lock:
+            return sum(
+                part.sketches[dimension].estimate(key)
+                for part in self._covering(window, time.time())
+            )
+
+    def get_summary(self) -> Dict[str, int]:
+        """Sizing and memory figures for the tracker"""
+        with self._lock:
+            live = [window for window in self._ring if window is not None]
+        per_window = len(self.DIMENSIONS) * (self.width * self.depth * 8)
+        return {
+            'events': self.events,
+            'capacity': self.capacity,
+            'sketch_width': self.width,
+            'sketch_depth': self.depth,
+            'window_seconds': self.window_seconds,
+            'windows': self.windows,
+            'live_windows': len(live),
+            'sketch_bytes': per_window * len(live)
+        }
+
+    def reset(self):
+        """Drop all windows"""
+        with self._lock:
+            self._ring = [None] * self.windows
+            self.events = 0
@@ -1,80 +1,327 @@
 """
 FantasmaWiFi-Pro REST API Module
 Enhanced API with authentication and rate limiting
+
+Keys and rate limits are per process unless enable_shared_state() attaches
+the shared backends (fantasma_shared), as multi-worker deployments need.
 """
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from functools import wraps
-from flask import request, jsonify
+from flask import g, has_request_context, request, jsonify
+import math
 import time
 import hashlib
+import hmac
+import os
 import secrets
-from typing import Dict, Callable
+import threading
+from typing import Any, Dict, Callable, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Key scopes: read (status endpoints), control (start/stop/configure),
+# admin (key management)
+SCOPES = ('read', 'control', 'admin')
+
+# Keys are fwp_<key id><secret>; the key id is public and indexes the store
+KEY_PREFIX = 'fwp_'
+KEY_ID_LENGTH = 8
+
+
+def _key_id(key: str) -> str:
+    return key[len(KEY_PREFIX):len(KEY_PREFIX) + KEY_ID_LENGTH]
+
+
+def _hash_key(key: str, salt: str) -> str:
+    # Keys carry 256 random bits, so a salted SHA-256 is enough: slow
+    # password hashes only help against guessable secrets
+    return hashlib.sha256(bytes.fromhex(salt) + key.encode()).hexdigest()
+
+
 class APIAuth:
-    """Simple API authentication system"""
+    """
+    API key authentication with a hashed key store
+
+    Only a salted hash of each key is kept (and persisted), indexed by the
+    key's public id: a lookup is one dict access plus a constant-time
+    compare. Keys that verified recently are remembered in a small LRU
+    cache, so a request costs a dict lookup and the expiry/scope checks.
+
+    Args:
+        cache_size: Verified keys remembered (least recently used dropped)
+    """
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
+        # Called after keys are created, revoked or restored (e.g. to persist them)
+        self.listeners: List[Callable[[], None]] = []
+        # Shared KeyStore (fantasma_shared) and the generation api_keys reflects
+        self._store = None
+        self._generation = None
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        # key -> key id, for keys that verified
+        self._verified: 'OrderedDict[str, str]' = OrderedDict()
+        # key id -> [requests, last used], since the last persist
+        self._usage: Dict[str, list] = {}
+        # key id -> record (name, salt, hash, scopes, expiry, ...); no plaintext
         self.api_keys: Dict[str, dict] = {}
-        self.default_key = self._generate_key()
-        self.api_keys[self.default_key] = {
-            'name': 'default',
+        # Plaintext default key: only known to the process that generated it
+        self.default_key: Optional[str] = self._generate_key()
+        self.default_key_id = _key_id(self.default_key)
+        self.api_keys[self.default_key_id] = self._record(self.default_key, 'default', 'default', SCOPES, None)
+        logger.info(f"Default API key generated: {self.default_key}")
+
+    def _changed(self):
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Error in API key listener: {e}")
+
+    @staticmethod
+    def _record(key: str, name: str, tier: str, scopes, expires: Optional[float]) -> dict:
+        salt = secrets.token_hex(16)
+        return {
+            'key_id': _key_id(key),
+            'name': name,
+            'salt': salt,
+            'hash': _hash_key(key, salt),
             'created': time.time(),
-            'enabled': True
+            'enabled': True,
+            'tier': tier,
+            'scopes': list(scopes),
+            'expires': expires,
+            'requests': 0,
+            'last_used': None
         }
-        logger.info(f"Default API key generated: {self.default_key}")
+
+    @classmethod
+    def _normalize(cls, keys: Dict[str, dict]) -> Dict[str, dict]:
+        """Records by key id; plaintext-keyed entries of older versions are hashed"""
+        records = {}
+        for key, info in keys.items():
+            if 'hash' in info:
+                records[key] = info
+                continue
+            record = cls._record(key, info.get('name', ''), info.get('tier', 'default'),
+                                 SCOPES if info.get('name') == 'default' else ('read', 'control'), None)
+            record['created'] = info.get('created', record['created'])
+            record['enabled'] = info.get('enabled', True)
+            records[record['key_id']] = record
+        return records
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Hashed keys with usage counters, for persisting"""
+        self._refresh()
+        with self._lock:
+            keys = {key_id: dict(record) for key_id, record in self.api_keys.items()}
+            for key_id, (requests, last_used) in self._usage.items():
+                if key_id in keys:
+                    keys[key_id]['requests'] += requests
+                    keys[key_id]['last_used'] = last_used
+        return {'default_key_id': self.default_key_id, 'keys': keys}
+
+    def attach_store(self, store):
+        """
+        Keep keys in a KeyStore shared with other processes
+
+        The first process to attach stores its keys; the others adopt them
+        (default key included).
+        """
+        self._store = store
+        store.initialize(self.default_key_id, self.api_keys)
+        self._refresh()
+        logger.info(f"Using shared API keys at {store.path}")
+
+    def _refresh(self):
+        # One memory read when nothing changed
+        if self._store is not None and self._store.generation != self._generation:
+            generation, default_key_id, keys = self._store.load()
+            with self._lock:
+                self.api_keys = self._normalize(keys)
+                self._adopt_default(default_key_id)
+                self._verified.clear()
+                self._generation = generation
+
+    def _adopt_default(self, default_key_id: Optional[str]):
+        if default_key_id and default_key_id != self.default_key_id:
+            self.default_key_id = default_key_id
+            self.default_key = None
+
+    def restore(self, data: Dict[str, Any]):
+        """Replace all keys with ones saved by to_dict() (or by older versions)"""
+        if self._store is not None:
+            # The shared store is authoritative
+            return
+        if not data.get('keys'):
+            return
+        default_key_id = data.get('default_key_id') or _key_id(data.get('default_key') or '')
+        with self._lock:
+            self.api_keys = self._normalize(data['keys'])
+            self._adopt_default(default_key_id)
+            self._verified.clear()
+            self._usage.clear()
+        logger.info(f"Restored {len(self.api_keys)} API keys")
     
     def _generate_key(self) -> str:
         """Generate a secure API key"""
-        # Using URL-safe base64 encoding for randomness
-        # Note: prefix helps identify keys but is not security-critical
-        return f"fwp_{secrets.token_urlsafe(32)}"
+        # Prefix identifies Fantasma keys; the key id after it is public
+        while True:
+            key = f"{KEY_PREFIX}{secrets.token_hex(KEY_ID_LENGTH // 2)}{secrets.token_urlsafe(32)}"
+            if _key_id(key) not in self.api_keys:
+                return key
+
+    def _save(self, key_id: str):
+        if self._store is not None:
+            self._store.put(key_id, self.api_keys[key_id])
+            self._refresh()
+        self._changed()
     
-    def create_key(self, name: str) -> str:
-        """Create a new API key"""
+    def create_key(self, name: str, tier: str = 'default', scopes=('read', 'control'),
+                   expires_in: Optional[float] = None) -> str:
+        """
+        Create a new API key (tier selects its rate limit)
+
+        Returns the key itself; only its hash is kept, so this is the one
+        time it can be shown.
+        """
+        unknown = set(scopes) - set(SCOPES)
+        if unknown:
+            raise ValueError(f"Unknown scopes: {', '.join(sorted(unknown))}")
+        self._refresh()
         key = self._generate_key()
-        self.api_keys[key] = {
-            'name': name,
-            'created': time.time(),
-            'enabled': True
-        }
+        expires = time.time() + expires_in if expires_in else None
+        record = self._record(key, name, tier, scopes, expires)
+        with self._lock:
+            self.api_keys[record['key_id']] = record
+        self._save(record['key_id'])
         return key
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        """Record of a valid (verified) key, else None"""
+        with self._lock:
+            key_id = self._verified.get(key)
+            if key_id is not None:
+                self._verified.move_to_end(key)
+        if key_id is None:
+            if not key.startswith(KEY_PREFIX):
+                return None
+            key_id = _key_id(key)
+            record = self.api_keys.get(key_id)
+            if record is None or not hmac.compare_digest(record['hash'], _hash_key(key, record['salt'])):
+                return None
+            with self._lock:
+                self._verified[key] = key_id
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return self.api_keys.get(key_id)
+
+    def check_key(self, key: str, scope: Optional[str] = None) -> Optional[str]:
+        """
+        Authorize a request made with key (and needing scope)
+
+        Returns None if allowed, else why not. Counts the request.
+        """
+        self._refresh()
+        record = self._lookup(key)
+        if record is None or not record.get('enabled', False):
+            return 'The provided API key is invalid or has been revoked'
+        now = time.time()
+        if record.get('expires') and now >= record['expires']:
+            return 'The provided API key has expired'
+        if scope is not None and scope not in record.get('scopes', SCOPES):
+            return f"The provided API key lacks the '{scope}' scope"
+        with self._lock:
+            usage = self._usage.setdefault(record['key_id'], [0, None])
+            usage[0] += 1
+            usage[1] = now
+        return None
     
     def validate_key(self, key: str) -> bool:
         """Validate an API key"""
-        if key in self.api_keys:
-            return self.api_keys[key].get('enabled', False)
-        return False
+        return self.check_key(key) is None
+
+    def get_key_info(self, key: str) -> Optional[dict]:
+        """Record of a genuine key, or None (no expiry or scope checks, not counted)"""
+        self._refresh()
+        return self._lookup(key)
     
     def revoke_key(self, key: str) -> bool:
-        """Revoke an API key"""
-        if key in self.api_keys:
-            self.api_keys[key]['enabled'] = False
-            return True
-        return False
+        """Revoke an API key (the key itself or its key id)"""
+        self._refresh()
+        key_id = _key_id(key) if key.startswith(KEY_PREFIX) else key
+        with self._lock:
+            record = self.api_keys.get(key_id)
+            if record is None:
+                return False
+            record['enabled'] = False
+            self._verified.clear()
+        self._save(key_id)
+        return True
     
     def list_keys(self) -> list:
-        """List all API keys"""
+        """List all API keys (ids and metadata; no secrets)"""
+        keys = self.to_dict()['keys']
         return [
             {
-                'key': key[:20] + '...',  # Mask the key
+                'key_id': key_id,
+                'key': f"{KEY_PREFIX}{key_id}...",  # Mask the key
                 'name': info['name'],
                 'created': info['created'],
-                'enabled': info['enabled']
+                'enabled': info['enabled'],
+                'tier': info.get('tier', 'default'),
+                'scopes': info.get('scopes', list(SCOPES)),
+                'expires': info.get('expires'),
+                'requests': info.get('requests', 0),
+                'last_used': info.get('last_used')
             }
-            for key, info in self.api_keys.items()
+            for key_id, info in keys.items()
         ]
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Issued keys and verification cache size"""
+        with self._lock:
+            return {'keys': len(self.api_keys), 'verified_cache': len(self._verified),
+                    'cache_size': self.cache_size}
+
 
 class RateLimiter:
-    """Simple rate limiting system"""
+    """
+    Token-bucket rate limiting per client (API key, else IP address)
+
+    Each client's bucket holds up to its tier's per-minute limit and refills
+    continuously at limit/60 tokens per second, so a request costs O(1):
+    refill by elapsed time, take a token. Buckets are kept in LRU order and
+    capped at max_clients; a bucket idle long enough to be full again is
+    indistinguishable from a new one and is dropped first.
+
+    Args:
+        requests_per_minute: Limit of the 'default' tier
+        tiers: Per-minute limits by tier name (API keys carry a 'tier')
+        max_clients: Buckets kept at most (least recently used dropped)
+    """
     
-    def __init__(self, requests_per_minute: int = 60):
+    def __init__(self, requests_per_minute: int = 60, tiers: Optional[Dict[str, int]] = None,
+                 max_clients: int = 10000):
         self.requests_per_minute = requests_per_minute
-        self.request_history: Dict[str, list] = {}
+        self.tiers = {'default': requests_per_minute}
+        self.tiers.update(tiers or {})
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        # client id -> [tokens, last refill time, limit]
+        self._buckets: 'OrderedDict[str, list]' = OrderedDict()
+        self.evicted = 0
+        # Shared BucketTable (fantasma_shared) replacing _buckets
+        self._table = None
+    
+    def attach_table(self, table):
+        """Keep buckets in a BucketTable shared with other processes"""
+        self._table = table
+        logger.info(f"Using shared rate limits at {table.path}")
     
     def _get_client_id(self, request) -> str:
         """Get client identifier from request"""
@@ -84,38 +331,87 @@ class RateLimiter:
             return hashlib.sha256(api_key.encode()).hexdigest()[:16]
         return request.remote_addr or 'unknown'
     
-    def _cleanup_history(self, client_id: str):
-        """Remove old requests from history"""
-        if client_id in self.request_history:
-            current_time = time.time()
-            # Keep only requests from the last minute
-            self.request_history[client_id] = [
-                t for t in self.request_history[client_id]
-                if current_time - t < 60
-            ]
+    def get_limit(self, request) -> int:
+        """Per-minute limit for the request's client (by its API key's tier)"""
+        info = api_auth.get_key_info(request.headers.get('X-API-Key', ''))
+        tier = info.get('tier', 'default') if info else 'default'
+        return self.tiers.get(tier, self.tiers['default'])
     
-    def is_allowed(self, request) -> bool:
-        """Check if request is allowed based on rate limit"""
-        client_id = self._get_client_id(request)
-        self._cleanup_history(client_id)
-        
-        if client_id not in self.request_history:
-            self.request_history[client_id] = []
-        
-        # Check if limit exceeded
-        if len(self.request_history[client_id]) >= self.requests_per_minute:
-            return False
+    def _refill(self, bucket: list, now: float):
+        tokens, last, limit = bucket
+        bucket[0] = min(float(limit), tokens + (now - last) * limit / 60.0)
+        bucket[1] = now
+    
+    def _evict(self, now: float):
+        # Oldest first: drop buckets that have refilled completely, and
+        # anything beyond max_clients
+        while self._buckets:
+            client_id, (tokens, last, limit) = next(iter(self._buckets.items()))
+            full = tokens + (now - last) * limit / 60.0 >= limit
+            if not full and len(self._buckets) <= self.max_clients:
+                break
+            del self._buckets[client_id]
+            self.evicted += 1
+    
+    def check(self, request) -> Tuple[bool, int, int, float]:
+        """
+        Take a token for the request if one is available
         
-        # Record this request
-        self.request_history[client_id].append(time.time())
-        return True
+        Returns:
+            (allowed, limit, remaining, retry_after): retry_after is the
+            seconds until the next token (0 when allowed)
+        """
+        client_id = self._get_client_id(request)
+        limit = self.get_limit(request)
+        if self._table is not None:
+            # fcntl locks exclude other processes, not threads of this one
+            with self._lock:
+                allowed, remaining, retry_after = self._table.take(client_id, limit, time.time())
+            return allowed, limit, remaining, retry_after
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None or bucket[2] != limit:
+                bucket = self._buckets[client_id] = [float(limit), now, limit]
+            else:
+                self._buckets.move_to_end(client_id)
+                self._refill(bucket, now)
+            allowed = bucket[0] >= 1.0
+            if allowed:
+                bucket[0] -= 1.0
+            remaining = int(bucket[0])
+            retry_after = 0.0 if allowed else (1.0 - bucket[0]) * 60.0 / limit
+            self._evict(now)
+        return allowed, limit, remaining, retry_after
+    
+    def is_allowed(self, request) -> bool:
+        """Check if request is allowed based on rate limit (takes a token)"""
+        return self.check(request)[0]
     
     def get_remaining(self, request) -> int:
-        """Get remaining requests for client"""
+        """Get remaining requests for client (takes no token)"""
         client_id = self._get_client_id(request)
-        self._cleanup_history(client_id)
-        used = len(self.request_history.get(client_id, []))
-        return max(0, self.requests_per_minute - used)
+        limit = self.get_limit(request)
+        with self._lock:
+            if self._table is not None:
+                return self._table.peek(client_id, limit, time.time())
+            bucket = self._buckets.get(client_id)
+            if bucket is None or bucket[2] != limit:
+                return limit
+            tokens, last, _ = bucket
+            return int(min(float(limit), tokens + (time.monotonic() - last) * limit / 60.0))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Tracked clients, cap, evictions and tiers"""
+        if self._table is not None:
+            return dict(self._table.get_stats(), tiers=dict(self.tiers))
+        with self._lock:
+            return {
+                'clients': len(self._buckets),
+                'max_clients': self.max_clients,
+                'evicted': self.evicted,
+                'tiers': dict(self.tiers)
+            }
 
 
 # Global instances
@@ -123,53 +419,107 @@ api_auth = APIAuth()
 rate_limiter = RateLimiter(requests_per_minute=60)
 
 
-def require_api_key(f: Callable) -> Callable:
-    """Decorator to require API key authentication"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        
-        if not api_key:
-            return jsonify({
-                'error': 'API key required',
-                'message': 'Include X-API-Key header with your API key'
-            }), 401
-        
-        if not api_auth.validate_key(api_key):
-            return jsonify({
-                'error': 'Invalid API key',
-                'message': 'The provided API key is invalid or has been revoked'
-            }), 403
+def enable_shared_state(directory: str):
+    """
+    Share API keys and rate limits with the other processes using directory
+    (POSIX only: fcntl locks and shared memory maps)
+    """
+    from fantasma_shared import BucketTable, KeyStore
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    rate_limiter.attach_table(BucketTable(os.path.join(directory, 'ratelimit.bin')))
+    api_auth.attach_store(KeyStore(os.path.join(directory, 'apikeys.db')))
+
+
+@contextmanager
+def timed_phase(name: str):
+    """Add the time spent in the block to the request's phase (see fantasma_metrics)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            phases = g.setdefault('phases_ms', {})
+            phases[name] = phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def auth_error(scope: str, required: bool = True):
+    """
+    Error response for the request's API key, or None if it may proceed
+
+    Args:
+        scope: Scope the key needs
+        required: False to let requests without a key through
+    """
+    api_key = request.headers.get('X-API-Key')
+    
+    if not api_key:
+        if not required:
+            return None
+        return jsonify({
+            'error': 'API key required',
+            'message': 'Include X-API-Key header with your API key'
+        }), 401
+    
+    with timed_phase('auth'):
+        error = api_auth.check_key(api_key, scope)
+    if error:
+        return jsonify({
+            'error': 'Invalid API key',
+            'message': error
+        }), 403
+    return None
+
+
+def require_scope(scope: str) -> Callable[[Callable], Callable]:
+    """Decorator factory requiring an API key with scope"""
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            error = auth_error(scope)
+            if error:
+                return error
+            
+            return f(*args, **kwargs)
         
-        return f(*args, **kwargs)
+        return decorated_function
     
-    return decorated_function
+    return decorator
+
+
+def require_api_key(f: Callable) -> Callable:
+    """Decorator to require API key authentication (control scope)"""
+    return require_scope('control')(f)
 
 
 def rate_limit(f: Callable) -> Callable:
     """Decorator to apply rate limiting"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not rate_limiter.is_allowed(request):
-            return jsonify({
+        with timed_phase('rate_limit'):
+            allowed, limit, remaining, retry_after = rate_limiter.check(request)
+        if not allowed:
+            seconds = math.ceil(retry_after)
+            response = jsonify({
                 'error': 'Rate limit exceeded',
-                'message': f'Maximum {rate_limiter.requests_per_minute} requests per minute',
-                'retry_after': 60
-            }), 429
+                'message': f'Maximum {limit} requests per minute',
+                'retry_after': seconds
+            })
+            response.headers['Retry-After'] = str(seconds)
+            response.headers['X-RateLimit-Limit'] = str(limit)
+            response.headers['X-RateLimit-Remaining'] = '0'
+            return response, 429
         
         # Add rate limit headers
         response = f(*args, **kwargs)
-        if isinstance(response, tuple):
-            response_obj, status_code = response[0], response[1]
-        else:
-            response_obj, status_code = response, 200
+        response_obj = response[0] if isinstance(response, tuple) else response
         
-        # Add headers if response is a Flask response object
+        # Add headers if response is a Flask response object (keeping its
+        # status, e.g. 304 Not Modified)
         if hasattr(response_obj, 'headers'):
-            response_obj.headers['X-RateLimit-Limit'] = str(rate_limiter.requests_per_minute)
-            response_obj.headers['X-RateLimit-Remaining'] = str(rate_limiter.get_remaining(request))
+            response_obj.headers['X-RateLimit-Limit'] = str(limit)
+            response_obj.headers['X-RateLimit-Remaining'] = str(remaining)
         
-        return response if isinstance(response, tuple) else (response_obj, status_code)
+        return response
     
     return decorated_function
 
@@ -178,13 +528,9 @@ def optional_auth(f: Callable) -> Callable:
     """Decorator for optional authentication (doesn't block if no key)"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        
-        if api_key and not api_auth.validate_key(api_key):
-            return jsonify({
-                'error': 'Invalid API key',
-                'message': 'The provided API key is invalid or has been revoked'
-            }), 403
+        error = auth_error('read', required=False)
+        if error:
+            return error
         
         return f(*args, **kwargs)
     
@@ -0,0 +1,318 @@
+"""
+FantasmaWiFi-Pro Async Core
+asyncio variants of the adapter protocol and FantasmaCore
+
+- AsyncPlatformAdapter: adapter ABC with coroutine methods, plus
+  run_command() built on asyncio.create_subprocess_exec
+- ExecutorAdapter: runs any synchronous PlatformAdapter in a thread pool
+- AsyncFantasmaCore: async start/stop/get_status/detect_interfaces over the
+  state of an existing FantasmaCore, so sync and async callers share one
+  session, one probe cache and one set of monitors
+- LoopThread: an event loop in a background thread with a blocking run(),
+  the sync facade for callers outside asyncio
+
+The synchronous FantasmaCore stays the API for existing callers.
+"""
+
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import concurrent.futures
+import logging
+import subprocess
+import threading
+
+from fantasma_core import (
+    FantasmaConfig,
+    FantasmaCore,
+    NetworkInterface,
+    NetworkMode,
+    PlatformAdapter
+)
+
+logger = logging.getLogger(__name__)
+
+CommandResult = namedtuple('CommandResult', 'returncode stdout stderr')
+
+
+async def run_command(*args: str, check: bool = False, timeout: Optional[float] = 30.0,
+                      capture: bool = True) -> CommandResult:
+    """
+    Run a command without blocking the event loop
+
+    Raises:
+        subprocess.CalledProcessError: check is True and the command failed
+        subprocess.TimeoutExpired: the command ran longer than timeout
+    """
+    output = subprocess.PIPE if capture else subprocess.DEVNULL
+    process = await asyncio.create_subprocess_exec(*args, stdout=output, stderr=output)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(list(args), timeout)
+
+    result = CommandResult(
+        process.returncode,
+        stdout.decode(errors='replace') if stdout else '',
+        stderr.decode(errors='replace') if stderr else ''
+    )
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, list(args), result.stdout, result.stderr)
+    return result
+
+
+class AsyncPlatformAdapter(ABC):
+    """
+    Async counterpart of PlatformAdapter
+
+    Wraps the synchronous adapter of the same platform, which keeps
+    providing the parts that do not block (event listeners, monitors,
+    configuration rendering).
+    """
+
+    def __init__(self, adapter: PlatformAdapter):
+        self.adapter = adapter
+        self.logger = adapter.logger
+
+    @abstractmethod
+    async def detect_interfaces(self) -> List[NetworkInterface]:
+        """Detect available network interfaces on the system"""
+        pass
+
+    @abstractmethod
+    async def start_hotspot(self, config: FantasmaConfig) -> bool:
+        """Start hotspot/NAT mode"""
+        pass
+
+    @abstractmethod
+    async def start_bridge(self, config: FantasmaConfig) -> bool:
+        """Start bridge mode (Layer 2 forwarding)"""
+        pass
+
+    @abstractmethod
+    async def stop_sharing(self) -> bool:
+        """Stop all network sharing"""
+        pass
+
+    @abstractmethod
+    async def get_status(self) -> Dict[str, Any]:
+        """Get current sharing status"""
+        pass
+
+    async def prepare(self, config: FantasmaConfig) -> bool:
+        """Pre-warm sharing (see PlatformAdapter.prepare); the sync adapter's in a thread"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.adapter.prepare, config)
+
+    async def activate(self, config: FantasmaConfig) -> bool:
+        """Serve a prepared standby (see PlatformAdapter.activate); the sync adapter's in a thread"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.adapter.activate, config)
+
+
+class ExecutorAdapter(AsyncPlatformAdapter):
+    """Runs a synchronous adapter's blocking methods in a thread pool"""
+
+    def __init__(self, adapter: PlatformAdapter,
+                 executor: Optional[concurrent.futures.Executor] = None):
+        super().__init__(adapter)
+        self.executor = executor
+
+    async def _call(self, method: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def detect_interfaces(self) -> List[NetworkInterface]:
+        return await self._call(self.adapter.detect_interfaces)
+
+    async def start_hotspot(self, config: FantasmaConfig) -> bool:
+        return await self._call(self.adapter.start_hotspot, config)
+
+    async def start_bridge(self, config: FantasmaConfig) -> bool:
+        return await self._call(self.adapter.start_bridge, config)
+
+    async def stop_sharing(self) -> bool:
+        return await self._call(self.adapter.stop_sharing)
+
+    async def get_status(self) -> Dict[str, Any]:
+        return await self._call(self.adapter.get_status)
+
+    async def prepare(self, config: FantasmaConfig) -> bool:
+        return await self._call(self.adapter.prepare, config)
+
+    async def activate(self, config: FantasmaConfig) -> bool:
+        return await self._call(self.adapter.activate, config)
+
+
+def get_async_adapter(adapter: PlatformAdapter) -> AsyncPlatformAdapter:
+    """Native async adapter for the platform, or an ExecutorAdapter"""
+    from adapters.linux_adapter import LinuxAdapter
+    if type(adapter) is LinuxAdapter:
+        from adapters.linux_async_adapter import AsyncLinuxAdapter
+        return AsyncLinuxAdapter(adapter)
+    return ExecutorAdapter(adapter)
+
+
+class AsyncFantasmaCore:
+    """
+    Async view of a FantasmaCore
+
+    Shares the core's session state and mutation queue, probe cache and
+    monitors. Concurrent probes for the same cache key on the event loop
+    share a single task.
+    """
+
+    def __init__(self, core: FantasmaCore, adapter: Optional[AsyncPlatformAdapter] = None):
+        self.core = core
+        self.adapter = adapter or get_async_adapter(core.adapter)
+        self.logger = logging.getLogger("AsyncFantasmaCore")
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def config(self) -> Optional[FantasmaConfig]:
+        return self.core.config
+
+    @property
+    def is_active(self) -> bool:
+        return self.core.is_active
+
+    async def _cached(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        cache = self.core.cache
+        hit, value = cache.lookup(key)
+        if hit:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            cache.record(key, 'coalesced')
+        else:
+            cache.record(key, 'misses')
+            generation = value
+            task = self._inflight[key] = asyncio.ensure_future(loader())
+
+            def done(finished: asyncio.Future):
+                self._inflight.pop(key, None)
+                if finished.cancelled() or finished.exception() is not None:
+                    cache.record(key, 'errors')
+                else:
+                    cache.store(key, finished.result(), generation)
+            task.add_done_callback(done)
+
+        # Shield so one cancelled caller does not cancel the shared probe
+        return await asyncio.shield(task)
+
+    async def detect_interfaces(self) -> List[NetworkInterface]:
+        """Detect available network interfaces (cached)"""
+        return list(await self._cached('interfaces', self.adapter.detect_interfaces))
+
+    async def get_status(self) -> Dict[str, Any]:
+        """Get current status (adapter probe cached)"""
+        status = dict(await self._cached('status', self.adapter.get_status))
+        status['is_active'] = self.core.is_active
+        status['state'] = self.core.state.value
+        status['config'] = self.core.config
+        status['latency'] = self.core.cache.get('latency', self.core.latency.get_summary)
+        return status
+
+    async def start(self, config: FantasmaConfig,
+                    progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Start network sharing through the core's mutation queue"""
+        if not config.validate():
+            self.logger.error("Invalid configuration")
+            return False
+        return await self._wait(self.core.enqueue('start', config, self._run(self._adapter_start), progress))
+
+    async def prepare(self, config: FantasmaConfig,
+                      progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Pre-warm a standby through the core's mutation queue"""
+        if not config.validate():
+            self.logger.error("Invalid configuration")
+            return False
+        return await self._wait(self.core.enqueue('prepare', config, self._run(self._adapter_prepare), progress))
+
+    async def stop(self, progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Stop network sharing through the core's mutation queue"""
+        return await self._wait(self.core.enqueue('stop', None, self._run(self._adapter_stop), progress))
+
+    async def reconfigure(self, config: FantasmaConfig,
+                          progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Switch configuration: stop and start queued back to back"""
+        if not config.validate():
+            self.logger.error("Invalid configuration")
+            return False
+        return await self._wait(self.core.enqueue_reconfigure(
+            config, self._run(self._adapter_stop), self._run(self._adapter_start), progress
+        ))
+
+    async def _adapter_start(self, config: FantasmaConfig) -> bool:
+        if self.core.warm_start:
+            return await self.adapter.activate(config)
+        if config.mode == NetworkMode.HOTSPOT:
+            return await self.adapter.start_hotspot(config)
+        elif config.mode == NetworkMode.BRIDGE:
+            return await self.adapter.start_bridge(config)
+        self.logger.error(f"Unknown mode: {config.mode}")
+        return False
+
+    async def _adapter_prepare(self, config: FantasmaConfig) -> bool:
+        return await self.adapter.prepare(config)
+
+    async def _adapter_stop(self, config: None) -> bool:
+        return await self.adapter.stop_sharing()
+
+    def _run(self, runner: Callable[[Optional[FantasmaConfig]], Awaitable[bool]]) -> Callable:
+        """
+        Wrap an adapter coroutine as a core runner
+
+        The queue is drained in an executor thread, which runs the adapter
+        coroutine back on this loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        def run(operation_config):
+            return asyncio.run_coroutine_threadsafe(runner(operation_config), loop).result()
+        return run
+
+    async def _wait(self, operation) -> bool:
+        """Drain the core's queue and wait for operation without holding a thread"""
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        operation.add_done_callback(
+            lambda finished: loop.call_soon_threadsafe(
+                lambda: result.done() or result.set_result(finished.result)
+            )
+        )
+        await loop.run_in_executor(None, self.core.drain)
+        return await result
+
+
+class LoopThread:
+    """
+    An asyncio event loop running in a daemon thread
+
+    Lets threaded code (Flask handlers, the CLI) submit coroutines to one
+    shared loop, where independent operations overlap.
+    """
+
+    def __init__(self, name: str = 'fantasma-asyncio'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait for its result"""
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        """Stop the loop and its thread"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
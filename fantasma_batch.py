@@ -0,0 +1,160 @@
+"""
+FantasmaWiFi-Pro Batch
+Several API operations in one request
+
+A batch is an ordered list of operations, each {"op": <name>, "args":
+{...}, "id": <optional name, without '/'>}. It is validated as a whole (known operations,
+unique ids, references only to earlier operations) before anything runs,
+then executed in order; by default the first failure skips the rest.
+
+An argument may reference an earlier operation's result with
+{"$ref": "<id>/<JSON pointer>"}, e.g. {"$ref": "load/profile/ssid"}; a
+bare "<id>" is the whole result.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Scopes in increasing order (see fantasma_api.SCOPES)
+_SCOPE_ORDER = ('read', 'control', 'admin')
+
+
+class BatchError(Exception):
+    """An invalid batch, or an operation that failed"""
+
+
+class Operation:
+    """
+    A batch operation
+
+    Args:
+        handler: Callable(args) returning a JSON-ready result; raises
+            BatchError (or anything else) on failure
+        scope: API key scope the operation needs
+        mutating: Changes sharing state (the batch then runs as a job)
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], scope: str = 'read',
+                 mutating: bool = False):
+        self.handler = handler
+        self.scope = scope
+        self.mutating = mutating
+
+
+def _refs(value: Any):
+    # Every {"$ref": ...} in value
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            yield value['$ref']
+        else:
+            for item in value.values():
+                yield from _refs(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _refs(item)
+
+
+def parse(body: Any, operations: Dict[str, Operation], max_operations: int = 50) -> List[Dict[str, Any]]:
+    """
+    Validate a batch request body ({"operations": [...]})
+
+    Returns:
+        Steps [{id, op, args}] in order
+
+    Raises:
+        BatchError: what is wrong with the batch
+    """
+    items = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('Expected {"operations": [...]} with at least one operation')
+    if len(items) > max_operations:
+        raise BatchError(f'Too many operations ({len(items)}, max {max_operations})')
+
+    steps = []
+    seen = set()
+    for index, item in enumerate(items):
+        op = item.get('op') if isinstance(item, dict) else None
+        # Check the type first: a list or object op is not hashable
+        if not isinstance(op, str) or op not in operations:
+            raise BatchError(f'Operation {index}: unknown op {op if isinstance(item, dict) else item!r}')
+        step_id = str(item.get('id', index))
+        if '/' in step_id:
+            # A $ref splits at the first '/', so such an id could never be referenced
+            raise BatchError(f'Operation {index}: id "{step_id}" must not contain "/"')
+        if step_id in seen:
+            raise BatchError(f'Operation {index}: duplicate id "{step_id}"')
+        args = item.get('args', {})
+        if not isinstance(args, dict):
+            raise BatchError(f'Operation {index}: args must be an object')
+        for ref in _refs(args):
+            if not isinstance(ref, str) or ref.split('/')[0] not in seen:
+                raise BatchError(f'Operation {index}: $ref {ref!r} does not name an earlier operation')
+        seen.add(step_id)
+        steps.append({'id': step_id, 'op': op, 'args': args})
+    return steps
+
+
+def required_scope(steps: List[Dict[str, Any]], operations: Dict[str, Operation]) -> str:
+    """The broadest scope any step needs"""
+    return max((operations[step['op']].scope for step in steps), key=_SCOPE_ORDER.index)
+
+
+def is_mutating(steps: List[Dict[str, Any]], operations: Dict[str, Operation]) -> bool:
+    """True if any step changes sharing state"""
+    return any(operations[step['op']].mutating for step in steps)
+
+
+def resolve(value: Any, results: Dict[str, Any]) -> Any:
+    """value with every {"$ref": ...} replaced by the referenced result"""
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            step_id, *pointer = value['$ref'].split('/')
+            if step_id not in results:
+                raise BatchError(f'$ref {value["$ref"]!r}: operation "{step_id}" has no result')
+            target = results[step_id]
+            for token in pointer:
+                token = token.replace('~1', '/').replace('~0', '~')
+                try:
+                    target = target[int(token)] if isinstance(target, list) else target[token]
+                except (KeyError, IndexError, ValueError, TypeError):
+                    raise BatchError(f'$ref {value["$ref"]!r} not found in the result')
+            return target
+        return {key: resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    return value
+
+
+def run(steps: List[Dict[str, Any]], operations: Dict[str, Operation], stop_on_error: bool = True,
+        progress: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+    """
+    Execute steps in order
+
+    Returns:
+        {"success": bool, "results": [{id, op, status, result | error}]},
+        status being 'ok', 'error' or 'skipped'
+    """
+    results: Dict[str, Any] = {}
+    report = []
+    failed = False
+    for step in steps:
+        entry = {'id': step['id'], 'op': step['op']}
+        report.append(entry)
+        if failed and stop_on_error:
+            entry['status'] = 'skipped'
+            continue
+        if progress:
+            progress('batch', f"{step['id']}: {step['op']}")
+        try:
+            result = operations[step['op']].handler(resolve(step['args'], results))
+        except Exception as e:
+            if not isinstance(e, BatchError):
+                logger.error(f"Batch operation {step['op']} failed: {e}")
+            entry.update(status='error', error=str(e))
+            failed = True
+            continue
+        results[step['id']] = result
+        entry.update(status='ok', result=result)
+    return {'success': not failed, 'results': report}
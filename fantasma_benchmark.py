@@ -5,6 +5,7 @@ Measures performance metrics for different configurations
 """
 
 import time
+import random
 import subprocess
 import statistics
 import json
@@ -28,11 +29,28 @@ class BenchmarkResult:
     error: str = ""
 
 
+@dataclass
+class SketchBenchmarkResult:
+    """Store heavy-hitter sketch benchmark results"""
+    flows: int
+    distinct_clients: int
+    capacity: int
+    epsilon: float
+    events_per_second: float
+    sketch_bytes: int
+    precision: float  # fraction of reported top-k that are true top-k
+    recall: float     # fraction of true top-k that were reported
+    max_relative_error: float
+    max_error_bytes: int  # largest |estimate - exact| among the reported top-k
+    total_bytes: int      # N, the bytes in the trace (error bound is epsilon * N)
+
+
 class FantasmaBenchmark:
     """Benchmark tool for FantasmaWiFi-Pro"""
     
     def __init__(self):
         self.results: List[BenchmarkResult] = []
+        self.sketch_results: List[SketchBenchmarkResult] = []
         self.platform = self._detect_platform()
     
     def _detect_platform(self) -> str:
@@ -172,6 +190,225 @@ class FantasmaBenchmark:
             print(f"    Warning: Could not measure resources: {e}")
             return 0.0, 0.0
     
+    def _synthetic_flow_trace(self, flows: int, clients: int, skew: float = 1.2, seed: int = 42):
+        """Generate a Zipf-distributed synthetic flow trace"""
+        from fantasma_accounting import FlowEvent
+        
+        rng = random.Random(seed)
+        weights = [1.0 / (rank ** skew) for rank in range(1, clients + 1)]
+        sources = [f"192.168.{137 + i // 250}.{i % 250 + 2}" for i in range(clients)]
+        destinations = [f"203.0.{i // 256}.{i % 256}" for i in range(clients * 4)]
+        ports = [443, 80, 53, 123, 993, 5228, 1935, 8080]
+        
+        picked = rng.choices(range(clients), weights=weights, k=flows)
+        return [
+            FlowEvent(
+                event='destroy',
+                protocol='tcp',
+                src=sources[index],
+                dst=destinations[(index * 4 + rng.randrange(4)) % len(destinations)],
+                sport=rng.randrange(1024, 65535),
+                dport=ports[index % len(ports)],
+                orig_bytes=rng.randrange(200, 2000),
+                reply_bytes=rng.randrange(500, 50000),
+                timestamp=0.0
+            )
+            for index in picked
+        ]
+    
+    def benchmark_heavy_hitters(self, flows: int = 200000, clients: int = 5000,
+                                capacity: int = 64, epsilon: float = 0.005, k: int = 10):
+        """
+        Measure heavy-hitter tracker throughput, memory and accuracy
+        
+        Args:
+            flows: Number of synthetic flow events
+            clients: Number of distinct clients in the trace
+            capacity: Space-Saving counters per window and dimension
+            epsilon: Count-Min error bound (fraction of total bytes)
+            k: Size of the top-k compared against the exact answer
+        """
+        from fantasma_analytics import HeavyHitterTracker
+        
+        print(f"  Benchmarking heavy hitters ({flows} flows, {clients} clients, "
+              f"capacity={capacity}, epsilon={epsilon})...")
+        
+        trace = self._synthetic_flow_trace(flows, clients)
+        now = time.time()
+        for event in trace:
+            event.timestamp = now
+        
+        tracker = HeavyHitterTracker(capacity=capacity, epsilon=epsilon)
+        start_time = time.perf_counter()
+        for event in trace:
+            tracker.process_event(event)
+        elapsed = time.perf_counter() - start_time
+        
+        exact: Dict[str, int] = {}
+        for event in trace:
+            exact[event.src] = exact.get(event.src, 0) + event.orig_bytes + event.reply_bytes
+        true_top = set(sorted(exact, key=exact.get, reverse=True)[:k])
+        reported = tracker.top('talkers', k=k)
+        reported_keys = {entry['key'] for entry in reported}
+        
+        hits = len(true_top & reported_keys)
+        errors = [(abs(entry['bytes'] - exact.get(entry['key'], 0)), exact.get(entry['key'], 0))
+                  for entry in reported]
+        max_error = max((error / max(1, count) for error, count in errors), default=0.0)
+        
+        result = SketchBenchmarkResult(
+            flows=flows,
+            distinct_clients=clients,
+            capacity=capacity,
+            epsilon=epsilon,
+            events_per_second=flows / elapsed,
+            sketch_bytes=tracker.get_summary()['sketch_bytes'],
+            precision=hits / max(1, len(reported_keys)),
+            recall=hits / max(1, len(true_top)),
+            max_relative_error=max_error,
+            max_error_bytes=max((error for error, _ in errors), default=0),
+            total_bytes=sum(exact.values())
+        )
+        self.sketch_results.append(result)
+        
+        print(f"    Throughput: {result.events_per_second:,.0f} events/s")
+        print(f"    Sketch memory: {result.sketch_bytes / 1024:.1f} KB")
+        print(f"    Top-{k} precision: {result.precision:.2f}  recall: {result.recall:.2f}")
+        print(f"    Max relative error: {result.max_relative_error:.4f}  "
+              f"(max error {result.max_error_bytes} B, bound {epsilon * result.total_bytes:.0f} B)")
+        return result
+    
+    def benchmark_capture(self, interface: str, duration: int = 10) -> Dict[str, float]:
+        """
+        Measure packet capture ring throughput on a live interface
+        
+        Generate load separately (e.g. iperf3 over a veth pair) while this runs.
+        
+        Args:
+            interface: Interface to capture on
+            duration: Capture duration in seconds
+            
+        Returns:
+            Dict with packets/s, blocks/s and kernel drops
+        """
+        from fantasma_accounting import TrafficAccountant
+        from fantasma_capture import PacketCaptureMonitor, ClientPacketCounter
+        
+        print(f"  Benchmarking packet capture on {interface} ({duration}s)...")
+        
+        monitor = PacketCaptureMonitor(interface, [ClientPacketCounter(TrafficAccountant())])
+        monitor.start()
+        time.sleep(duration)
+        monitor.stop()
+        
+        stats = monitor.get_stats()
+        total = stats['packets'] + stats['kernel_drops']
+        result = {
+            'packets_per_second': stats['packets'] / duration,
+            'blocks_per_second': stats['blocks'] / duration,
+            'kernel_drops': stats['kernel_drops'],
+            'drop_rate': stats['kernel_drops'] / total if total else 0.0
+        }
+        
+        print(f"    Packets: {result['packets_per_second']:,.0f} pkt/s "
+              f"({result['blocks_per_second']:.1f} blocks/s)")
+        print(f"    Kernel drops: {result['kernel_drops']} ({result['drop_rate']:.2%})")
+        return result
+    
+    def benchmark_async_probes(self, concurrency: int = 50) -> Dict[str, float]:
+        """
+        Compare sequential sync status probes with concurrent async ones
+        
+        Args:
+            concurrency: Number of uncached status probes
+            
+        Returns:
+            Dict with sync and async wall times and the speedup
+        """
+        import asyncio
+        from fantasma_core import get_platform_adapter
+        from fantasma_async import get_async_adapter
+        
+        print(f"  Benchmarking {concurrency} status probes (sync vs asyncio)...")
+        
+        adapter = get_platform_adapter()
+        async_adapter = get_async_adapter(adapter)
+        
+        start = time.perf_counter()
+        for _ in range(concurrency):
+            adapter.get_status()
+        sync_time = time.perf_counter() - start
+        
+        async def probe_all():
+            await asyncio.gather(*(async_adapter.get_status() for _ in range(concurrency)))
+        
+        start = time.perf_counter()
+        asyncio.run(probe_all())
+        async_time = time.perf_counter() - start
+        
+        result = {
+            'sync_seconds': sync_time,
+            'async_seconds': async_time,
+            'speedup': sync_time / async_time if async_time else 0.0
+        }
+        print(f"    Sync:  {sync_time:.3f}s ({async_adapter.__class__.__name__} async: {async_time:.3f}s)")
+        print(f"    Speedup: {result['speedup']:.2f}x")
+        return result
+    
+    def benchmark_standby(self, source: str, target: str, rounds: int = 3,
+                          ssid: str = "FantasmaBench", password: str = "benchmark123") -> Dict[str, float]:
+        """
+        Compare cold starts with activations of a prepared standby
+        
+        Starts and stops real sharing (needs root and the platform tools).
+        
+        Args:
+            source: Uplink interface
+            target: Interface to share to
+            rounds: Starts measured per variant
+            
+        Returns:
+            Dict with median cold and warm start times and the speedup
+        """
+        from fantasma_core import FantasmaConfig, FantasmaCore, NetworkMode, get_platform_adapter
+        
+        print(f"  Benchmarking cold start vs standby activation ({source} -> {target}, {rounds} rounds)...")
+        
+        core = FantasmaCore(get_platform_adapter())
+        interfaces = {iface.name: iface for iface in core.detect_interfaces()}
+        if source not in interfaces or target not in interfaces:
+            raise ValueError(f"Unknown interface: {source if source not in interfaces else target}")
+        config = FantasmaConfig(NetworkMode.HOTSPOT, interfaces[source], interfaces[target],
+                                ssid=ssid, password=password)
+        
+        cold, warm = [], []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            if not core.start(config):
+                raise RuntimeError("Cold start failed")
+            cold.append(time.perf_counter() - start)
+            core.stop()
+            
+            if not core.prepare(config):
+                raise RuntimeError("Prepare failed")
+            start = time.perf_counter()
+            if not core.start(config):
+                raise RuntimeError("Activation failed")
+            warm.append(time.perf_counter() - start)
+            core.stop()
+        
+        result = {
+            'cold_seconds': statistics.median(cold),
+            'warm_seconds': statistics.median(warm),
+            'speedup': statistics.median(cold) / statistics.median(warm) if statistics.median(warm) else 0.0,
+            'prewarmed': core.adapter.supports_standby
+        }
+        print(f"    Cold start:  {result['cold_seconds'] * 1000:.0f} ms (median)")
+        print(f"    From standby: {result['warm_seconds'] * 1000:.0f} ms (median, "
+              f"{'pre-warmed' if result['prewarmed'] else 'platform has no standby support'})")
+        print(f"    Speedup: {result['speedup']:.1f}x")
+        return result
+    
     def run_benchmark(self, test_name: str, mode: str = "hotspot"):
         """
         Run complete benchmark suite
@@ -281,7 +518,8 @@ class FantasmaBenchmark:
         data = {
             'platform': self.platform,
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-            'results': [asdict(r) for r in self.results]
+            'results': [asdict(r) for r in self.results],
+            'sketch_results': [asdict(r) for r in self.sketch_results]
         }
         
         with open(filename, 'w') as f:
@@ -325,6 +563,20 @@ def main():
     if len(sys.argv) > 1 and sys.argv[1] == '--compare':
         # Compare modes
         benchmark.compare_modes()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--sketch':
+        # Heavy-hitter sketches over synthetic flow traces
+        for capacity, epsilon in ((32, 0.01), (64, 0.005), (256, 0.001)):
+            benchmark.benchmark_heavy_hitters(capacity=capacity, epsilon=epsilon)
+    elif len(sys.argv) > 2 and sys.argv[1] == '--capture':
+        # Capture ring throughput on a live interface (needs root)
+        benchmark.benchmark_capture(sys.argv[2])
+    elif len(sys.argv) > 3 and sys.argv[1] == '--standby':
+        # Cold start vs standby activation on real interfaces (needs root)
+        benchmark.benchmark_standby(sys.argv[2], sys.argv[3],
+                                    int(sys.argv[4]) if len(sys.argv) > 4 else 3)
+    elif len(sys.argv) > 1 and sys.argv[1] == '--async':
+        # Concurrent adapter probes on one event loop
+        benchmark.benchmark_async_probes(int(sys.argv[2]) if len(sys.argv) > 2 else 50)
     else:
         # Run standard benchmarks
         benchmark.run_benchmark("Default Configuration", mode="hotspot")
@@ -0,0 +1,165 @@
+"""
+FantasmaWiFi-Pro Probe Cache
+TTL cache with request coalescing for expensive adapter probes
+
+Adapter probes (`pgrep`, `ip link show`, `netsh`, ...) spawn processes and
+take tens of milliseconds. ProbeCache keeps each result for a per-key TTL
+and coalesces concurrent misses: while one caller runs the probe, others
+asking for the same key wait for its result instead of starting their own
+(singleflight). Adapter events invalidate keys before their TTL runs out.
+
+Each key also has a version that moves when its value may have changed: on
+invalidation, and on a reload that returned something different. Callers
+derive validators (ETags) from it without probing.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+import time
+
+
+class _Flight:
+    """One in-progress probe that concurrent callers wait on"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ProbeCache:
+    """
+    Per-key TTL cache with singleflight loading
+
+    Args:
+        ttls: Seconds each key stays fresh; keys not listed use default_ttl
+        default_ttl: TTL for unlisted keys (0 disables caching for them)
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 0.0):
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}   # key -> (value, expires_at)
+        self._flights: Dict[str, _Flight] = {}
+        self._generations: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+        self._values: Dict[str, Any] = {}    # key -> last loaded value
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: str, field: str):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {
+                'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0, 'errors': 0
+            }
+        stats[field] += 1
+
+    def _loaded(self, key: str, value: Any):
+        # Caller holds the lock
+        if key not in self._values or self._values[key] != value:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self._values[key] = value
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Cached value for key, calling loader on a miss
+
+        Concurrent misses for the same key share a single loader call. An
+        exception from the loader is raised in every waiting caller and
+        nothing is cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._count(key, 'hits')
+                return entry[0]
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._count(key, 'coalesced')
+                leader = False
+            else:
+                self._count(key, 'misses')
+                flight = self._flights[key] = _Flight()
+                generation = self._generations.get(key, 0)
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._count(key, 'errors')
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is None:
+                    self._loaded(key, flight.value)
+                # Don't cache a result an invalidation raced with
+                ttl = self.ttls.get(key, self.default_ttl)
+                if flight.error is None and ttl > 0 and self._generations.get(key, 0) == generation:
+                    self._entries[key] = (flight.value, time.monotonic() + ttl)
+            flight.done.set()
+        return flight.value
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        """
+        Non-loading lookup for callers that coalesce on their own (asyncio)
+
+        Returns:
+            (True, value) on a fresh hit, counted as a hit; otherwise
+            (False, generation) to pass to store() after loading
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._count(key, 'hits')
+                return True, entry[0]
+            return False, self._generations.get(key, 0)
+
+    def store(self, key: str, value: Any, generation: int):
+        """Cache a value loaded after lookup() unless key was invalidated since"""
+        with self._lock:
+            self._loaded(key, value)
+            ttl = self.ttls.get(key, self.default_ttl)
+            if ttl > 0 and self._generations.get(key, 0) == generation:
+                self._entries[key] = (value, time.monotonic() + ttl)
+
+    def record(self, key: str, outcome: str):
+        """Count a 'misses', 'coalesced' or 'errors' outcome for key"""
+        with self._lock:
+            self._count(key, outcome)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drop one key (or all keys) so the next get() probes again"""
+        with self._lock:
+            keys = [key] if key is not None else list(set(self._entries) | set(self._flights))
+            for name in keys:
+                self._entries.pop(name, None)
+                self._generations[name] = self._generations.get(name, 0) + 1
+                self._versions[name] = self._versions.get(name, 0) + 1
+                self._count(name, 'invalidations')
+
+    def version(self, key: str) -> int:
+        """Changes whenever key's value may have changed (never probes)"""
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit, miss, coalesced and invalidation counters per key, with hit rate"""
+        with self._lock:
+            stats = {key: dict(values) for key, values in self._stats.items()}
+        for key, values in stats.items():
+            lookups = values['hits'] + values['misses'] + values['coalesced']
+            values['hit_rate'] = (values['hits'] + values['coalesced']) / lookups if lookups else 0.0
+            values['ttl'] = self.ttls.get(key, self.default_ttl)
+        return stats
@@ -0,0 +1,490 @@
+"""
+FantasmaWiFi-Pro Packet Capture
+Zero-copy AF_PACKET TPACKET_V3 ring reader for passive traffic monitoring
+
+The kernel fills fixed-size blocks of a memory-mapped ring; each retired
+block is handed to the consumers as one batch of PacketRef entries that
+point into the shared buffer. Consumers parse headers in place with
+struct.unpack_from and only copy bytes when they need to keep them
+(e.g. CaptureStream). Linux only.
+"""
+
+from collections import deque, namedtuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import ctypes
+import logging
+import mmap
+import os
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# <linux/if_packet.h>
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+PACKET_OUTGOING = 4
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+
+_REQ3 = struct.Struct('7I')          # struct tpacket_req3
+_BLOCK_HDR = struct.Struct('4I')     # block_status, num_pkts, offset_to_first_pkt, blk_len
+_PKT_HDR = struct.Struct('6IHH')     # struct tpacket3_hdr up to tp_net
+_STATS_V3 = struct.Struct('3I')      # struct tpacket_stats_v3
+_BLOCK_STATUS_OFFSET = 8             # after version and offset_to_priv
+_SLL_PKTTYPE_OFFSET = 48 + 10        # TPACKET_ALIGN(sizeof(tpacket3_hdr)) + sll_pkttype
+
+PacketRef = namedtuple('PacketRef', 'offset snaplen length timestamp net outgoing')
+PacketRef.__doc__ = """
+A captured packet inside the ring buffer
+
+offset (link-layer header) and net (network header) are absolute offsets
+into PacketRing.buffer; the referenced bytes are only valid until the
+consumer returns from process_block().
+"""
+
+
+class _SockFilter(ctypes.Structure):
+    _fields_ = [('code', ctypes.c_uint16), ('jt', ctypes.c_uint8),
+                ('jf', ctypes.c_uint8), ('k', ctypes.c_uint32)]
+
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [('len', ctypes.c_uint16), ('filter', ctypes.POINTER(_SockFilter))]
+
+
+def compile_bpf(expression: str, interface: str) -> List[Tuple[int, int, int, int]]:
+    """
+    Compile a tcpdump filter expression to classic BPF instructions
+
+    Uses `tcpdump -ddd`, which prints the instruction count followed by one
+    "code jt jf k" line per instruction.
+    """
+    result = subprocess.run(
+        ['tcpdump', '-i', interface, '-ddd', '--', expression],
+        capture_output=True, text=True, check=True
+    )
+    lines = result.stdout.split('\n')
+    count = int(lines[0])
+    return [tuple(int(field) for field in line.split()) for line in lines[1:count + 1]]
+
+
+def mac_to_str(raw: bytes) -> str:
+    """Format a 6-byte MAC address"""
+    return ':'.join(f'{b:02x}' for b in raw)
+
+
+class PacketRing:
+    """Memory-mapped TPACKET_V3 receive ring bound to one interface"""
+
+    def __init__(
+        self,
+        interface: str,
+        bpf: Optional[Sequence[Tuple[int, int, int, int]]] = None,
+        block_size: int = 1 << 20,
+        block_count: int = 64,
+        frame_size: int = 2048,
+        block_timeout_ms: int = 50
+    ):
+        self.interface = interface
+        self.bpf = bpf
+        self.block_size = block_size
+        self.block_count = block_count
+        self.frame_size = frame_size
+        self.block_timeout_ms = block_timeout_ms
+        self.sock: Optional[socket.socket] = None
+        self.buffer: Optional[mmap.mmap] = None
+        self._filter = None
+        self._block = 0
+
+    def open(self):
+        """Create the socket, attach the filter and map the ring"""
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            if self.bpf:
+                self._attach_filter(sock, self.bpf)
+            frames = (self.block_size // self.frame_size) * self.block_count
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, _REQ3.pack(
+                self.block_size, self.block_count, self.frame_size, frames,
+                self.block_timeout_ms, 0, 0
+            ))
+            self.buffer = mmap.mmap(
+                sock.fileno(), self.block_size * self.block_count,
+                mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE
+            )
+            sock.bind((self.interface, ETH_P_ALL))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self._block = 0
+
+    def _attach_filter(self, sock: socket.socket, program: Sequence[Tuple[int, int, int, int]]):
+        instructions = (_SockFilter * len(program))(*[_SockFilter(*insn) for insn in program])
+        fprog = _SockFprog(len(program), instructions)
+        self._filter = (instructions, fprog)  # keep alive while attached
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER,
+                        ctypes.string_at(ctypes.addressof(fprog), ctypes.sizeof(fprog)))
+
+    def close(self):
+        """Unmap the ring and close the socket"""
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def poll(self, timeout: float) -> bool:
+        """Wait until the current block is handed to user space"""
+        if self._block_ready():
+            return True
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable) and self._block_ready()
+
+    def _block_ready(self) -> bool:
+        base = self._block * self.block_size
+        status = struct.unpack_from('I', self.buffer, base + _BLOCK_STATUS_OFFSET)[0]
+        return bool(status & TP_STATUS_USER)
+
+    def next_block(self) -> Optional[List[PacketRef]]:
+        """
+        Describe the packets of the current block, or None if none is ready
+
+        Call release_block() once every consumer is done with the batch.
+        """
+        if not self._block_ready():
+            return None
+
+        buffer = self.buffer
+        base = self._block * self.block_size
+        _, num_pkts, offset, _ = _BLOCK_HDR.unpack_from(buffer, base + _BLOCK_STATUS_OFFSET)
+        packets = []
+        offset += base
+        for _ in range(num_pkts):
+            next_offset, sec, nsec, snaplen, length, _, mac, net = _PKT_HDR.unpack_from(buffer, offset)
+            packets.append(PacketRef(
+                offset + mac, snaplen, length, sec + nsec / 1e9, offset + net,
+                buffer[offset + _SLL_PKTTYPE_OFFSET] == PACKET_OUTGOING
+            ))
+            offset += next_offset
+        return packets
+
+    def release_block(self):
+        """Return the current block to the kernel and advance"""
+        base = self._block * self.block_size
+        struct.pack_into('I', self.buffer, base + _BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+        self._block = (self._block + 1) % self.block_count
+
+    def get_stats(self) -> Dict[str, int]:
+        """Kernel packet/drop counters since the last call"""
+        packets, drops, freezes = _STATS_V3.unpack(
+            self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS_V3.size)
+        )
+        return {'packets': packets, 'drops': drops, 'freeze_count': freezes}
+
+
+class ClientPacketCounter:
+    """
+    Per-client byte/packet counters from captured frames
+
+    Frames received on the client-facing interface are client uploads keyed
+    by source MAC; frames sent out of it are downloads keyed by destination
+    MAC. Counts are aggregated per block and folded into the accountant
+    with one call per client per block.
+    """
+
+    def __init__(self, accountant):
+        self.accountant = accountant
+
+    def process_block(self, ring: PacketRing, packets: List[PacketRef]):
+        buffer = ring.buffer
+        totals: Dict[bytes, List[int]] = {}
+        now = 0.0
+        for packet in packets:
+            if packet.outgoing:
+                mac_offset = packet.offset     # destination MAC
+                if buffer[mac_offset] & 1:     # skip broadcast/multicast
+                    continue
+            else:
+                mac_offset = packet.offset + 6  # source MAC
+            mac = buffer[mac_offset:mac_offset + 6]
+            entry = totals.get(mac)
+            if entry is None:
+                entry = totals[mac] = [0, 0, 0, 0]
+            if packet.outgoing:
+                entry[1] += packet.length
+                entry[3] += 1
+            else:
+                entry[0] += packet.length
+                entry[2] += 1
+            now = packet.timestamp
+
+        for mac, (tx, rx, tx_pkts, rx_pkts) in totals.items():
+            self.accountant.account(mac_to_str(mac), tx, rx, tx_pkts, rx_pkts, now or time.time())
+
+
+LINKTYPE_ETHERNET = 1
+
+
+def pcap_header(snaplen: int) -> bytes:
+    """Classic pcap global header (nanosecond timestamps)"""
+    return struct.pack('<IHHiIII', 0xa1b23c4d, 2, 4, 0, 0, snaplen, LINKTYPE_ETHERNET)
+
+
+def pcap_record(timestamp: float, length: int, data) -> bytes:
+    """Classic pcap record header; data follows it"""
+    sec = int(timestamp)
+    return struct.pack('<IIII', sec, int((timestamp - sec) * 1e9), len(data), length)
+
+
+def _pcapng_block(block_type: int, body: bytes) -> bytes:
+    length = 12 + len(body)
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+def _pcapng_option(code: int, value: bytes) -> bytes:
+    padding = b'\0' * (-len(value) % 4)
+    return struct.pack('<HH', code, len(value)) + value + padding
+
+
+def _pcapng_timestamp(timestamp: float) -> bytes:
+    ticks = int(timestamp * 1e9)
+    return struct.pack('<II', ticks >> 32, ticks & 0xFFFFFFFF)
+
+
+def pcapng_header(snaplen: int, interface: str) -> bytes:
+    """pcapng Section Header Block plus one Interface Description Block"""
+    section = _pcapng_block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1))
+    options = (
+        _pcapng_option(2, interface.encode()) +   # if_name
+        _pcapng_option(9, b'\x09') +               # if_tsresol: nanoseconds
+        _pcapng_option(0, b'')
+    )
+    description = _pcapng_block(1, struct.pack('<HHI', LINKTYPE_ETHERNET, 0, snaplen) + options)
+    return section + description
+
+
+def pcapng_packet(timestamp: float, length: int, data: bytes) -> bytes:
+    """pcapng Enhanced Packet Block"""
+    padding = b'\0' * (-len(data) % 4)
+    header = struct.pack('<I', 0) + _pcapng_timestamp(timestamp) + struct.pack('<II', len(data), length)
+    return _pcapng_block(6, header + data + padding)
+
+
+def pcapng_statistics(received: int, kernel_drops: int, buffer_drops: int, delivered: int) -> bytes:
+    """
+    pcapng Interface Statistics Block used as the stream trailer
+
+    isb_ifrecv counts packets seen, isb_osdrop kernel ring drops and
+    isb_usrdeliv packets written to the stream; drops from the bounded
+    stream buffer are reported in the block comment.
+    """
+    options = (
+        _pcapng_option(1, f"fantasma buffer_drops={buffer_drops} kernel_drops={kernel_drops}".encode()) +
+        _pcapng_option(3, _pcapng_timestamp(time.time())) +         # isb_endtime
+        _pcapng_option(4, struct.pack('<Q', received)) +            # isb_ifrecv
+        _pcapng_option(7, struct.pack('<Q', kernel_drops)) +        # isb_osdrop
+        _pcapng_option(8, struct.pack('<Q', delivered)) +           # isb_usrdeliv
+        _pcapng_option(0, b'')
+    )
+    return _pcapng_block(5, struct.pack('<I', 0) + _pcapng_timestamp(time.time()) + options)
+
+
+class CaptureStream:
+    """
+    Bounded buffer between the capture thread and a streaming reader
+
+    Packets are copied out of the ring (truncated to snaplen) into a queue
+    holding at most buffer_bytes. When a slow reader lets it fill up, the
+    oldest packets are dropped and counted instead of growing memory.
+    """
+
+    def __init__(self, snaplen: int = 262144, buffer_bytes: int = 4 << 20):
+        self.snaplen = snaplen
+        self.buffer_bytes = buffer_bytes
+        self.received = 0
+        self.dropped = 0
+        self._queue: deque = deque()
+        self._queued_bytes = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def process_block(self, ring: PacketRing, packets: List[PacketRef]):
+        buffer = ring.buffer
+        with self._cond:
+            for packet in packets:
+                data = buffer[packet.offset:packet.offset + min(packet.snaplen, self.snaplen)]
+                self._queue.append((packet.timestamp, packet.length, data))
+                self._queued_bytes += len(data)
+                self.received += 1
+            while self._queued_bytes > self.buffer_bytes:
+                _, _, data = self._queue.popleft()
+                self._queued_bytes -= len(data)
+                self.dropped += 1
+            self._cond.notify()
+
+    def read(self, timeout: float) -> List[Tuple[float, int, bytes]]:
+        """Take everything queued, waiting up to timeout for packets"""
+        with self._cond:
+            if not self._queue and not self._closed:
+                self._cond.wait(timeout)
+            records = list(self._queue)
+            self._queue.clear()
+            self._queued_bytes = 0
+            return records
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def stream_capture(
+    interface: str,
+    bpf_filter: Optional[str] = None,
+    snaplen: int = 262144,
+    duration: float = 30.0,
+    max_bytes: Optional[int] = None,
+    fmt: str = 'pcapng',
+    buffer_bytes: int = 4 << 20
+) -> Iterator[bytes]:
+    """
+    Start capturing on interface and return a pcap or pcapng byte stream
+
+    The capture starts before this returns, so setup errors (permissions,
+    bad filter) raise here rather than in the middle of a response. The
+    stream stops after duration seconds or once max_bytes of packet records
+    were produced. The pcapng format ends with a statistics block carrying
+    drop counts; classic pcap has no trailer, so drops are only logged.
+    Closing the generator (e.g. client disconnect) stops the capture.
+    """
+    if fmt not in ('pcap', 'pcapng'):
+        raise ValueError(f"Unknown capture format: {fmt}")
+
+    stream = CaptureStream(snaplen=snaplen, buffer_bytes=buffer_bytes)
+    monitor = PacketCaptureMonitor(interface, [stream], bpf_filter=bpf_filter)
+    monitor.start()
+    return _stream_records(monitor, stream, duration, max_bytes, fmt)
+
+
+def _stream_records(monitor: 'PacketCaptureMonitor', stream: CaptureStream,
+                    duration: float, max_bytes: Optional[int], fmt: str) -> Iterator[bytes]:
+    delivered = written = 0
+    deadline = time.monotonic() + duration
+    try:
+        if fmt == 'pcapng':
+            yield pcapng_header(stream.snaplen, monitor.interface)
+        else:
+            yield pcap_header(stream.snaplen)
+        while time.monotonic() < deadline and (max_bytes is None or written < max_bytes):
+            chunk = []
+            for timestamp, length, data in stream.read(min(0.5, max(0.0, deadline - time.monotonic()))):
+                if fmt == 'pcapng':
+                    record = pcapng_packet(timestamp, length, data)
+                else:
+                    record = pcap_record(timestamp, length, data) + data
+                chunk.append(record)
+                written += len(record)
+                delivered += 1
+                if max_bytes is not None and written >= max_bytes:
+                    break
+            if chunk:
+                yield b''.join(chunk)
+    finally:
+        monitor.stop()
+        stats = monitor.get_stats()
+        buffer_drops = stream.dropped
+        logger.info(f"Capture on {monitor.interface} finished: {delivered} packets, "
+                    f"{buffer_drops} buffer drops, {stats['kernel_drops']} kernel drops")
+    if fmt == 'pcapng':
+        yield pcapng_statistics(
+            stream.received + stats['kernel_drops'], stats['kernel_drops'], buffer_drops, delivered
+        )
+
+
+class PacketCaptureMonitor:
+    """
+    Runs a PacketRing in a background thread and feeds its consumers
+
+    Each consumer provides process_block(ring, packets) and optionally
+    close(). Provides start()/stop() like the conntrack flow monitor.
+    """
+
+    def __init__(self, interface: str, consumers: List, bpf_filter: Optional[str] = None, **ring_options):
+        self.interface = interface
+        self.consumers = consumers
+        self.bpf_filter = bpf_filter
+        self.ring_options = ring_options
+        self.blocks = 0
+        self.packets = 0
+        self.kernel_drops = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ring: Optional[PacketRing] = None
+
+    def start(self):
+        """Open the ring and start the reader thread"""
+        bpf = compile_bpf(self.bpf_filter, self.interface) if self.bpf_filter else None
+        self._ring = PacketRing(self.interface, bpf=bpf, **self.ring_options)
+        self._ring.open()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"Packet capture started on {self.interface}")
+
+    def stop(self):
+        """Stop the reader thread and release the ring"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for consumer in self.consumers:
+            if hasattr(consumer, 'close'):
+                consumer.close()
+        if self._ring:
+            self._ring.close()
+            self._ring = None
+
+    def _run(self):
+        ring = self._ring
+        while not self._stop.is_set():
+            if not ring.poll(0.2):
+                continue
+            while True:
+                packets = ring.next_block()
+                if packets is None:
+                    break
+                for consumer in self.consumers:
+                    try:
+                        consumer.process_block(ring, packets)
+                    except Exception as e:
+                        logger.error(f"Error in packet consumer {consumer.__class__.__name__}: {e}")
+                ring.release_block()
+                self.blocks += 1
+                self.packets += len(packets)
+            self.kernel_drops += ring.get_stats()['drops']
+
+    def get_stats(self) -> Dict[str, int]:
+        """Blocks/packets processed and kernel drops"""
+        return {
+            'interface': self.interface,
+            'blocks': self.blocks,
+            'packets': self.packets,
+            'kernel_drops': self.kernel_drops
+        }
+
+
+def is_capture_supported() -> bool:
+    """AF_PACKET rings need Linux and CAP_NET_RAW"""
+    return hasattr(socket, 'AF_PACKET') and os.geteuid() == 0
@@ -7,14 +7,22 @@ A command-line interface for cross-platform WiFi sharing
 """
 
 import sys
+import time
+import signal
 import argparse
 import logging
 from typing import Optional
 
 from fantasma_core import (
-    FantasmaCore, get_platform_adapter,
     NetworkMode, ConnectionType, NetworkInterface, FantasmaConfig
 )
+from fantasma_analytics import HeavyHitterTracker
+from fantasma_daemon import (
+    FantasmaDaemon, RemoteFantasmaCore, connect_core, connect_sessions,
+    default_snapshot_path, read_snapshot
+)
+from fantasma_sessions import DEFAULT_SESSION
+from fantasma_snapshot import SnapshotReader
 
 
 class FantasmaCLI:
@@ -30,9 +38,12 @@ class FantasmaCLI:
     BOLD = '\033[1m'
     NC = '\033[0m'  # No Color
 
-    def __init__(self):
-        self.adapter = get_platform_adapter()
-        self.core = FantasmaCore(self.adapter)
+    def __init__(self, socket_path: Optional[str] = None):
+        # Talk to a running daemon if there is one, else own a local core
+        self.socket_path = socket_path
+        self.core = connect_core(socket_path)
+        self.remote = isinstance(self.core, RemoteFantasmaCore)
+        self.sessions = connect_sessions(self.core)
 
     def print_banner(self):
         """Print ASCII banner"""
@@ -66,9 +77,14 @@ class FantasmaCLI:
                 print(f"   MAC: {iface.mac_address}")
             print()
 
-    def start_sharing(self, args):
-        """Start network sharing"""
-        print(f"{self.CYAN}═══ Starting FantasmaWiFi ═══{self.NC}\n")
+    def start_sharing(self, args, standby: bool = False):
+        """Start network sharing (standby: only pre-warm it for a later start)"""
+        print(f"{self.CYAN}═══ {'Preparing' if standby else 'Starting'} FantasmaWiFi ═══{self.NC}\n")
+        
+        if standby and not self.remote:
+            # The standby lives in the process that prepared it
+            print(f"{self.RED}Error: prepare needs a running daemon (fantasma daemon){self.NC}")
+            return
         
         # Get interfaces
         interfaces = self.core.detect_interfaces()
@@ -107,24 +123,42 @@ class FantasmaCLI:
                 print(f"{self.YELLOW}WiFi hotspot requires --ssid and --password{self.NC}")
             return
         
+        if not self.remote:
+            # This process owns the sessions until it exits
+            self.sessions.recover()
+        
         # Start
         print(f"Mode: {self.BOLD}{mode.value.upper()}{self.NC}")
         print(f"Source: {source_iface.name} ({source_iface.type.value})")
         print(f"Target: {target_iface.name} ({target_iface.type.value})")
         if args.ssid:
             print(f"SSID: {args.ssid}")
+        if args.session != DEFAULT_SESSION:
+            print(f"Session: {args.session}")
         print()
         
-        if self.core.start(config):
-            print(f"{self.GREEN}✓ FantasmaWiFi started successfully!{self.NC}")
+        if standby:
+            if self.sessions.prepare(args.session, config):
+                print(f"{self.GREEN}✓ Standby ready - the same start command activates it{self.NC}")
+            else:
+                print(f"{self.RED}✗ Failed to prepare standby{self.NC}")
+            return
+        
+        started = time.time()
+        if self.sessions.start(args.session, config):
+            print(f"{self.GREEN}✓ FantasmaWiFi started successfully! ({time.time() - started:.2f}s){self.NC}")
         else:
             print(f"{self.RED}✗ Failed to start FantasmaWiFi{self.NC}")
 
-    def stop_sharing(self):
+    def stop_sharing(self, session_id: str = DEFAULT_SESSION):
         """Stop network sharing"""
         print(f"{self.CYAN}═══ Stopping FantasmaWiFi ═══{self.NC}\n")
         
-        if self.core.stop():
+        if not self.remote:
+            # Adopt the session a previous local start left running
+            self.sessions.recover()
+        
+        if self.sessions.stop(session_id):
             print(f"{self.GREEN}✓ FantasmaWiFi stopped{self.NC}")
         else:
             print(f"{self.RED}✗ Failed to stop FantasmaWiFi{self.NC}")
@@ -133,22 +167,147 @@ class FantasmaCLI:
         """Show current status"""
         print(f"{self.CYAN}═══ FantasmaWiFi Status ═══{self.NC}\n")
         
+        if self.remote:
+            snapshot = read_snapshot(SnapshotReader(default_snapshot_path()))
+            if snapshot:
+                self._print_snapshot(snapshot)
+                return
+        
         status = self.core.get_status()
+        is_active = status.get('is_active', False)
+        config = status.get('config')
         
         print(f"Platform: {self.BOLD}{status.get('platform', 'Unknown')}{self.NC}")
-        print(f"Active: {self.GREEN if self.core.is_active else self.RED}{self.core.is_active}{self.NC}")
+        print(f"Active: {self.GREEN if is_active else self.RED}{is_active}{self.NC}")
+        print(f"Daemon: {'connected' if self.remote else 'not running (local)'}")
         
-        if self.core.config:
+        if config:
             print(f"\nCurrent Configuration:")
-            print(f"  Mode: {self.core.config.mode.value}")
-            print(f"  Source: {self.core.config.source_interface.name}")
-            print(f"  Target: {self.core.config.target_interface.name}")
+            print(f"  Mode: {config.mode.value}")
+            print(f"  Source: {config.source_interface.name}")
+            print(f"  Target: {config.target_interface.name}")
         
         print(f"\nPlatform Details:")
         for key, value in status.items():
             if key not in ['platform', 'is_active', 'config']:
                 print(f"  {key}: {value}")
 
+    def show_sessions(self):
+        """List sharing sessions"""
+        print(f"{self.CYAN}═══ FantasmaWiFi Sessions ═══{self.NC}\n")
+        
+        status = self.sessions.get_status()
+        summary = status['summary']
+        counts = ', '.join(f"{count} {state}" for state, count in summary['states'].items() if count)
+        print(f"Sessions: {self.BOLD}{summary['sessions']}{self.NC}/{summary['max_sessions']} ({counts})\n")
+        
+        for session in status['sessions']:
+            state = session.get('state', 'idle')
+            color = self.GREEN if state == 'active' else self.YELLOW if state != 'idle' else self.RED
+            print(f"{self.BOLD}{session['session']}{self.NC}: {color}{state}{self.NC}")
+            config = session.get('config')
+            if config:
+                print(f"   Mode: {config['mode']}")
+                print(f"   Source: {config['source_interface']['name']}")
+                print(f"   Target: {config['target_interface']['name']}")
+                if config['mode'] == NetworkMode.HOTSPOT.value:
+                    print(f"   Subnet: {config['ip_range']}")
+            bridge = session.get('resources', {}).get('bridge_name')
+            if bridge:
+                print(f"   Bridge: {bridge}")
+            print()
+
+    def _print_snapshot(self, snapshot: dict):
+        """Print a status snapshot published by the daemon"""
+        is_active = snapshot['is_active']
+        print(f"Platform: {self.BOLD}{snapshot['platform'] or 'Unknown'}{self.NC}")
+        print(f"Active: {self.GREEN if is_active else self.RED}{is_active}{self.NC} ({snapshot['state']})")
+        print(f"Daemon: connected (pid {snapshot['writer_pid']}, "
+              f"snapshot {snapshot['age']:.1f}s old)")
+        
+        if snapshot['mode']:
+            print("\nCurrent Configuration:")
+            print(f"  Mode: {snapshot['mode']}")
+            print(f"  Source: {snapshot['source_interface']}")
+            print(f"  Target: {snapshot['target_interface']}")
+        
+        print("\nPlatform Details:")
+        for key, value in snapshot['details'].items():
+            print(f"  {key}: {value}")
+        print(f"  latency: {snapshot['latency']}")
+        print(f"  traffic: {snapshot['traffic']}")
+
+    def show_top(self, k: int = 10, interval: float = 5.0, duration: Optional[float] = None,
+                 window: Optional[float] = None):
+        """Live view of the heaviest talkers, destinations and ports"""
+        monitor = None
+        if not self.remote:
+            # No daemon: run a flow monitor for the lifetime of this command
+            monitor = self.core.adapter.create_flow_monitor(self.core._dispatch_flow_event)
+            if not monitor:
+                print(f"{self.RED}Flow monitoring is not available on this platform{self.NC}")
+                return
+            monitor.start()
+
+        started = time.time()
+        try:
+            while duration is None or time.time() - started < duration:
+                time.sleep(interval)
+                print(f"{self.CYAN}═══ FantasmaWiFi Top ({time.strftime('%H:%M:%S')}) ═══{self.NC}\n")
+                for dimension in HeavyHitterTracker.DIMENSIONS:
+                    print(f"{self.BOLD}{dimension.capitalize()}{self.NC}")
+                    entries = self.core.get_top(dimension, k=k, window=window)
+                    if not entries:
+                        print("  (no traffic yet)")
+                    for entry in entries:
+                        print(f"  {entry['key']:<28} {self._format_bytes(entry['bytes']):>10}"
+                              f"  ±{self._format_bytes(entry['error'])}")
+                    print()
+        finally:
+            if monitor:
+                monitor.stop()
+
+    def run_daemon(self):
+        """Serve the core on a Unix socket until interrupted"""
+        if self.remote:
+            print(f"{self.YELLOW}A Fantasma daemon is already running{self.NC}")
+            return
+        daemon = FantasmaDaemon(self.core, socket_path=self.socket_path, sessions=self.sessions)
+        print(f"{self.GREEN}✓ Fantasma daemon listening on {daemon.socket_path}{self.NC}")
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+        daemon.serve_forever()
+
+    def capture(self, interface: str, output: str, bpf_filter: Optional[str] = None,
+                snaplen: int = 262144, duration: float = 30.0,
+                max_bytes: Optional[int] = None, fmt: str = 'pcapng'):
+        """Capture packets on an interface to a pcap/pcapng file (or '-' for stdout)"""
+        from fantasma_capture import stream_capture
+        
+        stream = stream_capture(interface, bpf_filter=bpf_filter, snaplen=snaplen,
+                                duration=duration, max_bytes=max_bytes, fmt=fmt)
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        written = 0
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                out.flush()
+                written += len(chunk)
+        finally:
+            stream.close()
+            if out is not sys.stdout.buffer:
+                out.close()
+        if output != '-':
+            print(f"{self.GREEN}✓ Wrote {self._format_bytes(written)} to {output}{self.NC}")
+
+    @staticmethod
+    def _format_bytes(value: int) -> str:
+        """Format a byte count for display"""
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if value < 1024:
+                return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+            value /= 1024
+        return f"{value:.1f} TB"
+
     def _find_interface(self, interfaces: list, name: str) -> Optional[NetworkInterface]:
         """Find interface by name"""
         for iface in interfaces:
@@ -179,8 +338,26 @@ Examples:
   # Stop sharing
   %(prog)s stop
   
+  # Pre-warm a hotspot, then activate it near-instantly with the same options
+  %(prog)s prepare -s eth0 -t wlan0 --ssid MyHotspot --password MyPassword123
+  %(prog)s start -s eth0 -t wlan0 --ssid MyHotspot --password MyPassword123
+  
+  # Share a second interface in its own session, then list sessions
+  %(prog)s start -s eth0 -t wlan1 --ssid Guest --password GuestPass123 --session guest
+  %(prog)s sessions
+  %(prog)s stop --session guest
+  
   # Show status
   %(prog)s status
+  
+  # Live top talkers/destinations/ports
+  %(prog)s top -k 5 --interval 2
+  
+  # Run the daemon; later commands talk to it over its socket
+  %(prog)s daemon
+  
+  # Capture 10 seconds of DNS traffic on the shared interface
+  %(prog)s capture -t wlan0 --filter "udp port 53" --duration 10 -w dns.pcapng
 
 Modes:
   hotspot (default): Creates own network with NAT (router mode)
@@ -190,7 +367,7 @@ Modes:
     
     parser.add_argument(
         'command',
-        choices=['list', 'start', 'stop', 'status', 'doctor'],
+        choices=['list', 'start', 'prepare', 'stop', 'status', 'sessions', 'doctor', 'top', 'capture', 'daemon'],
         help='Command to execute'
     )
     
@@ -220,6 +397,75 @@ Modes:
         help='WiFi password (required for WiFi hotspot)'
     )
     
+    parser.add_argument(
+        '--session',
+        default=DEFAULT_SESSION,
+        help=f'Sharing session for start/prepare/stop (default: {DEFAULT_SESSION})'
+    )
+    
+    parser.add_argument(
+        '-k', '--top',
+        type=int,
+        default=10,
+        dest='top_k',
+        help='Entries per dimension for the top command (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=5.0,
+        help='Refresh interval in seconds for the top command (default: 5)'
+    )
+    
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help='Stop the top or capture command after this many seconds'
+    )
+    
+    parser.add_argument(
+        '--filter',
+        help='BPF filter expression for the capture command'
+    )
+    
+    parser.add_argument(
+        '--snaplen',
+        type=int,
+        default=262144,
+        help='Bytes kept per packet for the capture command'
+    )
+    
+    parser.add_argument(
+        '--max-bytes',
+        type=int,
+        help='Stop the capture command after this many bytes'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['pcap', 'pcapng'],
+        default='pcapng',
+        help='Capture file format (default: pcapng)'
+    )
+    
+    parser.add_argument(
+        '-w', '--write',
+        default='-',
+        help="Capture output file, '-' for stdout (default)"
+    )
+    
+    parser.add_argument(
+        '--window',
+        type=float,
+        help='Seconds of history for the top command (default: all retained)'
+    )
+    
+    parser.add_argument(
+        '--socket',
+        help='Daemon Unix socket path (default: $FANTASMA_SOCKET or fantasma.sock in /run/fantasma, $XDG_RUNTIME_DIR/fantasma for non-root)'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -236,10 +482,11 @@ Modes:
     )
     
     # Create CLI
-    cli = FantasmaCLI()
+    cli = FantasmaCLI(socket_path=args.socket)
     
-    # Print banner
-    cli.print_banner()
+    # Print banner (not when a capture is streamed to stdout)
+    if not (args.command == 'capture' and args.write == '-'):
+        cli.print_banner()
     
     # Execute command
     try:
@@ -252,16 +499,30 @@ Modes:
             report = doctor.generate_report()
             doctor.print_report(report)
             sys.exit(0 if report.overall_status == CheckStatus.PASS else 1)
-        elif args.command == 'start':
+        elif args.command in ('start', 'prepare'):
             if not args.source or not args.target:
-                print(f"{cli.RED}Error: --source and --target are required for start command{cli.NC}")
+                print(f"{cli.RED}Error: --source and --target are required for {args.command} command{cli.NC}")
                 parser.print_help()
                 sys.exit(1)
-            cli.start_sharing(args)
+            cli.start_sharing(args, standby=args.command == 'prepare')
         elif args.command == 'stop':
-            cli.stop_sharing()
+            cli.stop_sharing(args.session)
         elif args.command == 'status':
             cli.show_status()
+        elif args.command == 'sessions':
+            cli.show_sessions()
+        elif args.command == 'top':
+            cli.show_top(k=args.top_k, interval=args.interval,
+                         duration=args.duration, window=args.window)
+        elif args.command == 'daemon':
+            cli.run_daemon()
+        elif args.command == 'capture':
+            if not args.target:
+                print(f"{cli.RED}Error: --target is required for capture command{cli.NC}")
+                sys.exit(1)
+            cli.capture(args.target, args.write, bpf_filter=args.filter,
+                        snaplen=args.snaplen, duration=args.duration or 30.0,
+                        max_bytes=args.max_bytes, fmt=args.format)
     except KeyboardInterrupt:
         print(f"\n{cli.YELLOW}Interrupted by user{cli.NC}")
         sys.exit(0)
@@ -14,10 +14,23 @@ Abstraction: "Interface A consumes internet, Interface B distributes internet"
 """
 
 from abc import ABC, abstractmethod
+from collections import deque
 from enum import Enum
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Callable, Tuple
+import ipaddress
+import itertools
 import logging
+import os
 import platform
+import threading
+import time
+
+from fantasma_accounting import FlowEvent, FlowTable, TrafficAccountant
+from fantasma_analytics import HeavyHitterTracker
+from fantasma_cache import ProbeCache
+from fantasma_capture import ClientPacketCounter
+from fantasma_latency import TcpLatencyAnalyzer
+from fantasma_metrics import MetricsRegistry, registry as metrics_registry
 
 
 class NetworkMode(Enum):
@@ -26,6 +39,21 @@ class NetworkMode(Enum):
     BRIDGE = "bridge"    # Layer 2 forwarding - extends existing network
 
 
+class SessionState(Enum):
+    """
+    Sharing session lifecycle: idle -> starting -> active -> stopping -> idle
+
+    A session can be pre-warmed first (idle -> preparing -> standby); a
+    start from standby with the prepared configuration only activates it.
+    """
+    IDLE = "idle"
+    STARTING = "starting"
+    ACTIVE = "active"
+    STOPPING = "stopping"
+    PREPARING = "preparing"
+    STANDBY = "standby"
+
+
 class ConnectionType(Enum):
     """Connection types for sharing"""
     USB = "usb"
@@ -45,6 +73,28 @@ class NetworkInterface:
     def __repr__(self):
         return f"NetworkInterface(name={self.name}, type={self.type.value}, active={self.is_active})"
 
+    def __eq__(self, other):
+        # By value, so a re-probe that found the same interfaces is recognized
+        if not isinstance(other, NetworkInterface):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_dict(self) -> Dict[str, any]:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            'name': self.name,
+            'type': self.type.value,
+            'mac_address': self.mac_address,
+            'is_active': self.is_active
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'NetworkInterface':
+        """Rebuild an interface from to_dict() output"""
+        interface = cls(data['name'], ConnectionType(data['type']), data.get('mac_address'))
+        interface.is_active = data.get('is_active', False)
+        return interface
+
 
 class FantasmaConfig:
     """Configuration for Fantasma operation"""
@@ -56,8 +106,8 @@ class FantasmaConfig:
         ssid: Optional[str] = None,
         password: Optional[str] = None,
         ip_range: str = "192.168.137.0/24",
-        dhcp_start: str = "192.168.137.100",
-        dhcp_end: str = "192.168.137.200"
+        dhcp_start: Optional[str] = None,
+        dhcp_end: Optional[str] = None
     ):
         self.mode = mode
         self.source_interface = source_interface  # Interface consuming internet
@@ -65,25 +115,172 @@ class FantasmaConfig:
         self.ssid = ssid
         self.password = password
         self.ip_range = ip_range
-        self.dhcp_start = dhcp_start
-        self.dhcp_end = dhcp_end
+        # DHCP pool defaults to hosts .100-.200 of ip_range (or all but the
+        # gateway on smaller subnets)
+        default_start, default_end = self._default_pool()
+        self.dhcp_start = dhcp_start or default_start
+        self.dhcp_end = dhcp_end or default_end
+
+    def to_dict(self) -> Dict[str, any]:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            'mode': self.mode.value,
+            'source_interface': self.source_interface.to_dict(),
+            'target_interface': self.target_interface.to_dict(),
+            'ssid': self.ssid,
+            'password': self.password,
+            'ip_range': self.ip_range,
+            'dhcp_start': self.dhcp_start,
+            'dhcp_end': self.dhcp_end
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'FantasmaConfig':
+        """Rebuild a configuration from to_dict() output"""
+        return cls(
+            mode=NetworkMode(data['mode']),
+            source_interface=NetworkInterface.from_dict(data['source_interface']),
+            target_interface=NetworkInterface.from_dict(data['target_interface']),
+            ssid=data.get('ssid'),
+            password=data.get('password'),
+            ip_range=data.get('ip_range', "192.168.137.0/24"),
+            dhcp_start=data.get('dhcp_start'),
+            dhcp_end=data.get('dhcp_end')
+        )
+
+    @property
+    def network(self) -> ipaddress.IPv4Network:
+        """Client subnet (ip_range)"""
+        return ipaddress.ip_network(self.ip_range, strict=False)
+
+    @property
+    def gateway(self) -> str:
+        """Address of the target interface: first host of the subnet"""
+        return str(self.network.network_address + 1)
+
+    def _default_pool(self) -> Tuple[str, str]:
+        try:
+            network = ipaddress.ip_network(self.ip_range, strict=False)
+        except ValueError:
+            return '', ''
+        start, end = (100, 200) if network.num_addresses > 202 else (2, network.num_addresses - 2)
+        return str(network.network_address + start), str(network.network_address + end)
+
+    def set_subnet(self, ip_range: str):
+        """Move to another subnet, keeping the DHCP pool at the same host offsets"""
+        old = self.network
+        new = ipaddress.ip_network(ip_range, strict=False)
+        start = int(ipaddress.ip_address(self.dhcp_start)) - int(old.network_address)
+        end = int(ipaddress.ip_address(self.dhcp_end)) - int(old.network_address)
+        self.ip_range = str(new)
+        self.dhcp_start = str(new.network_address + start)
+        self.dhcp_end = str(new.network_address + end)
+
+    def copy(self) -> 'FantasmaConfig':
+        return FantasmaConfig.from_dict(self.to_dict())
 
     def validate(self) -> bool:
         """Validate configuration"""
         if self.mode == NetworkMode.HOTSPOT and self.target_interface.type == ConnectionType.WIFI:
             if not self.ssid or not self.password:
                 return False
+        try:
+            network = self.network
+            pool = (ipaddress.ip_address(self.dhcp_start), ipaddress.ip_address(self.dhcp_end))
+        except ValueError:
+            return False
+        if network.num_addresses < 4 or not all(address in network for address in pool):
+            return False
         return True
 
 
+class _Operation:
+    """A queued start/stop/prepare; coalesced callers wait on the same instance"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, config: Optional['FantasmaConfig'], runner: Callable):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.config = config
+        self.runner = runner
+        self.waiters = 1
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result = False
+        self.warm = False
+        self.done = threading.Event()
+        self._callbacks: List[Callable[['_Operation'], None]] = []
+        self._progress: List[Callable[[str, str], None]] = []
+        self._lock = threading.Lock()
+
+    def add_progress_listener(self, callback: Callable[[str, str], None]):
+        """Call callback(step, message) for each step while this operation runs"""
+        with self._lock:
+            self._progress.append(callback)
+
+    def report(self, step: str, message: str = ''):
+        """Forward a progress step to every caller waiting on this operation"""
+        with self._lock:
+            listeners = list(self._progress)
+        for callback in listeners:
+            try:
+                callback(step, message)
+            except Exception as e:
+                logging.getLogger("FantasmaCore").error(f"Error in progress listener: {e}")
+
+    def add_done_callback(self, callback: Callable[['_Operation'], None]):
+        """Call callback(operation) when finished (immediately if it already has)"""
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, result: bool):
+        """Record the result and release all waiters"""
+        self.result = result
+        self.finished_at = time.time()
+        with self._lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def matches(self, kind: str, config: Optional['FantasmaConfig']) -> bool:
+        """True if a request for kind/config would be redundant with this one"""
+        if kind != self.kind:
+            return False
+        return kind == 'stop' or config.to_dict() == self.config.to_dict()
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'waiters': self.waiters,
+            'queued_at': self.queued_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'warm': self.warm
+        }
+
+
 class PlatformAdapter(ABC):
     """
     Abstract base class for platform-specific implementations.
     Each platform (macOS, Linux, Windows, Termux) must implement these methods.
     """
 
+    # True if prepare() pre-warms anything (see prepare)
+    supports_standby = False
+
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._event_listeners: List[Callable[[str], None]] = []
+        self._progress: Optional[Callable[[str, str], None]] = None
+        self._journal: Optional[Callable[..., None]] = None
 
     @abstractmethod
     def detect_interfaces(self) -> List[NetworkInterface]:
@@ -127,6 +324,131 @@ class PlatformAdapter(ABC):
         """Check if current platform is supported"""
         pass
 
+    def add_event_listener(self, callback: Callable[[str], None]):
+        """
+        Register for adapter events
+
+        callback receives the kind of state that changed: 'interfaces'
+        (links or addresses) or 'status' (sharing daemons, bridge).
+        """
+        self._event_listeners.append(callback)
+
+    def _emit_event(self, kind: str):
+        """Notify event listeners"""
+        for callback in self._event_listeners:
+            try:
+                callback(kind)
+            except Exception as e:
+                self.logger.error(f"Error in event listener: {e}")
+
+    def _report_progress(self, step: str, message: str = ''):
+        """Report a step of the running start/stop (set up by FantasmaCore)"""
+        if self._progress is not None:
+            self._progress(step, message)
+
+    def _journal_step(self, kind: str, **data):
+        """
+        Record an applied step with what undoing it needs (set up by
+        FantasmaCore when it has a journal); call before applying it
+        """
+        if self._journal is not None:
+            self._journal(kind, **data)
+
+    def adopt(self, config: FantasmaConfig, steps: List[Dict[str, any]]) -> bool:
+        """
+        Check whether a session applied by a process that died (its
+        journal steps) is still intact, and take it over if so
+
+        Optional: by default sessions are never adopted, only rolled back.
+        """
+        return False
+
+    def rollback(self, steps: List[Dict[str, any]]) -> bool:
+        """
+        Undo journal steps applied by a process that died
+
+        Default: a regular stop_sharing() of this session.
+        """
+        return self.stop_sharing()
+
+    def prepare(self, config: FantasmaConfig) -> bool:
+        """
+        Bring sharing up to just short of serving, so activate() is fast
+
+        Daemons are started, configuration rendered and firewall rules
+        loaded, but nothing reaches clients until activate(). stop_sharing()
+        also tears down a prepared standby.
+
+        Optional: without support nothing is pre-warmed and activate()
+        performs a regular start.
+        """
+        return True
+
+    def activate(self, config: FantasmaConfig) -> bool:
+        """Start serving a configuration prepared by prepare()"""
+        if config.mode == NetworkMode.HOTSPOT:
+            return self.start_hotspot(config)
+        return self.start_bridge(config)
+
+    def for_session(self, session_id: str) -> Optional['PlatformAdapter']:
+        """
+        Create an adapter for an additional concurrent session
+
+        The returned adapter must keep its own bridge, configuration files,
+        firewall rules and daemons apart from every other session's, named
+        from session_id alone so another process can stop the session.
+
+        Optional: platforms sharing to one target at a time return None.
+        """
+        return None
+
+    def create_event_monitor(self):
+        """
+        Create a monitor that reports system changes through _emit_event
+
+        Optional: without one, cached probes simply expire by TTL.
+        The returned object must provide start() and stop().
+        """
+        return None
+
+    def create_flow_monitor(self, callback: Callable[[FlowEvent], None]):
+        """
+        Create a flow monitor that feeds FlowEvents to callback
+
+        Optional: platforms without connection tracking return None.
+        The returned object must provide start() and stop().
+        """
+        return None
+
+    def read_interface_counters(self) -> Dict[str, Dict[str, int]]:
+        """
+        Byte and packet counters by interface name (rx_bytes, tx_bytes,
+        rx_packets, tx_packets), for the metrics sampler
+
+        Optional: platforms without cheap counters (no process spawned)
+        return {}.
+        """
+        return {}
+
+    def read_conntrack_usage(self) -> Optional[Tuple[int, int]]:
+        """
+        (entries, maximum) of the host connection tracking table
+
+        Optional: platforms without connection tracking return None.
+        """
+        return None
+
+    def create_capture_monitor(self, interface: str, consumers: List, bpf_filter: Optional[str] = None):
+        """
+        Create a packet capture monitor on interface feeding consumers
+
+        Optional: used for passive latency analysis and where connection
+        tracking sees nothing (bridge mode). Consumers provide
+        process_block(ring, packets), see fantasma_capture.
+        The returned object must provide start() and stop().
+        """
+        return None
+
 
 class FantasmaCore:
     """
@@ -134,22 +456,128 @@ class FantasmaCore:
     Delegates OS-specific operations to platform adapters
     """
 
-    def __init__(self, adapter: PlatformAdapter):
+    # Seconds an adapter probe result (or the latency summary) is reused
+    CACHE_TTLS = {'interfaces': 10.0, 'status': 2.0, 'latency': 5.0}
+
+    # Cache keys invalidated by each adapter event kind
+    EVENT_INVALIDATES = {
+        'interfaces': ('interfaces', 'status'),
+        'status': ('status',)
+    }
+
+    def __init__(self, adapter: PlatformAdapter, cache_ttls: Optional[Dict[str, float]] = None,
+                 journal=None, session_id: str = 'default', metrics: Optional[MetricsRegistry] = None):
         self.adapter = adapter
+        self.session_id = session_id
+        # SessionJournal (fantasma_journal) recording what this session applied
+        self.journal = journal
+        if journal is not None:
+            adapter._journal = lambda kind, **data: self._journal_entry('step', kind=kind, **data)
         self.config: Optional[FantasmaConfig] = None
-        self.is_active = False
+        self.prepared: Optional[FantasmaConfig] = None
+        # True while a start activates the prepared standby (read by runners)
+        self.warm_start = False
+        self.start_latency = {
+            kind: {'count': 0, 'last': None, 'min': None, 'total': 0.0} for kind in ('cold', 'warm')
+        }
+        self.state = SessionState.IDLE
+        self.state_since = time.time()
+        # Bumped on every transition; part of get_version(). Starts at the
+        # creation time (microseconds) so an earlier process's versions are
+        # not reused
+        self._version_base = time.time_ns() // 1000
+        self._version = self._version_base
+        self.transitions: deque = deque(maxlen=100)
+        self.operations: deque = deque(maxlen=50)
+        self.state_listeners: List[Callable[[Dict[str, any]], None]] = []
+        self._queue: deque = deque()
+        self._queue_lock = threading.Lock()
+        self._draining = False
         self.logger = logging.getLogger("FantasmaCore")
+        self.cache = ProbeCache(self.CACHE_TTLS if cache_ttls is None else cache_ttls)
+        self.adapter.add_event_listener(self._on_adapter_event)
+        self._event_monitor = None
+        self.flow_table = FlowTable()
+        self.accounting = TrafficAccountant()
+        self.heavy_hitters = HeavyHitterTracker()
+        self.flow_consumers: List[Callable[[FlowEvent], None]] = [
+            self.accounting.process_event,
+            self.heavy_hitters.process_event
+        ]
+        self.latency = TcpLatencyAnalyzer()
+        self.packet_consumers: List = [self.latency]
+        self._client_counter = ClientPacketCounter(self.accounting)
+        self._flow_monitor = None
+        self._capture_monitor = None
+        # Metrics (fantasma_metrics), labelled by session
+        self.metrics = metrics_registry if metrics is None else metrics
+        self._state_metric = self.metrics.stateset(
+            'fantasma_session_state', 'Sharing session state', ('session',))
+        self._operation_metric = self.metrics.histogram(
+            'fantasma_operation_duration_seconds', 'Duration of queued operations (start, stop, prepare)',
+            ('session', 'kind', 'result'))
+        self._clients_metric = self.metrics.gauge(
+            'fantasma_clients', 'Clients with traffic accounted', ('session',))
+        self._evicted_metric = self.metrics.counter(
+            'fantasma_clients_evicted', 'Clients dropped from accounting (idle or over the limit)', ('session',))
+        self._flows_metric = self.metrics.gauge(
+            'fantasma_tracked_flows', 'Connection tracking flows followed by accounting', ('session',))
+        self._cache_metric = self.metrics.counter(
+            'fantasma_cache_lookups', 'Probe cache lookups by result (hit, miss, coalesced)',
+            ('session', 'key', 'result'))
+        self._hit_ratio_metric = self.metrics.gauge(
+            'fantasma_cache_hit_ratio', 'Probe cache lookups answered without a probe', ('session', 'key'))
+        self._set_state_metric()
 
     def detect_interfaces(self) -> List[NetworkInterface]:
-        """Detect available network interfaces"""
-        return self.adapter.detect_interfaces()
+        """Detect available network interfaces (cached, see CACHE_TTLS)"""
+        return list(self.cache.get('interfaces', self.adapter.detect_interfaces))
+
+    def watch_events(self) -> bool:
+        """
+        Start the adapter's event monitor so cached probes are invalidated
+        as soon as the system changes. Meant for long-running owners of the
+        core (daemon, web server).
+
+        Returns:
+            bool: True if the platform provides events
+        """
+        if self._event_monitor is None:
+            self._event_monitor = self.adapter.create_event_monitor()
+            if self._event_monitor is None:
+                return False
+            self._event_monitor.start()
+        return True
+
+    def unwatch_events(self):
+        """Stop the adapter's event monitor"""
+        if self._event_monitor is not None:
+            self._event_monitor.stop()
+            self._event_monitor = None
+
+    def _on_adapter_event(self, kind: str):
+        for key in self.EVENT_INVALIDATES.get(kind, ()):
+            self.cache.invalidate(key)
 
-    def start(self, config: FantasmaConfig) -> bool:
+    def get_cache_stats(self) -> Dict[str, Dict[str, any]]:
+        """Get probe cache hit/miss/coalesced counters and hit rates"""
+        return self.cache.get_stats()
+
+    @property
+    def is_active(self) -> bool:
+        return self.state == SessionState.ACTIVE
+
+    def start(self, config: FantasmaConfig,
+              progress: Optional[Callable[[str, str], None]] = None) -> bool:
         """
         Start network sharing with given configuration
         
+        Mutations are serialized through one queue. A start identical to
+        the last queued operation joins it and shares its result.
+        
         Args:
             config: FantasmaConfig object with mode and interface settings
+            progress: Optional callback(step, message) for each step taken
             
         Returns:
             bool: True if started successfully
@@ -157,55 +585,483 @@ class FantasmaCore:
         if not config.validate():
             self.logger.error("Invalid configuration")
             return False
+        return self.submit('start', config, self._adapter_start, progress)
 
-        if self.is_active:
-            self.logger.warning("Fantasma is already active. Stop it first.")
+    def prepare(self, config: FantasmaConfig,
+                progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        Pre-warm sharing for config (standby): a later start(config) only
+        activates it. Queued like start; stop() tears the standby down.
+
+        Returns:
+            bool: True if the session is in standby
+        """
+        if not config.validate():
+            self.logger.error("Invalid configuration")
             return False
+        return self.submit('prepare', config, self._adapter_prepare, progress)
 
-        self.config = config
-        
-        try:
-            if config.mode == NetworkMode.HOTSPOT:
-                success = self.adapter.start_hotspot(config)
-            elif config.mode == NetworkMode.BRIDGE:
-                success = self.adapter.start_bridge(config)
-            else:
-                self.logger.error(f"Unknown mode: {config.mode}")
-                return False
+    def stop(self, progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Stop network sharing (queued like start; repeated stops collapse)"""
+        return self.submit('stop', None, self._adapter_stop, progress)
 
-            if success:
-                self.is_active = True
-                self.logger.info(f"Fantasma started in {config.mode.value} mode")
-            return success
+    def reconfigure(self, config: FantasmaConfig,
+                    progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        Switch to a new configuration: a stop and a start queued back to
+        back, so no other mutation runs in between
 
-        except Exception as e:
-            self.logger.error(f"Error starting Fantasma: {e}")
+        Returns:
+            bool: True if sharing runs with the new configuration
+        """
+        if not config.validate():
+            self.logger.error("Invalid configuration")
             return False
+        operation = self.enqueue_reconfigure(config, self._adapter_stop, self._adapter_start, progress)
+        self.drain()
+        operation.done.wait()
+        return operation.result
 
-    def stop(self) -> bool:
-        """Stop network sharing"""
-        if not self.is_active:
-            self.logger.warning("Fantasma is not active")
-            return True
+    def enqueue_reconfigure(self, config: FantasmaConfig, stop_runner: Callable, start_runner: Callable,
+                            progress: Optional[Callable[[str, str], None]] = None) -> _Operation:
+        """Queue a stop and a start atomically; returns the start operation"""
+        with self._queue_lock:
+            self._enqueue_locked('stop', None, stop_runner, progress)
+            return self._enqueue_locked('start', config, start_runner, progress)
 
-        try:
-            success = self.adapter.stop_sharing()
+    def _adapter_start(self, config: FantasmaConfig) -> bool:
+        if self.warm_start:
+            return self.adapter.activate(config)
+        if config.mode == NetworkMode.HOTSPOT:
+            return self.adapter.start_hotspot(config)
+        elif config.mode == NetworkMode.BRIDGE:
+            return self.adapter.start_bridge(config)
+        self.logger.error(f"Unknown mode: {config.mode}")
+        return False
+
+    def _adapter_prepare(self, config: FantasmaConfig) -> bool:
+        return self.adapter.prepare(config)
+
+    def _adapter_stop(self, config: None) -> bool:
+        return self.adapter.stop_sharing()
+
+    def submit(self, kind: str, config: Optional[FantasmaConfig], runner: Callable,
+               progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Queue a 'start', 'stop' or 'prepare' and wait for its result"""
+        operation = self.enqueue(kind, config, runner, progress)
+        self.drain()
+        operation.done.wait()
+        return operation.result
+
+    def enqueue(self, kind: str, config: Optional[FantasmaConfig], runner: Callable,
+                progress: Optional[Callable[[str, str], None]] = None) -> _Operation:
+        """
+        Queue a 'start', 'stop' or 'prepare' without waiting, joining the last queued
+        operation if it is identical
+
+        runner(config) performs the adapter call; it lets the async core
+        run its own adapter through the same queue. progress(step, message)
+        receives the steps of the operation, joined or not.
+        """
+        with self._queue_lock:
+            return self._enqueue_locked(kind, config, runner, progress)
+
+    def _enqueue_locked(self, kind: str, config: Optional[FantasmaConfig], runner: Callable,
+                        progress: Optional[Callable[[str, str], None]]) -> _Operation:
+        last = self._queue[-1] if self._queue else None
+        if last is not None and last.matches(kind, config):
+            last.waiters += 1
+            operation = last
+        else:
+            operation = _Operation(kind, config, runner)
+            self._queue.append(operation)
+        if progress is not None:
+            operation.add_progress_listener(progress)
+        return operation
+
+    def drain(self):
+        """Run queued operations in order; only one thread drains at a time"""
+        with self._queue_lock:
+            if self._draining:
+                return
+            self._draining = True
+        while True:
+            with self._queue_lock:
+                # Leave the operation queued while it runs so that identical
+                # requests arriving meanwhile join it
+                if not self._queue:
+                    self._draining = False
+                    return
+                operation = self._queue[0]
+            operation.started_at = time.time()
+            self.adapter._progress = operation.report
+            try:
+                result = self._execute(operation)
+            except Exception as e:
+                self.logger.error(f"Error during {operation.kind}: {e}")
+                result = False
+            finally:
+                self.adapter._progress = None
+            with self._queue_lock:
+                self._queue.popleft()
+            operation.finish(result)
+            self.operations.append(operation.to_dict())
+            self._operation_metric.observe((self.session_id, operation.kind, 'ok' if result else 'failed'),
+                                           time.time() - operation.started_at)
+
+    def _execute(self, operation: _Operation) -> bool:
+        if operation.kind in ('start', 'prepare'):
+            if self.state == SessionState.ACTIVE:
+                self.logger.warning("Fantasma is already active. Stop it first.")
+                operation.report('rejected', 'Already active')
+                return False
+            if operation.kind == 'prepare':
+                return self._execute_prepare(operation)
+            config = operation.config
+            warm = self.state == SessionState.STANDBY
+            if warm and self.prepared.to_dict() != config.to_dict():
+                self.logger.warning("Standby is prepared for another configuration. Stop it first.")
+                operation.report('rejected', 'Standby prepared for another configuration')
+                return False
+            self.config = config
+            operation.warm = warm
+            if not warm:
+                self._journal_entry('begin', kind='start', config=config.to_dict(), pid=os.getpid())
+            self._transition(SessionState.STARTING, operation)
+            began = time.time()
+            self.warm_start = warm
+            try:
+                success = operation.runner(config)
+            except Exception as e:
+                self.logger.error(f"Error starting Fantasma: {e}")
+                success = False
+            finally:
+                self.warm_start = False
+            elapsed = time.time() - began
+            self.cache.invalidate()
+            self.prepared = None
             if success:
-                self.is_active = False
+                self._journal_entry('state', sync=True, state=SessionState.ACTIVE.value)
+                self._record_start_latency(warm, elapsed)
+                operation.report('activated' if warm else 'started',
+                                 f"{'Activated from standby' if warm else 'Started'} in {elapsed * 1000:.0f} ms")
+                self._start_monitors(config)
+                self._transition(SessionState.ACTIVE, operation)
+                self.logger.info(f"Fantasma started in {config.mode.value} mode"
+                                 f"{' from standby' if warm else ''} ({elapsed:.3f}s)")
+            else:
+                # A failed start (or activation) leaves nothing running
+                self._journal_entry('end', sync=True)
                 self.config = None
-                self.logger.info("Fantasma stopped")
+                self._transition(SessionState.IDLE, operation)
             return success
+
+        previous = self.state
+        if previous == SessionState.IDLE:
+            # Still clean up: sharing may have been started by another process
+            self.logger.warning("Fantasma is not active, cleaning up anyway")
+        self._transition(SessionState.STOPPING, operation)
+        self._stop_monitors()
+        try:
+            success = operation.runner(None)
         except Exception as e:
             self.logger.error(f"Error stopping Fantasma: {e}")
-            return False
+            success = False
+        self.cache.invalidate()
+        if success:
+            self._journal_entry('end', sync=True)
+            self.config = None
+            self.prepared = None
+            self._transition(SessionState.IDLE, operation)
+            self.logger.info("Fantasma stopped")
+        else:
+            self._transition(previous, operation)
+        return success
+
+    def _execute_prepare(self, operation: _Operation) -> bool:
+        config = operation.config
+        self._journal_entry('begin', kind='prepare', config=config.to_dict(), pid=os.getpid())
+        self._transition(SessionState.PREPARING, operation)
+        try:
+            success = operation.runner(config)
+        except Exception as e:
+            self.logger.error(f"Error preparing standby: {e}")
+            success = False
+        self.cache.invalidate()
+        if success:
+            self._journal_entry('state', sync=True, state=SessionState.STANDBY.value)
+            self.prepared = config
+            self._transition(SessionState.STANDBY, operation)
+            self.logger.info(f"Standby prepared in {config.mode.value} mode")
+        else:
+            self._journal_entry('end', sync=True)
+            self.prepared = None
+            self._transition(SessionState.IDLE, operation)
+        return success
+
+    def _journal_entry(self, op: str, sync: bool = False, **data):
+        """Append to the journal (sync: wait until it is on disk)"""
+        if self.journal is None:
+            return
+        try:
+            if sync:
+                self.journal.record(self.session_id, op, **data)
+            else:
+                self.journal.append(self.session_id, op, **data)
+        except OSError as e:
+            self.logger.error(f"Error writing journal: {e}")
+
+    def recover(self, record: Dict[str, any]) -> str:
+        """
+        Take over or undo a session left open in the journal by a process
+        that died (see SessionJournal.open_sessions)
+
+        A session that reached active or standby and that the adapter finds
+        intact is adopted as is; anything else is rolled back step by step.
+        Meant to run once at startup, before any start or stop.
+
+        Returns:
+            str: 'adopted' or 'rolled_back'
+        """
+        began = time.time()
+        config = FantasmaConfig.from_dict(record['config']) if record['config'] else None
+        state = {
+            SessionState.ACTIVE.value: SessionState.ACTIVE,
+            SessionState.STANDBY.value: SessionState.STANDBY
+        }.get(record['state'])
+        operation = _Operation('recover', config, None)
+        operation.started_at = began
+        if state is not None and config is not None and self.adapter.adopt(config, record['steps']):
+            self._journal_entry('owner', sync=True, pid=os.getpid())
+            if state == SessionState.ACTIVE:
+                self.config = config
+                # A second recovery must not leave the first monitors running
+                self._stop_monitors()
+                self._start_monitors(config)
+            else:
+                self.prepared = config
+            self._transition(state, operation)
+            result = 'adopted'
+        else:
+            try:
+                self.adapter.rollback(record['steps'])
+            except Exception as e:
+                self.logger.error(f"Error rolling back session {self.session_id}: {e}")
+            self._journal_entry('end', sync=True)
+            result = 'rolled_back'
+        self.cache.invalidate()
+        operation.finish(True)
+        self.operations.append(operation.to_dict())
+        self.logger.info(f"Session {self.session_id} {result.replace('_', ' ')} "
+                         f"({len(record['steps'])} steps, {(time.time() - began) * 1000:.1f} ms)")
+        return result
+
+    def _record_start_latency(self, warm: bool, elapsed: float):
+        stats = self.start_latency['warm' if warm else 'cold']
+        stats['count'] += 1
+        stats['last'] = elapsed
+        stats['total'] += elapsed
+        stats['min'] = elapsed if stats['min'] is None else min(stats['min'], elapsed)
+
+    def get_start_latency(self) -> Dict[str, Dict[str, any]]:
+        """Start latencies (seconds) from cold and from standby"""
+        return {
+            kind: {
+                'count': stats['count'],
+                'last': stats['last'],
+                'min': stats['min'],
+                'mean': stats['total'] / stats['count'] if stats['count'] else None
+            }
+            for kind, stats in self.start_latency.items()
+        }
+
+    def _transition(self, state: SessionState, operation: _Operation):
+        """Move to state and notify state listeners"""
+        now = time.time()
+        event = {
+            'from': self.state.value,
+            'to': state.value,
+            'timestamp': now,
+            'elapsed': now - self.state_since,
+            'operation': operation.id,
+            'kind': operation.kind
+        }
+        self.state = state
+        self.state_since = now
+        self._version += 1
+        self._set_state_metric()
+        self.transitions.append(event)
+        operation.report(state.value, f"{operation.kind}: {event['from']} -> {state.value}")
+        for listener in self.state_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                self.logger.error(f"Error in state listener: {e}")
+
+    def _set_state_metric(self):
+        for state in SessionState:
+            self._state_metric.set((self.session_id, state.value), int(state == self.state))
+
+    def collect_metrics(self):
+        """Copy accounting and cache counters into the metrics registry (in memory, no probes)"""
+        session = self.session_id
+        summary = self.accounting.get_summary()
+        self._clients_metric.set((session,), summary['clients'])
+        self._evicted_metric.set((session,), summary['evicted_clients'])
+        self._flows_metric.set((session,), len(self.flow_table))
+        for key, stats in self.cache.get_stats().items():
+            for result, field in (('hit', 'hits'), ('miss', 'misses'), ('coalesced', 'coalesced')):
+                self._cache_metric.set((session, key, result), stats[field])
+            self._hit_ratio_metric.set((session, key), stats['hit_rate'])
+
+    def get_metrics(self) -> str:
+        """Metrics registry as OpenMetrics text (without the final '# EOF')"""
+        return self.metrics.render()
+
+    def get_state(self) -> Dict[str, any]:
+        """Session state, recent transitions and recent operations"""
+        with self._queue_lock:
+            pending = [operation.to_dict() for operation in self._queue]
+        prepared = self.prepared
+        return {
+            'state': self.state.value,
+            'since': self.state_since,
+            'standby': {
+                'mode': prepared.mode.value,
+                'source_interface': prepared.source_interface.name,
+                'target_interface': prepared.target_interface.name,
+                'prewarmed': self.adapter.supports_standby
+            } if prepared else None,
+            'start_latency': self.get_start_latency(),
+            'pending': pending,
+            'transitions': list(self.transitions),
+            'operations': list(self.operations)
+        }
 
     def get_status(self) -> Dict[str, any]:
-        """Get current status"""
-        status = self.adapter.get_status()
+        """Get current status (adapter probe and latency summary cached, see CACHE_TTLS)"""
+        status = dict(self.cache.get('status', self.adapter.get_status))
         status['is_active'] = self.is_active
+        status['state'] = self.state.value
         status['config'] = self.config
+        status['latency'] = self.cache.get('latency', self.latency.get_summary)
         return status
 
+    def get_version(self) -> int:
+        """
+        Version of what get_status() reports: moves on state transitions,
+        adapter events and probe results that changed
+
+        Never probes while the event monitor runs (events invalidate the
+        cache); without it, at most one probe per status TTL.
+        """
+        if self._event_monitor is None:
+            self.cache.get('status', self.adapter.get_status)
+        self.cache.get('latency', self.latency.get_summary)
+        return self._version + self.cache.version('status') + self.cache.version('latency')
+
+    def get_interfaces_version(self) -> int:
+        """Version of what detect_interfaces() reports (see get_version)"""
+        if self._event_monitor is None:
+            self.cache.get('interfaces', self.adapter.detect_interfaces)
+        return self._version_base + self.cache.version('interfaces')
+
+    def get_latency(self, client: Optional[str] = None):
+        """
+        Get passive TCP latency analysis
+
+        Args:
+            client: Client IP address, or None for all clients
+
+        Returns:
+            Handshake RTT histograms (uplink and WLAN legs) and retransmission
+            rates for one client (None if unknown), or a dict keyed by client
+        """
+        if client:
+            return self.latency.get_client(client)
+        return self.latency.get_clients()
+
+    def get_latency_summary(self) -> Dict[str, any]:
+        """Get latency analysis aggregated over all clients"""
+        return self.latency.get_summary()
+
+    def get_traffic(self, client: Optional[str] = None, window: Optional[float] = None):
+        """
+        Get per-client traffic accounting
+
+        Args:
+            client: Client IP address, or None for all clients
+            window: Optional window in seconds for windowed totals and rates
+
+        Returns:
+            Dict for a single client (None if unknown), or a list of dicts
+        """
+        if client:
+            return self.accounting.get_client(client, window=window)
+        return self.accounting.get_clients(window=window)
+
+    def get_traffic_summary(self) -> Dict[str, int]:
+        """Get traffic accounting bookkeeping counters"""
+        return dict(self.accounting.get_summary(), tracked_flows=len(self.flow_table))
+
+    def get_top(self, dimension: str = 'talkers', k: int = 10, window: Optional[float] = None):
+        """
+        Get the heaviest talkers, destinations or ports by bytes
+
+        Args:
+            dimension: 'talkers', 'destinations' or 'ports'
+            k: Number of entries
+            window: Seconds to look back, or None for all retained windows
+        """
+        return self.heavy_hitters.top(dimension, k=k, window=window)
+
+    def get_top_summary(self) -> Dict[str, int]:
+        """Get heavy-hitter tracker sizing and memory figures"""
+        return self.heavy_hitters.get_summary()
+
+    def _dispatch_flow_event(self, event: FlowEvent):
+        """Convert a flow event to a delta and fan it out to all consumers"""
+        delta = self.flow_table.observe(event)
+        for consumer in self.flow_consumers:
+            consumer(delta)
+
+    def _start_monitors(self, config: FantasmaConfig):
+        """Start the adapter's flow and packet monitors, where available"""
+        self.accounting.set_subnet(config.ip_range)
+        try:
+            self._flow_monitor = self.adapter.create_flow_monitor(self._dispatch_flow_event)
+            if self._flow_monitor:
+                self._flow_monitor.start()
+        except Exception as e:
+            self.logger.warning(f"Traffic accounting unavailable: {e}")
+            self._flow_monitor = None
+
+        consumers = list(self.packet_consumers)
+        bpf_filter = 'tcp'
+        if config.mode == NetworkMode.BRIDGE:
+            # Bridged frames bypass conntrack, so count them from the wire
+            consumers.append(self._client_counter)
+            bpf_filter = None
+        try:
+            self._capture_monitor = self.adapter.create_capture_monitor(
+                config.target_interface.name, consumers, bpf_filter=bpf_filter
+            )
+            if self._capture_monitor:
+                self._capture_monitor.start()
+        except Exception as e:
+            self.logger.warning(f"Packet capture unavailable: {e}")
+            self._capture_monitor = None
+
+    def _stop_monitors(self):
+        """Stop flow and packet monitors, keeping collected accounting data"""
+        if self._flow_monitor:
+            self._flow_monitor.stop()
+            self._flow_monitor = None
+        if self._capture_monitor:
+            self._capture_monitor.stop()
+            self._capture_monitor = None
+        self.flow_table.clear()
+
 
 def get_platform_adapter() -> PlatformAdapter:
     """
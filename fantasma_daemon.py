@@ -0,0 +1,666 @@
+#!/usr/bin/env python3
+"""
+FantasmaWiFi-Pro Daemon
+Long-running owner of FantasmaCore with a thin client over a Unix socket
+
+The daemon holds the only FantasmaCore (adapter, session state, monitors)
+and answers newline-delimited JSON requests:
+
+    -> {"id": 1, "method": "get_status", "params": {}}
+    <- {"id": 1, "ok": true, "result": {...}}
+    <- {"id": 1, "ok": false, "error": "..."}
+
+Each call uses a connection of its own, taken from a small pool of idle
+ones, so a slow start does not hold up other callers. Only the daemon's
+own user (or root) may connect; its files live in a private 0700 runtime
+directory (see runtime_dir). Status is refreshed in the background and served from memory, so `status` is a
+socket round trip rather than a full adapter probe. Each refresh is also
+published as a memory-mapped snapshot (see fantasma_snapshot) that readers
+can poll without talking to the daemon at all.
+"""
+
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from _version import __version__
+from fantasma_core import (
+    FantasmaCore,
+    FantasmaConfig,
+    NetworkInterface,
+    get_platform_adapter
+)
+from fantasma_journal import SessionJournal
+from fantasma_metrics import registry as metrics_registry
+from fantasma_sessions import DEFAULT_SESSION, SessionError, SessionManager
+from fantasma_snapshot import SnapshotReader, SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Snapshots older than this are treated as left behind by a dead daemon
+SNAPSHOT_MAX_AGE = 10.0
+
+
+def _check_owned(path: str, directory: bool = False):
+    """
+    Refuse a runtime path that another user could have planted
+
+    Raises:
+        PermissionError: path is a symlink, not owned by the effective
+        user, or (for a directory) open to group or others
+    """
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} is not owned by uid {os.geteuid()}")
+    if directory and (not stat.S_ISDIR(info.st_mode) or info.st_mode & 0o077):
+        raise PermissionError(f"{path} must be a directory with mode 0700")
+
+
+def runtime_dir() -> str:
+    """
+    Private runtime directory, created 0700 if missing: /run/fantasma for
+    root, else $XDG_RUNTIME_DIR/fantasma (or /tmp/fantasma-<uid>)
+
+    Raises:
+        PermissionError: the directory exists but is not private to this user
+    """
+    if os.geteuid() == 0:
+        path = '/run/fantasma'
+    elif os.environ.get('XDG_RUNTIME_DIR'):
+        path = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'fantasma')
+    else:
+        path = f'/tmp/fantasma-{os.geteuid()}'
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    _check_owned(path, directory=True)
+    return path
+
+
+def _runtime_path(filename: str, env_var: str) -> str:
+    """
+    Resolve a runtime file: $env_var, else filename in runtime_dir()
+
+    Raises:
+        PermissionError: the file (or the runtime directory) exists but
+        belongs to another user
+    """
+    path = os.environ.get(env_var) or os.path.join(runtime_dir(), filename)
+    if os.path.lexists(path):
+        _check_owned(path)
+    return path
+
+
+def default_socket_path() -> str:
+    """Daemon socket path ($FANTASMA_SOCKET overrides)"""
+    return _runtime_path('fantasma.sock', 'FANTASMA_SOCKET')
+
+
+def default_snapshot_path() -> str:
+    """Status snapshot path ($FANTASMA_SNAPSHOT overrides)"""
+    return _runtime_path('fantasma.status', 'FANTASMA_SNAPSHOT')
+
+
+def default_journal_path() -> str:
+    """Session journal path ($FANTASMA_JOURNAL overrides)"""
+    return _runtime_path('fantasma.journal', 'FANTASMA_JOURNAL')
+
+
+def default_web_state_path() -> str:
+    """Web server state file path ($FANTASMA_WEB_STATE overrides)"""
+    return _runtime_path('fantasma-web.json', 'FANTASMA_WEB_STATE')
+
+
+def open_journal(path: Optional[str] = None) -> Optional[SessionJournal]:
+    """
+    Session journal at path (default_journal_path()), or None if it cannot
+    be opened or belongs to another user
+    """
+    try:
+        path = path or default_journal_path()
+        if os.path.lexists(path):
+            _check_owned(path)
+        return SessionJournal(path)
+    except OSError as e:
+        logger.warning(f"Session journal unavailable, running without one: {e}")
+        return None
+
+
+def read_snapshot(reader: SnapshotReader) -> Optional[Dict[str, Any]]:
+    """Current snapshot from reader, or None if missing or stale"""
+    snapshot = reader.read()
+    if snapshot is None or snapshot['age'] > SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
+
+
+class DaemonError(Exception):
+    """Raised by DaemonClient when the daemon reports a failed request"""
+
+    def __init__(self, message: str, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def serialize_status(status: Dict[str, Any]) -> Dict[str, Any]:
+    """Make a FantasmaCore status dict JSON-compatible"""
+    status = dict(status)
+    if status.get('config') is not None:
+        status['config'] = status['config'].to_dict()
+    return status
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: read JSON lines, write JSON lines"""
+
+    def handle(self):
+        daemon: 'FantasmaDaemon' = self.server.daemon
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get('id')
+                result = daemon.dispatch(request['method'], request.get('params') or {})
+                response = {'id': request_id, 'ok': True, 'result': result}
+            except Exception as e:
+                response = {'id': request_id, 'ok': False, 'error': str(e), 'type': type(e).__name__}
+            try:
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def verify_request(self, request, client_address) -> bool:
+        """Accept only the daemon's own user and root (Linux peer credentials)"""
+        if not hasattr(socket, 'SO_PEERCRED'):
+            # Elsewhere the private runtime directory is the only gate
+            return True
+        credentials = request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, _ = struct.unpack('3i', credentials)
+        if uid in (0, os.geteuid()):
+            return True
+        logger.warning(f"Refused daemon connection from pid {pid} (uid {uid})")
+        return False
+
+
+class FantasmaDaemon:
+    """Owns a FantasmaCore (and its sessions) and serves it on a Unix domain socket"""
+
+    def __init__(self, core: FantasmaCore, socket_path: Optional[str] = None,
+                 status_interval: float = 2.0, snapshot_path: Optional[str] = None,
+                 sessions: Optional[SessionManager] = None):
+        self.core = core
+        self.sessions = sessions or SessionManager(core)
+        # The daemon owns the sessions: take over what a dead process left open
+        self.sessions.recover()
+        self.socket_path = socket_path or default_socket_path()
+        self.snapshot_path = snapshot_path or default_snapshot_path()
+        self.status_interval = status_interval
+        self._snapshot: Optional[SnapshotWriter] = None
+        self.started_at = time.time()
+        core.metrics.gauge('fantasma_daemon_start_time_seconds', 'When the daemon process started (moves on restart)',
+                           unit='seconds').set((), self.started_at)
+        self._server: Optional[_UnixServer] = None
+        self._stop = threading.Event()
+        self._status: Dict[str, Any] = {}
+        self._status_lock = threading.Lock()
+        self._methods: Dict[str, Callable[..., Any]] = {
+            'ping': self._ping,
+            'detect_interfaces': self._detect_interfaces,
+            'start': self._start,
+            'stop': self._stop_sharing,
+            'reconfigure': self._reconfigure,
+            'prepare': self._prepare,
+            'get_status': self._get_status,
+            'get_traffic': self.core.get_traffic,
+            'get_traffic_summary': self.core.get_traffic_summary,
+            'get_top': self.core.get_top,
+            'get_top_summary': self.core.get_top_summary,
+            'get_latency': self.core.get_latency,
+            'get_latency_summary': self.core.get_latency_summary,
+            'get_cache_stats': self.core.get_cache_stats,
+            'get_state': self.core.get_state,
+            'get_version': self.core.get_version,
+            'get_interfaces_version': self.core.get_interfaces_version,
+            'get_metrics': self.core.get_metrics,
+            'list_sessions': self.sessions.get_status,
+            'get_sessions_summary': self.sessions.get_summary,
+            'get_session': self.sessions.get_session,
+            'session_start': self._session_start,
+            'session_stop': self._session_stop,
+            'session_reconfigure': self._session_reconfigure,
+            'session_prepare': self._session_prepare,
+            'remove_session': self.sessions.remove,
+        }
+
+    def dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        """Run one protocol method"""
+        handler = self._methods.get(method)
+        if handler is None:
+            raise ValueError(f"Unknown method: {method}")
+        return handler(**params)
+
+    # Protocol methods
+
+    def _ping(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'version': __version__,
+            'uptime': time.time() - self.started_at
+        }
+
+    def _detect_interfaces(self) -> List[Dict[str, Any]]:
+        return [iface.to_dict() for iface in self.core.detect_interfaces()]
+
+    def _start(self, config: Dict[str, Any]) -> bool:
+        return self._session_start(DEFAULT_SESSION, config)
+
+    def _stop_sharing(self) -> bool:
+        return self._session_stop(DEFAULT_SESSION)
+
+    def _reconfigure(self, config: Dict[str, Any]) -> bool:
+        return self._session_reconfigure(DEFAULT_SESSION, config)
+
+    def _prepare(self, config: Dict[str, Any]) -> bool:
+        return self._session_prepare(DEFAULT_SESSION, config)
+
+    def _session_start(self, session: str, config: Dict[str, Any]) -> bool:
+        success = self.sessions.start(session, FantasmaConfig.from_dict(config))
+        self.refresh_status()
+        return success
+
+    def _session_stop(self, session: str) -> bool:
+        success = self.sessions.stop(session)
+        self.refresh_status()
+        return success
+
+    def _session_reconfigure(self, session: str, config: Dict[str, Any]) -> bool:
+        success = self.sessions.reconfigure(session, FantasmaConfig.from_dict(config))
+        self.refresh_status()
+        return success
+
+    def _session_prepare(self, session: str, config: Dict[str, Any]) -> bool:
+        success = self.sessions.prepare(session, FantasmaConfig.from_dict(config))
+        self.refresh_status()
+        return success
+
+    def _get_status(self, fresh: bool = False) -> Dict[str, Any]:
+        if fresh or not self._status:
+            return self.refresh_status()
+        with self._status_lock:
+            return self._status
+
+    # Lifecycle
+
+    def refresh_status(self) -> Dict[str, Any]:
+        """Probe the adapter, replace the served status and publish a snapshot"""
+        # Version first: the status read after it is at least that new
+        version = self.core.get_version()
+        raw = self.core.get_status()
+        raw['sessions'] = self.sessions.get_summary()
+        status = serialize_status(raw)
+        status['updated_at'] = time.time()
+        with self._status_lock:
+            self._status = status
+            if self._snapshot:
+                self._snapshot.publish(raw, self.core.get_traffic_summary(), version)
+        return status
+
+    def _status_loop(self):
+        while not self._stop.wait(self.status_interval):
+            try:
+                self.refresh_status()
+            except Exception as e:
+                logger.error(f"Error refreshing status: {e}")
+            try:
+                self.sessions.collect_metrics()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+
+    def serve_forever(self):
+        """Bind the socket and serve until shutdown()"""
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).is_available():
+                raise RuntimeError(f"A Fantasma daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.daemon = self
+        os.chmod(self.socket_path, 0o600)
+
+        try:
+            self._snapshot = SnapshotWriter(self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Status snapshot disabled ({self.snapshot_path}): {e}")
+
+        self.core.watch_events()
+        self.refresh_status()
+        threading.Thread(target=self._status_loop, daemon=True).start()
+        logger.info(f"Fantasma daemon listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stop.set()
+            self.core.unwatch_events()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            if self._snapshot:
+                self._snapshot.close()
+
+    def shutdown(self):
+        """Stop serving (sharing stays as it is)"""
+        self._stop.set()
+        if self._server:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+# Calls that had to reconnect, e.g. because the daemon restarted
+daemon_reconnects = metrics_registry.counter(
+    'fantasma_daemon_reconnects', 'Daemon calls that reconnected (e.g. after a daemon restart)')
+
+
+class _Connection:
+    """One socket to the daemon, used by one call at a time"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(socket_path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.reader = self.sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class DaemonClient:
+    """
+    JSON-lines connections to a FantasmaDaemon
+
+    Each call takes a connection of its own (reusing an idle one), so a
+    long start or stop does not hold up other threads' calls.
+    """
+
+    # Calls safe to send again when the connection broke after the request
+    # went out (the daemon may already have run it)
+    RETRYABLE_METHODS = frozenset({
+        'ping', 'detect_interfaces', 'get_status', 'get_traffic', 'get_traffic_summary', 'get_top',
+        'get_top_summary', 'get_latency', 'get_latency_summary', 'get_cache_stats', 'get_state',
+        'get_version', 'get_interfaces_version', 'get_metrics', 'list_sessions',
+        'get_sessions_summary', 'get_session'
+    })
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 120.0, max_idle: int = 4):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: List[_Connection] = []
+        self._next_id = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Tuple[_Connection, bool]:
+        """An idle connection (reused=True) or a new one"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return _Connection(self.socket_path, self.timeout), False
+
+    def _release(self, connection: _Connection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Close idle connections (calls in progress close theirs when done)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def call(self, method: str, **params) -> Any:
+        """
+        Call a daemon method
+
+        A reused connection that turns out to be broken (e.g. after a daemon
+        restart) is replaced once, if the request had not gone out yet or
+        the method is in RETRYABLE_METHODS.
+
+        Raises:
+            OSError: daemon not reachable
+            DaemonError: the method failed inside the daemon
+        """
+        request = json.dumps({'id': next(self._next_id), 'method': method, 'params': params}).encode() + b'\n'
+        while True:
+            connection, reused = self._acquire()
+            sent = False
+            try:
+                connection.sock.sendall(request)
+                sent = True
+                line = connection.reader.readline()
+                if not line:
+                    raise ConnectionResetError("Daemon closed the connection")
+            except OSError:
+                connection.close()
+                # Only a stale idle connection is worth another try, and
+                # never by repeating a call the daemon may have run
+                if not reused or (sent and method not in self.RETRYABLE_METHODS):
+                    raise
+                daemon_reconnects.inc()
+                self.close()
+                continue
+            self._release(connection)
+            break
+
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error', 'Unknown daemon error'), response.get('type'))
+        return response.get('result')
+
+    def is_available(self) -> bool:
+        """True if a daemon answers on the socket"""
+        try:
+            self.call('ping')
+            return True
+        except (OSError, DaemonError, ValueError):
+            self.close()
+            return False
+
+
+class RemoteFantasmaCore:
+    """
+    FantasmaCore stand-in that forwards to a daemon
+
+    Offers the same public methods as FantasmaCore, so the CLI and web
+    server can use either one.
+    """
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+
+    def detect_interfaces(self) -> List[NetworkInterface]:
+        return [NetworkInterface.from_dict(data) for data in self.client.call('detect_interfaces')]
+
+    # Progress steps happen inside the daemon and are not forwarded over the
+    # socket; callers only see the final result
+    def start(self, config: FantasmaConfig, progress=None) -> bool:
+        return self.client.call('start', config=config.to_dict())
+
+    def stop(self, progress=None) -> bool:
+        return self.client.call('stop')
+
+    def reconfigure(self, config: FantasmaConfig, progress=None) -> bool:
+        return self.client.call('reconfigure', config=config.to_dict())
+
+    def prepare(self, config: FantasmaConfig, progress=None) -> bool:
+        return self.client.call('prepare', config=config.to_dict())
+
+    def get_status(self, fresh: bool = False) -> Dict[str, Any]:
+        status = self.client.call('get_status', fresh=fresh)
+        if status.get('config') is not None:
+            status['config'] = FantasmaConfig.from_dict(status['config'])
+        return status
+
+    @property
+    def is_active(self) -> bool:
+        return self.get_status().get('is_active', False)
+
+    @property
+    def config(self) -> Optional[FantasmaConfig]:
+        return self.get_status().get('config')
+
+    def get_traffic(self, client: Optional[str] = None, window: Optional[float] = None):
+        return self.client.call('get_traffic', client=client, window=window)
+
+    def get_traffic_summary(self) -> Dict[str, int]:
+        return self.client.call('get_traffic_summary')
+
+    def get_top(self, dimension: str = 'talkers', k: int = 10, window: Optional[float] = None):
+        return self.client.call('get_top', dimension=dimension, k=k, window=window)
+
+    def get_top_summary(self) -> Dict[str, int]:
+        return self.client.call('get_top_summary')
+
+    def get_latency(self, client: Optional[str] = None):
+        return self.client.call('get_latency', client=client)
+
+    def get_latency_summary(self) -> Dict[str, Any]:
+        return self.client.call('get_latency_summary')
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.client.call('get_cache_stats')
+
+    def get_state(self) -> Dict[str, Any]:
+        return self.client.call('get_state')
+
+    def get_version(self) -> int:
+        return self.client.call('get_version')
+
+    def get_interfaces_version(self) -> int:
+        return self.client.call('get_interfaces_version')
+
+    def get_metrics(self) -> str:
+        return self.client.call('get_metrics')
+
+
+class RemoteSessionManager:
+    """SessionManager stand-in that forwards to a daemon"""
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+
+    def _call(self, method: str, **params) -> Any:
+        try:
+            return self.client.call(method, **params)
+        except DaemonError as e:
+            if e.error_type == 'SessionError':
+                raise SessionError(str(e))
+            raise
+
+    # As with RemoteFantasmaCore, progress steps stay inside the daemon
+    def start(self, session_id: str, config: FantasmaConfig, progress=None) -> bool:
+        return self._call('session_start', session=session_id, config=config.to_dict())
+
+    def stop(self, session_id: str, progress=None) -> bool:
+        return self._call('session_stop', session=session_id)
+
+    def reconfigure(self, session_id: str, config: FantasmaConfig, progress=None) -> bool:
+        return self._call('session_reconfigure', session=session_id, config=config.to_dict())
+
+    def prepare(self, session_id: str, config: FantasmaConfig, progress=None) -> bool:
+        return self._call('session_prepare', session=session_id, config=config.to_dict())
+
+    def remove(self, session_id: str):
+        self._call('remove_session', session_id=session_id)
+
+    def get_summary(self) -> Dict[str, Any]:
+        return self._call('get_sessions_summary')
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._call('get_session', session_id=session_id)
+
+    def get_status(self) -> Dict[str, Any]:
+        return self._call('list_sessions')
+
+
+def connect_sessions(core) -> Any:
+    """SessionManager for a core from connect_core (local or daemon)"""
+    if isinstance(core, RemoteFantasmaCore):
+        return RemoteSessionManager(core.client)
+    return SessionManager(core)
+
+
+def connect_core(socket_path: Optional[str] = None, fallback: bool = True):
+    """
+    Get a core to work with
+
+    Returns a RemoteFantasmaCore if a daemon is running, otherwise (when
+    fallback is True) a local FantasmaCore on the platform adapter.
+    """
+    client = DaemonClient(socket_path)
+    if client.is_available():
+        logger.debug(f"Using Fantasma daemon at {client.socket_path}")
+        return RemoteFantasmaCore(client)
+    if not fallback:
+        raise ConnectionError(f"No Fantasma daemon at {client.socket_path}")
+    return FantasmaCore(get_platform_adapter(), journal=open_journal())
+
+
+def main():
+    """Run the daemon in the foreground"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='FantasmaWiFi-Pro daemon')
+    parser.add_argument('--socket', default=None, help='Unix socket path')
+    parser.add_argument('--snapshot', default=None, help='Status snapshot file path')
+    parser.add_argument('--journal', default=None, help='Session journal file path')
+    parser.add_argument('--status-interval', type=float, default=2.0,
+                        help='Seconds between background status refreshes')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose logging')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    daemon = FantasmaDaemon(
+        FantasmaCore(get_platform_adapter(), journal=open_journal(args.journal)),
+        socket_path=args.socket,
+        status_interval=args.status_interval,
+        snapshot_path=args.snapshot
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
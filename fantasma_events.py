@@ -0,0 +1,93 @@
+"""
+FantasmaWiFi-Pro Events
+Sequenced event bus with a bounded replay buffer
+
+Every published event gets the next sequence number of the bus. Clients
+remember the last number they saw and, after a reconnect (or a restart of
+the web server), ask for everything after it. The bus answers from its
+buffer, or tells the client to resynchronize from full state when the gap
+is no longer covered.
+
+A bus is identified by an epoch: sequence numbers only compare within one
+epoch. A restored bus (see to_dict/restore) keeps its epoch and numbering,
+so subscribers resume across a restart; a fresh one starts a new epoch.
+"""
+
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    Publish events with sequence numbers and replay them on request
+
+    Args:
+        capacity: Events kept for replay (oldest dropped first)
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.epoch = uuid.uuid4().hex[:12]
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._buffer: deque = deque(maxlen=capacity)
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest event (0 if none yet)"""
+        return self._seq
+
+    def publish(self, name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Record an event and hand it to the listeners"""
+        with self._lock:
+            self._seq += 1
+            event = {'seq': self._seq, 'event': name, 'data': data, 'ts': time.time()}
+            self._buffer.append(event)
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in event listener: {e}")
+        return event
+
+    def since(self, seq: int, epoch: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Events after seq, oldest first
+
+        Returns None when they cannot be replayed: another epoch, a seq
+        ahead of this bus, or events already dropped from the buffer.
+        """
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return None
+            if seq > self._seq:
+                return None
+            oldest = self._buffer[0]['seq'] if self._buffer else self._seq + 1
+            if seq < oldest - 1:
+                return None
+            return [event for event in self._buffer if event['seq'] > seq]
+
+    def position(self) -> Dict[str, Any]:
+        """Current epoch and seq (what a subscriber resumes from)"""
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self._seq}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready epoch, numbering and buffered events"""
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self._seq, 'events': list(self._buffer)}
+
+    def restore(self, data: Dict[str, Any]):
+        """Continue a bus saved by to_dict() (same epoch, next sequence numbers)"""
+        with self._lock:
+            self.epoch = data['epoch']
+            self._seq = data['seq']
+            self._buffer.clear()
+            self._buffer.extend(data.get('events', []))
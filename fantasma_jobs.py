@@ -0,0 +1,235 @@
+"""
+FantasmaWiFi-Pro Jobs
+Background jobs for long-running operations (start, stop, reconfigure)
+
+A job runs in its own thread and records timestamped progress events.
+Callers get a job ID immediately and poll it, or follow its events.
+Requests carrying an idempotency key attach to the job created by the
+first request with that key instead of starting another one.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different kind of job"""
+
+
+class JobFailed(Exception):
+    """Raised by a job target to fail the job and still record a result"""
+
+    def __init__(self, message: str, result: Any = None):
+        super().__init__(message)
+        self.result = result
+
+
+class Job:
+    """One background operation and its progress events"""
+
+    def __init__(self, kind: str, idempotency_key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.idempotency_key = idempotency_key
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = threading.Condition()
+        self._listeners: List[Callable[['Job', Dict[str, Any]], None]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def progress(self, step: str, message: str = ''):
+        """Record a progress event (callable as a core progress callback)"""
+        with self._changed:
+            event = {
+                'seq': len(self.events) + 1,
+                'job_id': self.id,
+                'kind': self.kind,
+                'step': step,
+                'message': message,
+                'status': self.status,
+                'timestamp': time.time()
+            }
+            self.events.append(event)
+            self._changed.notify_all()
+        for listener in self._listeners:
+            try:
+                listener(self, event)
+            except Exception as e:
+                logger.error(f"Error in job listener: {e}")
+
+    def _set_status(self, status: str, step: str, message: str = ''):
+        with self._changed:
+            self.status = status
+            now = time.time()
+            if status == JOB_RUNNING:
+                self.started_at = now
+            elif status in (JOB_SUCCEEDED, JOB_FAILED):
+                self.finished_at = now
+        self.progress(step, message)
+
+    def events_after(self, seq: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Events with a sequence number above seq, waiting up to timeout for
+        one to arrive (returns [] on timeout or when the job is done)
+        """
+        with self._changed:
+            if len(self.events) <= seq and not self.done:
+                self._changed.wait(timeout)
+            return self.events[seq:]
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the job to finish; True if it did"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._changed:
+            while not self.done:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def to_dict(self, events: bool = True) -> Dict[str, Any]:
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration': (self.finished_at or time.time()) - self.started_at if self.started_at else None,
+            'result': self.result,
+            'error': self.error
+        }
+        if events:
+            data['events'] = list(self.events)
+        return data
+
+
+class JobManager:
+    """
+    Runs jobs in background threads and keeps the most recent ones
+
+    Args:
+        max_jobs: Finished jobs retained for polling (oldest dropped first)
+        idempotency_ttl: Seconds an idempotency key keeps pointing at its job
+    """
+
+    def __init__(self, max_jobs: int = 200, idempotency_ttl: float = 3600.0):
+        self.max_jobs = max_jobs
+        self.idempotency_ttl = idempotency_ttl
+        self.listeners: List[Callable[[Job, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._keys: Dict[str, Job] = {}
+
+    def submit(self, kind: str, target: Callable[[Job], Any],
+               idempotency_key: Optional[str] = None) -> Tuple[Job, bool]:
+        """
+        Start target(job) in a background thread
+
+        target reports progress through job.progress(step, message). A falsy
+        return value or an exception fails the job (JobFailed keeps its
+        result).
+
+        Returns:
+            (job, created): created is False when idempotency_key matched an
+            existing job, which is returned instead
+
+        Raises:
+            IdempotencyConflict: the key belongs to a job of another kind
+        """
+        with self._lock:
+            self._expire_keys()
+            if idempotency_key:
+                existing = self._keys.get(idempotency_key)
+                if existing is not None:
+                    if existing.kind != kind:
+                        raise IdempotencyConflict(
+                            f"Idempotency key already used for a {existing.kind} job"
+                        )
+                    return existing, False
+
+            job = Job(kind, idempotency_key)
+            job._listeners = self.listeners
+            self._jobs[job.id] = job
+            if idempotency_key:
+                self._keys[idempotency_key] = job
+            self._trim()
+
+        job.progress('queued')
+        threading.Thread(target=self._run, args=(job, target), daemon=True).start()
+        return job, True
+
+    def _run(self, job: Job, target: Callable[[Job], Any]):
+        job._set_status(JOB_RUNNING, 'running')
+        try:
+            result = target(job)
+        except JobFailed as e:
+            job.result = e.result
+            job.error = str(e)
+            job._set_status(JOB_FAILED, 'failed', job.error)
+            return
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job._set_status(JOB_FAILED, 'failed', job.error)
+            return
+        job.result = result
+        if result:
+            job._set_status(JOB_SUCCEEDED, 'succeeded')
+        else:
+            job.error = f"{job.kind} failed"
+            job._set_status(JOB_FAILED, 'failed', job.error)
+
+    def _trim(self):
+        # Drop the oldest finished jobs beyond max_jobs; running ones stay
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _expire_keys(self):
+        cutoff = time.time() - self.idempotency_ttl
+        for key, job in list(self._keys.items()):
+            if job.created_at < cutoff:
+                del self._keys[key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Job by ID (None if unknown or already dropped)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """Retained jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for unfinished jobs; True if none is left"""
+        deadline = time.time() + timeout
+        for job in self.list():
+            if not job.done and not job.wait(max(0.0, deadline - time.time())):
+                return False
+        return True
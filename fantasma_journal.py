@@ -0,0 +1,251 @@
+"""
+FantasmaWiFi-Pro Journal
+Crash-safe record of what each sharing session applied to the system
+
+Every step a platform adapter takes (address configured, daemon spawned,
+firewall chain hooked, sysctl changed, bridge created) is appended to the
+journal before or as it is applied, with what is needed to undo it. A
+process that starts after another one died replays the journal and, per
+session left open, either adopts it (still intact) or rolls back exactly
+the recorded steps.
+
+The journal is one append-only file of JSON lines. Steps are written with
+a plain write(), which survives a crash of the process; the system state
+they describe does not survive a reboot anyway. State markers (a session
+became active, standby, or ended) are also fsynced, and concurrent syncs
+are batched into one fsync (group commit). Entries of ended sessions are
+dropped by compaction.
+"""
+
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Entry operations
+OP_BEGIN = 'begin'      # a start or prepare began: config, kind, pid
+OP_STEP = 'step'        # an applied step: kind plus its undo data
+OP_STATE = 'state'      # the session reached a state: 'active' or 'standby'
+OP_OWNER = 'owner'      # another process adopted the session: pid
+OP_END = 'end'          # everything was torn down (or rolled back)
+
+
+def process_alive(pid: Optional[int]) -> bool:
+    """True if a process with this pid exists"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SessionJournal:
+    """
+    Append-only journal of applied session steps
+
+    Args:
+        path: Journal file (created 0600 if missing)
+        max_bytes: Compact when an ended session leaves the file above this
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._synced = 0
+        self._syncing = False
+        self._syncs = 0
+        self._size = 0
+        self._torn = False
+        # Entries of sessions not ended yet, in order
+        self._live: Dict[str, List[Dict[str, Any]]] = {}
+        self._load()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # A torn last line from a crash mid-write: the next entry must start
+        # on a line of its own, or it would be lost along with it
+        self._torn = bool(data) and not data.endswith(b'\n')
+        self._size = len(data)
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping unreadable journal entry in {self.path}")
+                continue
+            self._seq = max(self._seq, entry.get('seq', 0))
+            self._apply(entry)
+        self._synced = self._seq
+
+    def _apply(self, entry: Dict[str, Any]):
+        session = entry['session']
+        op = entry['op']
+        if op == OP_END:
+            self._live.pop(session, None)
+        elif op == OP_BEGIN:
+            # A new start of a live session keeps the earlier steps: they
+            # are still what a rollback may have to undo
+            self._live.setdefault(session, []).append(entry)
+        elif session in self._live:
+            self._live[session].append(entry)
+
+    def append(self, session: str, op: str, **data) -> int:
+        """Write an entry (not fsynced) and return its sequence number"""
+        with self._cond:
+            if op == OP_BEGIN:
+                self._reopen_if_replaced()
+            self._seq += 1
+            entry = {'seq': self._seq, 'ts': time.time(), 'session': session, 'op': op}
+            entry.update(data)
+            line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+            if self._torn:
+                line = b'\n' + line
+                self._torn = False
+            os.write(self._fd, line)
+            self._size += len(line)
+            self._apply(entry)
+            seq = self._seq
+        if op == OP_END and self._size > self.max_bytes:
+            self.compact()
+        return seq
+
+    def _reopen_if_replaced(self):
+        # Another process may have compacted the file since we opened it; a
+        # session we begin makes us an owner, so it stays put from here on
+        try:
+            replaced = os.stat(self.path).st_ino != os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._torn = False
+
+    def sync(self, seq: Optional[int] = None):
+        """
+        fsync entries up to seq (default: all written so far)
+
+        Callers arriving while an fsync is in flight wait for it, and one
+        fsync then covers everything they wrote meanwhile.
+        """
+        while True:
+            with self._cond:
+                target = self._seq if seq is None else seq
+                while self._syncing and self._synced < target:
+                    self._cond.wait()
+                if self._synced >= target:
+                    return
+                self._syncing = True
+                upto = self._seq
+                fd = self._fd
+            try:
+                os.fsync(fd)
+            finally:
+                with self._cond:
+                    self._syncing = False
+                    self._synced = max(self._synced, upto)
+                    self._syncs += 1
+                    self._cond.notify_all()
+
+    def record(self, session: str, op: str, **data) -> int:
+        """Write an entry and wait until it is on disk"""
+        seq = self.append(session, op, **data)
+        self.sync(seq)
+        return seq
+
+    def open_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Sessions begun but not ended, by id
+
+        Each has the latest config and kind, its state ('active',
+        'standby', or 'applying' if it never got there), the owner pid and
+        its steps in order.
+        """
+        with self._cond:
+            live = {session: list(entries) for session, entries in self._live.items()}
+        sessions = {}
+        for session, entries in live.items():
+            record = {'config': None, 'kind': None, 'state': 'applying', 'owner': None, 'steps': []}
+            for entry in entries:
+                op = entry['op']
+                if op == OP_BEGIN:
+                    record.update(config=entry['config'], kind=entry['kind'], owner=entry['pid'], state='applying')
+                elif op == OP_STATE:
+                    record['state'] = entry['state']
+                elif op == OP_OWNER:
+                    record['owner'] = entry['pid']
+                elif op == OP_STEP:
+                    record['steps'].append({key: value for key, value in entry.items()
+                                            if key not in ('seq', 'ts', 'session', 'op')})
+            sessions[session] = record
+        return sessions
+
+    def compact(self) -> bool:
+        """
+        Rewrite the file with only the live sessions' entries
+
+        Skipped while another live process owns a session: it may still be
+        appending to the current file.
+        """
+        for record in self.open_sessions().values():
+            if record['owner'] != os.getpid() and process_alive(record['owner']):
+                return False
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            entries = sorted((entry for entries in self._live.values() for entry in entries),
+                             key=lambda entry: entry['seq'])
+            data = b''.join((json.dumps(entry, separators=(',', ':')) + '\n').encode() for entry in entries)
+            tmp = f"{self.path}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp, self.path)
+            try:
+                dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._size = len(data)
+            self._torn = False
+            self._synced = self._seq
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Entries written, fsyncs, live sessions and file size"""
+        with self._cond:
+            return {
+                'path': self.path,
+                'entries': self._seq,
+                'syncs': self._syncs,
+                'live_sessions': len(self._live),
+                'bytes': self._size
+            }
+
+    def close(self):
+        """Sync and close the file"""
+        self.sync()
+        with self._cond:
+            os.close(self._fd)
@@ -0,0 +1,288 @@
+"""
+FantasmaWiFi-Pro Passive Latency Analysis
+Per-client TCP handshake RTT and retransmission rates from captured packets
+
+Captured on the client-facing interface, a TCP handshake splits into two
+legs around the Fantasma box:
+
+    client --SYN--> [box] --SYN--> server
+    client <-SYN/ACK- [box] <-SYN/ACK- server    uplink leg: SYN -> SYN/ACK
+    client --ACK--> [box]                        WLAN leg:   SYN/ACK -> ACK
+
+A slow uplink leg points at the upstream connection, a slow WLAN leg at the
+radio or the client itself - without sending a single probe.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional
+import socket
+import struct
+import threading
+
+_TCP = struct.Struct('!HHIIBB')  # ports, seq, ack, data offset, flags
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    __slots__ = ('counts', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        """Record one sample"""
+        index = 0
+        for bound in self.BOUNDS_MS:
+            if value_ms <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's samples into this one"""
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, value in zip(self.BOUNDS_MS + (self.max_ms,), self.counts):
+            seen += value
+            if seen >= rank:
+                return float(min(bound, self.max_ms))
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+            'buckets': dict(zip([str(b) for b in self.BOUNDS_MS] + ['+Inf'], self.counts))
+        }
+
+
+class ClientLatency:
+    """Latency histograms and segment counters for one client"""
+
+    __slots__ = ('uplink', 'wlan', 'segments_up', 'segments_down',
+                 'retransmits_up', 'retransmits_down', 'last_seen')
+
+    def __init__(self):
+        self.uplink = LatencyHistogram()
+        self.wlan = LatencyHistogram()
+        self.segments_up = 0      # client -> server data segments
+        self.segments_down = 0    # server -> client data segments
+        self.retransmits_up = 0
+        self.retransmits_down = 0
+        self.last_seen = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'handshake_uplink': self.uplink.to_dict(),
+            'handshake_wlan': self.wlan.to_dict(),
+            'segments_up': self.segments_up,
+            'segments_down': self.segments_down,
+            'retransmits_up': self.retransmits_up,
+            'retransmits_down': self.retransmits_down,
+            'retransmit_rate_up': self.retransmits_up / self.segments_up if self.segments_up else 0.0,
+            'retransmit_rate_down': self.retransmits_down / self.segments_down if self.segments_down else 0.0,
+            'last_seen': self.last_seen
+        }
+
+
+class TcpLatencyAnalyzer:
+    """
+    Packet consumer deriving handshake RTT legs and retransmissions
+
+    Attach to a PacketCaptureMonitor on the client-facing interface. Packets
+    received on it come from clients, packets sent out of it go to clients.
+    Handshake, flow and client tables are all bounded LRU maps.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 1024,
+        max_flows: int = 16384,
+        max_handshakes: int = 4096,
+        handshake_timeout: float = 10.0
+    ):
+        self.max_clients = max_clients
+        self.max_flows = max_flows
+        self.max_handshakes = max_handshakes
+        self.handshake_timeout = handshake_timeout
+        self._lock = threading.Lock()
+        self._clients: 'OrderedDict[str, ClientLatency]' = OrderedDict()
+        # (client, cport, server, sport) -> [syn_ts, synack_ts]
+        self._handshakes: 'OrderedDict[tuple, list]' = OrderedDict()
+        # (client, cport, server, sport) -> [highest seq end up, highest seq end down]
+        self._flows: 'OrderedDict[tuple, list]' = OrderedDict()
+
+    def process_block(self, ring, packets):
+        """PacketCaptureMonitor consumer entry point"""
+        buffer = ring.buffer
+        with self._lock:
+            for packet in packets:
+                self._process(buffer, packet)
+
+    def _process(self, buffer, packet):
+        net = packet.net
+        version = buffer[net] >> 4
+        if version == 4:
+            ihl = (buffer[net] & 0x0F) * 4
+            if buffer[net + 9] != socket.IPPROTO_TCP:
+                return
+            total = struct.unpack_from('!H', buffer, net + 2)[0]
+            src = socket.inet_ntop(socket.AF_INET, buffer[net + 12:net + 16])
+            dst = socket.inet_ntop(socket.AF_INET, buffer[net + 16:net + 20])
+            tcp = net + ihl
+            payload = total - ihl
+        elif version == 6:
+            if buffer[net + 6] != socket.IPPROTO_TCP:
+                return
+            payload = struct.unpack_from('!H', buffer, net + 4)[0]
+            src = socket.inet_ntop(socket.AF_INET6, buffer[net + 8:net + 24])
+            dst = socket.inet_ntop(socket.AF_INET6, buffer[net + 24:net + 40])
+            tcp = net + 40
+        else:
+            return
+
+        if tcp + _TCP.size > packet.offset + packet.snaplen:
+            return
+        sport, dport, seq, _, offset, flags = _TCP.unpack_from(buffer, tcp)
+        payload -= (offset >> 4) * 4
+
+        if packet.outgoing:
+            key = (dst, dport, src, sport)
+        else:
+            key = (src, sport, dst, dport)
+        self._track(key, packet.outgoing, flags, seq, payload, packet.timestamp)
+
+    def _client(self, address: str, now: float) -> ClientLatency:
+        client = self._clients.get(address)
+        if client is None:
+            client = self._clients[address] = ClientLatency()
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(address)
+        client.last_seen = now
+        return client
+
+    def _track(self, key: tuple, to_client: bool, flags: int, seq: int, payload: int, now: float):
+        syn = flags & TCP_SYN
+        ack = flags & TCP_ACK
+
+        if syn and not ack and not to_client:
+            self._handshakes.pop(key, None)
+            self._handshakes[key] = [now, None]
+            while len(self._handshakes) > self.max_handshakes:
+                self._handshakes.popitem(last=False)
+            return
+
+        handshake = self._handshakes.get(key)
+        if handshake is not None:
+            if now - handshake[0] > self.handshake_timeout:
+                del self._handshakes[key]
+            elif syn and ack and to_client and handshake[1] is None:
+                handshake[1] = now
+                self._client(key[0], now).uplink.observe((now - handshake[0]) * 1000)
+                return
+            elif ack and not syn and not to_client and handshake[1] is not None:
+                del self._handshakes[key]
+                self._client(key[0], now).wlan.observe((now - handshake[1]) * 1000)
+
+        if payload <= 0 or flags & TCP_RST:
+            return
+
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = [None, None]
+            while len(self._flows) > self.max_flows:
+                self._flows.popitem(last=False)
+        else:
+            self._flows.move_to_end(key)
+
+        client = self._client(key[0], now)
+        direction = 1 if to_client else 0
+        end = (seq + payload) & 0xFFFFFFFF
+        highest = flow[direction]
+        # Serial number arithmetic: a segment ending at or before the highest
+        # end already seen carries bytes that were sent before
+        retransmit = highest is not None and ((highest - end) & 0xFFFFFFFF) < 0x80000000
+        if not retransmit:
+            flow[direction] = end
+
+        if to_client:
+            client.segments_down += 1
+            client.retransmits_down += bool(retransmit)
+        else:
+            client.segments_up += 1
+            client.retransmits_up += bool(retransmit)
+
+        if flags & TCP_FIN:
+            self._flows.pop(key, None)
+
+    def get_client(self, address: str) -> Optional[Dict[str, object]]:
+        """Latency histograms and retransmission rates for one client"""
+        with self._lock:
+            client = self._clients.get(address)
+            return client.to_dict() if client else None
+
+    def get_clients(self) -> Dict[str, Dict[str, object]]:
+        """Latency data for all tracked clients"""
+        with self._lock:
+            return {address: client.to_dict() for address, client in self._clients.items()}
+
+    def get_summary(self) -> Dict[str, object]:
+        """Aggregate over all clients, suitable for the status payload"""
+        uplink, wlan = LatencyHistogram(), LatencyHistogram()
+        segments_up = segments_down = retrans_up = retrans_down = 0
+        with self._lock:
+            for client in self._clients.values():
+                uplink.merge(client.uplink)
+                wlan.merge(client.wlan)
+                segments_up += client.segments_up
+                segments_down += client.segments_down
+                retrans_up += client.retransmits_up
+                retrans_down += client.retransmits_down
+            clients = len(self._clients)
+        return {
+            'clients': clients,
+            'uplink_p50_ms': uplink.percentile(0.5),
+            'uplink_p90_ms': uplink.percentile(0.9),
+            'wlan_p50_ms': wlan.percentile(0.5),
+            'wlan_p90_ms': wlan.percentile(0.9),
+            'handshakes': uplink.count,
+            'retransmit_rate_up': retrans_up / segments_up if segments_up else 0.0,
+            'retransmit_rate_down': retrans_down / segments_down if segments_down else 0.0
+        }
+
+    def reset(self):
+        """Forget all state"""
+        with self._lock:
+            self._clients.clear()
+            self._handshakes.clear()
+            self._flows.clear()
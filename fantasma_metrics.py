@@ -0,0 +1,369 @@
+"""
+FantasmaWiFi-Pro Metrics
+Metrics registry with OpenMetrics rendering, and request latency for the
+web tier
+
+MetricsRegistry holds pre-aggregated values: counters, gauges, statesets
+and fixed-bucket histograms, updated where things happen (state changes,
+finished operations, requests) or by a background sampler. Rendering
+never probes anything. Each series' exposition line is formatted only
+after it changed and the whole text is reused until something changes, so
+a scrape costs about the same with ten series or ten thousand.
+
+Every request is recorded under its route (the URL rule, e.g.
+"GET /api/jobs/<job_id>", so ids in paths do not multiply series) and
+status in a fixed-bucket histogram: constant memory per series and a
+handful of comparisons per request, however many requests arrive. Each
+request also reports how long it spent in auth, rate limiting and
+serialization; the rest of the handler is counted as the core call.
+
+Requests slower than a threshold are logged with that breakdown and the
+latest ones kept for the metrics endpoint.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+import logging
+import math
+import threading
+import time
+
+from fantasma_latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Phases a request's time is split into (core is what the others leave)
+PHASES = ('auth', 'rate_limit', 'core', 'serialize')
+
+# Media type of an exposition (render() output followed by '# EOF')
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class RequestHistogram(LatencyHistogram):
+    """Fixed-bucket histogram with bounds suited to API requests"""
+
+    BOUNDS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    __slots__ = ()
+
+
+class DurationHistogram(LatencyHistogram):
+    """Fixed-bucket histogram with bounds suited to sharing operations"""
+
+    BOUNDS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+    __slots__ = ()
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class MetricFamily:
+    """
+    Series of one metric, by label values (a tuple in the order of labels)
+
+    Created through MetricsRegistry; its methods are thread-safe.
+    """
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, kind: str, help: str,
+                 labels: Iterable[str] = (), unit: str = '', histogram: type = DurationHistogram):
+        self.name = name
+        self.kind = kind
+        self.labels = tuple(labels)
+        self._registry = registry
+        self._histogram = histogram
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lines: Dict[Tuple[str, ...], str] = {}
+        self._text: Optional[str] = None
+        header = [f'# TYPE {name} {kind}']
+        if unit:
+            header.append(f'# UNIT {name} {unit}')
+        header.append(f'# HELP {name} {_escape(help)}')
+        self._header = '\n'.join(header) + '\n'
+
+    def set(self, key: Tuple[str, ...], value: float):
+        """Set a gauge, stateset member or sampled counter"""
+        with self._registry._lock:
+            if self._series.get(key) != value:
+                self._series[key] = value
+                self._registry._changed(self, key)
+
+    def inc(self, key: Tuple[str, ...] = (), amount: float = 1):
+        """Add to a counter (or gauge)"""
+        with self._registry._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+            self._registry._changed(self, key)
+
+    def observe(self, key: Tuple[str, ...], seconds: float):
+        """Add a sample to a histogram"""
+        with self._registry._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = self._histogram()
+            histogram.observe(seconds * 1000)
+            self._registry._changed(self, key)
+
+    def replace(self, values: Dict[Tuple[str, ...], float]):
+        """Set every series at once, dropping those not in values"""
+        with self._registry._lock:
+            for key in [key for key in self._series if key not in values]:
+                self._drop(key)
+            for key, value in values.items():
+                if self._series.get(key) != value:
+                    self._series[key] = value
+                    self._registry._changed(self, key)
+
+    def discard(self, label: str, value: str):
+        """Drop every series whose label has value"""
+        if label not in self.labels:
+            return
+        index = self.labels.index(label)
+        with self._registry._lock:
+            for key in [key for key in self._series if key[index] == value]:
+                self._drop(key)
+
+    def _drop(self, key: Tuple[str, ...]):
+        # Caller holds the registry lock
+        del self._series[key]
+        self._lines.pop(key, None)
+        self._text = None
+        self._registry._text = None
+
+    def _format(self, key: Tuple[str, ...]) -> str:
+        value = self._series[key]
+        labels = ','.join(f'{name}="{_escape(item)}"' for name, item in zip(self.labels, key))
+        braces = f'{{{labels}}}' if labels else ''
+        if self.kind == 'counter':
+            return f'{self.name}_total{braces} {_number(value)}\n'
+        if self.kind != 'histogram':
+            return f'{self.name}{braces} {_number(value)}\n'
+        lines = []
+        prefix = f'{labels},' if labels else ''
+        cumulative = 0
+        for bound, count in zip(value.BOUNDS_MS + (None,), value.counts):
+            cumulative += count
+            le = '+Inf' if bound is None else _number(bound / 1000)
+            lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}\n')
+        lines.append(f'{self.name}_count{braces} {value.count}\n')
+        lines.append(f'{self.name}_sum{braces} {_number(value.total_ms / 1000)}\n')
+        return ''.join(lines)
+
+    def _render(self) -> str:
+        # Caller holds the registry lock
+        if self._text is None:
+            self._text = self._header + ''.join(self._lines.values()) if self._series else ''
+        return self._text
+
+
+class MetricsRegistry:
+    """Metric families rendered as OpenMetrics text (see render)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, MetricFamily] = {}
+        self._dirty: Dict[Tuple[MetricFamily, Tuple[str, ...]], None] = {}
+        self._text: Optional[str] = None
+
+    def _changed(self, family: MetricFamily, key: Tuple[str, ...]):
+        # Caller holds the lock; the line is formatted at the next render
+        self._dirty[(family, key)] = None
+        family._text = None
+        self._text = None
+
+    def _family(self, name: str, kind: str, help: str, labels: Iterable[str], **options) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = MetricFamily(self, name, kind, help, labels, **options)
+            return family
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> MetricFamily:
+        """Counter family (name without _total; samples get the suffix)"""
+        return self._family(name, 'counter', help, labels)
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = (), unit: str = '') -> MetricFamily:
+        """Gauge family"""
+        return self._family(name, 'gauge', help, labels, unit=unit)
+
+    def stateset(self, name: str, help: str, labels: Iterable[str] = ()) -> MetricFamily:
+        """Stateset family: one 0/1 series per state, the state being the label named like the family"""
+        return self._family(name, 'stateset', help, tuple(labels) + (name,))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (),
+                  histogram: type = DurationHistogram) -> MetricFamily:
+        """Histogram family in seconds (buckets from histogram.BOUNDS_MS)"""
+        return self._family(name, 'histogram', help, labels, unit='seconds', histogram=histogram)
+
+    def discard(self, label: str, value: str):
+        """Drop every series, in every family, whose label has value"""
+        for family in list(self._families.values()):
+            family.discard(label, value)
+
+    def render(self) -> str:
+        """Exposition of all families, without the final '# EOF' line"""
+        with self._lock:
+            if self._text is None:
+                for family, key in self._dirty:
+                    if key in family._series:
+                        family._lines[key] = family._format(key)
+                self._dirty.clear()
+                self._text = ''.join(family._render() for family in self._families.values())
+            return self._text
+
+
+# Registry shared by everything in this process (cores of all sessions,
+# the daemon, the web tier)
+registry = MetricsRegistry()
+
+
+class _Route:
+    """Series and phase totals for one method and URL rule"""
+
+    __slots__ = ('in_flight', 'statuses', 'phases_ms')
+
+    def __init__(self):
+        self.in_flight = 0
+        self.statuses: Dict[int, RequestHistogram] = {}
+        self.phases_ms = dict.fromkeys(PHASES, 0.0)
+
+    def merged(self) -> RequestHistogram:
+        histogram = RequestHistogram()
+        for series in self.statuses.values():
+            histogram.merge(series)
+        return histogram
+
+
+class RequestMetrics:
+    """
+    Request latency histograms, in-flight counts and a slow-request log
+
+    Durations and the in-flight count also go to a MetricsRegistry.
+
+    Args:
+        slow_ms: Requests taking longer are logged (0 disables the log)
+        slow_kept: Slow requests kept for to_dict()
+        metrics: Registry (default: the process-wide one)
+    """
+
+    def __init__(self, slow_ms: float = 500.0, slow_kept: int = 50,
+                 metrics: Optional[MetricsRegistry] = None):
+        metrics = registry if metrics is None else metrics
+        self._duration_metric = metrics.histogram(
+            'fantasma_http_request_duration_seconds', 'API request duration by route and status',
+            ('method', 'route', 'status'), histogram=RequestHistogram)
+        self._in_flight_metric = metrics.gauge('fantasma_http_requests_in_flight', 'API requests being served')
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _Route] = {}
+        self._slow: deque = deque(maxlen=slow_kept)
+        self.in_flight = 0
+        self.slow_requests = 0
+
+    def _route(self, route: str) -> _Route:
+        entry = self._routes.get(route)
+        if entry is None:
+            entry = self._routes[route] = _Route()
+        return entry
+
+    def begin(self, route: str):
+        """A request for route started"""
+        with self._lock:
+            self.in_flight += 1
+            self._route(route).in_flight += 1
+            self._in_flight_metric.set((), self.in_flight)
+
+    def end(self, route: str, path: str, status: int, duration_ms: float,
+            phases_ms: Optional[Dict[str, float]] = None):
+        """
+        A request begun with begin(route) finished
+
+        Args:
+            route: Method and URL rule
+            path: Path actually requested (for the slow-request log)
+            status: Response status
+            duration_ms: Total time
+            phases_ms: Time spent in auth, rate_limit and serialize
+        """
+        phases = dict.fromkeys(PHASES, 0.0)
+        for name, value in (phases_ms or {}).items():
+            if name in phases:
+                phases[name] = value
+        phases['core'] = max(0.0, duration_ms - sum(phases.values()))
+
+        with self._lock:
+            self.in_flight -= 1
+            entry = self._route(route)
+            entry.in_flight -= 1
+            series = entry.statuses.get(status)
+            if series is None:
+                series = entry.statuses[status] = RequestHistogram()
+            series.observe(duration_ms)
+            for name, value in phases.items():
+                entry.phases_ms[name] += value
+            slow = self.slow_ms and duration_ms >= self.slow_ms
+            if slow:
+                self.slow_requests += 1
+                self._slow.append({
+                    'timestamp': time.time(),
+                    'route': route,
+                    'path': path,
+                    'status': status,
+                    'duration_ms': round(duration_ms, 3),
+                    'phases_ms': {name: round(value, 3) for name, value in phases.items()}
+                })
+            self._in_flight_metric.set((), self.in_flight)
+        self._duration_metric.observe((*route.split(' ', 1), str(status)), duration_ms / 1000)
+
+        if slow:
+            breakdown = ', '.join(f"{name} {value:.1f}" for name, value in phases.items())
+            logger.warning(f"Slow request: {route.split(' ', 1)[0]} {path} -> {status} "
+                           f"in {duration_ms:.1f} ms ({breakdown})")
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Per-route counts, error counts and percentiles (all statuses together)"""
+        with self._lock:
+            routes = {}
+            for route, entry in self._routes.items():
+                histogram = entry.merged()
+                routes[route] = {
+                    'requests': histogram.count,
+                    'errors': sum(series.count for status, series in entry.statuses.items() if status >= 500),
+                    'in_flight': entry.in_flight,
+                    'p50_ms': round(histogram.percentile(0.5), 3),
+                    'p90_ms': round(histogram.percentile(0.9), 3),
+                    'p99_ms': round(histogram.percentile(0.99), 3),
+                    'max_ms': round(histogram.max_ms, 3)
+                }
+            return {'in_flight': self.in_flight, 'slow_requests': self.slow_requests, 'routes': routes}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Histograms by route and status, mean phase times and recent slow requests"""
+        with self._lock:
+            routes = {}
+            for route, entry in self._routes.items():
+                count = sum(series.count for series in entry.statuses.values())
+                routes[route] = {
+                    'in_flight': entry.in_flight,
+                    'phases_mean_ms': {name: total / count if count else 0.0
+                                       for name, total in entry.phases_ms.items()},
+                    'statuses': {str(status): series.to_dict()
+                                 for status, series in sorted(entry.statuses.items())}
+                }
+            return {
+                'in_flight': self.in_flight,
+                'slow_threshold_ms': self.slow_ms,
+                'slow_requests': self.slow_requests,
+                'recent_slow': list(self._slow),
+                'routes': routes
+            }
@@ -29,98 +29,1017 @@ OPENAPI_SPEC = {
         }
     ],
     "paths": {
+        "/metrics": {
+            "get": {
+                "summary": "OpenMetrics exposition",
+                "description": "Session state, operation durations, interface counters, clients, connection tracking usage, cache lookups, daemon start time and API request durations in OpenMetrics text format. Rendered from values sampled in the background; a scrape never probes the system",
+                "tags": ["Monitoring"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {
+                        "description": "Metrics",
+                        "content": {
+                            "application/openmetrics-text": {
+                                "schema": {"type": "string"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/metrics/requests": {
+            "get": {
+                "summary": "Request latency metrics",
+                "description": "Fixed-bucket latency histograms per route (URL rule) and status, in-flight requests, mean time per phase (auth, rate_limit, core, serialize) and the most recent requests over the slow-request threshold",
+                "tags": ["Monitoring"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {"description": "Request metrics"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
         "/api/interfaces": {
             "get": {
-                "summary": "List network interfaces",
-                "description": "Get all available network interfaces on the system",
-                "tags": ["Interfaces"],
+                "summary": "List network interfaces",
+                "description": "Get all available network interfaces on the system",
+                "tags": ["Interfaces"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [{"$ref": "#/components/parameters/IfNoneMatch"}],
+                "responses": {
+                    "200": {
+                        "description": "List of interfaces",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "interfaces": {
+                                            "type": "array",
+                                            "items": {"$ref": "#/components/schemas/NetworkInterface"}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "304": {"$ref": "#/components/responses/NotModified"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/status": {
+            "get": {
+                "summary": "Get sharing status",
+                "description": "Get current network sharing status",
+                "tags": ["Status"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [{"$ref": "#/components/parameters/IfNoneMatch"}],
+                "responses": {
+                    "200": {
+                        "description": "Current status",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/Status"}
+                            }
+                        }
+                    },
+                    "304": {"$ref": "#/components/responses/NotModified"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"}
+                }
+            }
+        },
+        "/api/status/latency": {
+            "get": {
+                "summary": "Passive latency analysis",
+                "description": "Per-client TCP handshake RTT histograms, split into uplink (SYN to SYN/ACK) and WLAN (SYN/ACK to ACK) legs, plus retransmission rates",
+                "tags": ["Status"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {
+                        "description": "Latency summary and per-client analysis",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "summary": {"$ref": "#/components/schemas/LatencySummary"},
+                                        "clients": {"type": "object"}
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/state": {
+            "get": {
+                "summary": "Session state machine",
+                "description": "Current state (idle, starting, active, stopping, preparing, standby), the prepared standby and start latencies, timestamped transitions with time spent in the previous state, and queued/recent start and stop operations with their waiter counts",
+                "tags": ["Status"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {
+                        "description": "Session state",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "state": {"type": "string", "enum": ["idle", "starting", "active", "stopping", "preparing", "standby"]},
+                                        "since": {"type": "number"},
+                                        "standby": {
+                                            "type": "object",
+                                            "nullable": True,
+                                            "properties": {
+                                                "mode": {"type": "string"},
+                                                "source_interface": {"type": "string"},
+                                                "target_interface": {"type": "string"},
+                                                "prewarmed": {"type": "boolean", "description": "False where the platform cannot pre-warm (activation is a regular start)"}
+                                            }
+                                        },
+                                        "start_latency": {
+                                            "type": "object",
+                                            "description": "Start durations in seconds: cold and warm (from standby), each with count, last, min, mean"
+                                        },
+                                        "pending": {"type": "array", "items": {"type": "object"}},
+                                        "transitions": {"type": "array", "items": {"type": "object"}},
+                                        "operations": {"type": "array", "items": {"type": "object"}}
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/status/cache": {
+            "get": {
+                "summary": "Probe cache statistics",
+                "description": "Hits, misses, coalesced waits, invalidations and hit rate per cached adapter probe (interfaces, status)",
+                "tags": ["Status"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {
+                        "description": "Cache counters keyed by probe",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "cache": {"type": "object"}
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/status/latency/{client}": {
+            "get": {
+                "summary": "Passive latency analysis for one client",
+                "description": "Handshake RTT histograms and retransmission rates for a single client IP",
+                "tags": ["Status"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "client",
+                        "in": "path",
+                        "required": True,
+                        "schema": {"type": "string"},
+                        "description": "Client IP address"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Client latency analysis"},
+                    "404": {"$ref": "#/components/responses/NotFoundError"}
+                }
+            }
+        },
+        "/api/start": {
+            "post": {
+                "summary": "Start network sharing",
+                "description": "Validate the configuration and start sharing in a background job",
+                "tags": ["Control"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job instead of starting another",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/ShareConfig"}
+                        }
+                    }
+                },
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "409": {
+                        "description": "Idempotency key already used for another kind of job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/stop": {
+            "post": {
+                "summary": "Stop network sharing",
+                "description": "Stop currently active network sharing in a background job",
+                "tags": ["Control"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job instead of starting another",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "409": {
+                        "description": "Idempotency key already used for another kind of job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/reconfigure": {
+            "post": {
+                "summary": "Reconfigure network sharing",
+                "description": "Stop and restart sharing with a new configuration in one background job; no other start or stop runs in between",
+                "tags": ["Control"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job instead of starting another",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/ShareConfig"}
+                        }
+                    }
+                },
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "409": {
+                        "description": "Idempotency key already used for another kind of job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/prepare": {
+            "post": {
+                "summary": "Prepare a standby",
+                "description": "Pre-warm sharing without serving clients (daemons up, beacons and DHCP held back, NAT chains unhooked on Linux). A later /api/start with the same body only activates it",
+                "tags": ["Control"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job instead of starting another",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/ShareConfig"}
+                        }
+                    }
+                },
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "409": {
+                        "description": "Idempotency key already used for another kind of job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/sessions": {
+            "get": {
+                "summary": "List sessions",
+                "description": "Session counts by state plus the status of every sharing session",
+                "tags": ["Sessions"],
+                "responses": {
+                    "200": {
+                        "description": "Sessions",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/SessionsStatus"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/sessions/summary": {
+            "get": {
+                "summary": "Session counts",
+                "description": "Session counts by state, maintained on state transitions (no probing)",
+                "tags": ["Sessions"],
+                "responses": {
+                    "200": {
+                        "description": "Summary",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/SessionsSummary"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/sessions/{session_id}": {
+            "get": {
+                "summary": "Get session",
+                "tags": ["Sessions"],
+                "parameters": [
+                    {"name": "session_id", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Session",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/Session"}
+                            }
+                        }
+                    },
+                    "404": {"$ref": "#/components/responses/NotFoundError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            },
+            "delete": {
+                "summary": "Remove session",
+                "description": "Forget an idle session; the default session cannot be removed",
+                "tags": ["Sessions"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {"name": "session_id", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Session removed",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/SuccessResponse"}
+                            }
+                        }
+                    },
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "409": {
+                        "description": "Default session, or session still sharing",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/sessions/{session_id}/{action}": {
+            "post": {
+                "summary": "Start, stop, reconfigure or prepare a session",
+                "description": "Runs as a background job like /api/start. start creates the session if needed; "
+                               "a hotspot whose ip_range overlaps another session's is moved to a free subnet",
+                "tags": ["Sessions"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {"name": "session_id", "in": "path", "required": True,
+                     "schema": {"type": "string", "pattern": "^[a-z0-9][a-z0-9_-]{0,11}$"}},
+                    {"name": "action", "in": "path", "required": True,
+                     "schema": {"type": "string", "enum": ["start", "stop", "reconfigure", "prepare"]}},
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job instead of starting another",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": False,
+                    "description": "Configuration for start, reconfigure and prepare",
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/ShareConfig"}
+                        }
+                    }
+                },
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "404": {"$ref": "#/components/responses/NotFoundError"},
+                    "409": {
+                        "description": "Idempotency key already used for another kind of job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/jobs": {
+            "get": {
+                "summary": "List jobs",
+                "description": "Recent start/stop/reconfigure jobs, newest first (without events)",
+                "tags": ["Control"],
+                "parameters": [
+                    {
+                        "name": "limit",
+                        "in": "query",
+                        "schema": {"type": "integer", "default": 50, "maximum": 200}
+                    }
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Jobs",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "jobs": {
+                                            "type": "array",
+                                            "items": {"$ref": "#/components/schemas/Job"}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/jobs/{job_id}": {
+            "get": {
+                "summary": "Get job",
+                "description": "Status, result and progress events of a job",
+                "tags": ["Control"],
+                "parameters": [
+                    {"name": "job_id", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Job",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/Job"}
+                            }
+                        }
+                    },
+                    "404": {"$ref": "#/components/responses/NotFoundError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/jobs/{job_id}/events": {
+            "get": {
+                "summary": "Stream job progress",
+                "description": "Server-Sent Events: one 'progress' event per step (id = seq, resumable with Last-Event-ID), then a final 'done' event with the job",
+                "tags": ["Control"],
+                "parameters": [
+                    {"name": "job_id", "in": "path", "required": True, "schema": {"type": "string"}},
+                    {"name": "Last-Event-ID", "in": "header", "schema": {"type": "integer"}}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Event stream",
+                        "content": {
+                            "text/event-stream": {
+                                "schema": {"type": "string"}
+                            }
+                        }
+                    },
+                    "404": {"$ref": "#/components/responses/NotFoundError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/batch": {
+            "post": {
+                "summary": "Run several operations",
+                "description": "Ordered operations checked as a whole (one auth check for the broadest scope needed, references only to earlier operations), then run in order. An argument {\"$ref\": \"<id>/<pointer>\"} is replaced by an earlier result. Read-only batches answer 200 with the results; batches with start, prepare, reconfigure or stop run as one background job whose result holds them",
+                "tags": ["Control"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "description": "Retries with the same key return the original job (batches that run as a job)",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "type": "object",
+                                "required": ["operations"],
+                                "properties": {
+                                    "operations": {
+                                        "type": "array",
+                                        "maxItems": 50,
+                                        "items": {
+                                            "type": "object",
+                                            "required": ["op"],
+                                            "properties": {
+                                                "id": {"type": "string", "description": "Name for references, without '/' (default: position)"},
+                                                "op": {
+                                                    "type": "string",
+                                                    "enum": ["status", "interfaces", "list_profiles", "get_profile",
+                                                             "save_profile", "delete_profile", "prepare", "start",
+                                                             "reconfigure", "stop"]
+                                                },
+                                                "args": {"type": "object", "description": "session, name, config, profile or ShareConfig fields"}
+                                            }
+                                        }
+                                    },
+                                    "stop_on_error": {"type": "boolean", "default": True}
+                                }
+                            }
+                        }
+                    }
+                },
+                "responses": {
+                    "200": {
+                        "description": "Results of a read-only batch",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "success": {"type": "boolean"},
+                                        "results": {
+                                            "type": "array",
+                                            "items": {
+                                                "type": "object",
+                                                "properties": {
+                                                    "id": {"type": "string"},
+                                                    "op": {"type": "string"},
+                                                    "status": {"type": "string", "enum": ["ok", "error", "skipped"]},
+                                                    "result": {},
+                                                    "error": {"type": "string"}
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "202": {
+                        "description": "Batch accepted as a job; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "403": {
+                        "description": "API key lacks the scope an operation needs",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/ErrorResponse"}
+                            }
+                        }
+                    },
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/stream": {
+            "get": {
+                "summary": "Stream topics",
+                "description": "Server-Sent Events: a 'snapshot' event per topic ({topic, seq, value}), then 'delta' events ({topic, seq, ops} with JSON Patch operations) as topics change. Resumable with Last-Event-ID while the event is still buffered; keep-alive comments every 15 seconds. The metrics and logs topics require an API key with the read scope",
+                "tags": ["Status"],
                 "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "topics",
+                        "in": "query",
+                        "description": "Comma-separated topics: status, clients, metrics, logs",
+                        "schema": {"type": "string", "default": "status"}
+                    },
+                    {"name": "Last-Event-ID", "in": "header", "schema": {"type": "integer"}},
+                    {
+                        "name": "last_event_id",
+                        "in": "query",
+                        "description": "Same as Last-Event-ID, for clients that cannot set headers",
+                        "schema": {"type": "integer"}
+                    }
+                ],
                 "responses": {
                     "200": {
-                        "description": "List of interfaces",
+                        "description": "Event stream",
+                        "content": {
+                            "text/event-stream": {
+                                "schema": {"type": "string"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/traffic": {
+            "get": {
+                "summary": "Per-client traffic accounting",
+                "description": "Byte/packet totals and current rates for every tracked client",
+                "tags": ["Monitoring"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "window",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "number"},
+                        "description": "Add totals and rates over the last N seconds"
+                    }
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Traffic accounting for all clients",
                         "content": {
                             "application/json": {
                                 "schema": {
                                     "type": "object",
                                     "properties": {
-                                        "interfaces": {
+                                        "clients": {
                                             "type": "array",
-                                            "items": {"$ref": "#/components/schemas/NetworkInterface"}
-                                        }
+                                            "items": {"$ref": "#/components/schemas/ClientTraffic"}
+                                        },
+                                        "summary": {"type": "object"}
                                     }
                                 }
                             }
                         }
                     },
-                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
                     "429": {"$ref": "#/components/responses/RateLimitError"}
                 }
             }
         },
-        "/api/status": {
+        "/api/traffic/{client}": {
             "get": {
-                "summary": "Get sharing status",
-                "description": "Get current network sharing status",
-                "tags": ["Status"],
+                "summary": "Traffic accounting for one client",
+                "description": "Byte/packet totals and current rates for a single client IP",
+                "tags": ["Monitoring"],
                 "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "client",
+                        "in": "path",
+                        "required": True,
+                        "schema": {"type": "string"},
+                        "description": "Client IP address"
+                    },
+                    {
+                        "name": "window",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "number"},
+                        "description": "Add totals and rates over the last N seconds"
+                    }
+                ],
                 "responses": {
                     "200": {
-                        "description": "Current status",
+                        "description": "Client traffic",
                         "content": {
                             "application/json": {
-                                "schema": {"$ref": "#/components/schemas/Status"}
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "client": {"$ref": "#/components/schemas/ClientTraffic"}
+                                    }
+                                }
                             }
                         }
                     },
-                    "401": {"$ref": "#/components/responses/UnauthorizedError"}
+                    "404": {"$ref": "#/components/responses/NotFoundError"}
                 }
             }
         },
-        "/api/start": {
+        "/api/top": {
+            "get": {
+                "summary": "Heavy hitters",
+                "description": "Top talkers, destinations and ports by bytes, from fixed-memory streaming sketches",
+                "tags": ["Monitoring"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "dimension",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "string", "enum": ["talkers", "destinations", "ports"]},
+                        "description": "Dimension to report (repeatable, default: all)"
+                    },
+                    {
+                        "name": "k",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "integer", "default": 10},
+                        "description": "Entries per dimension"
+                    },
+                    {
+                        "name": "window",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "number"},
+                        "description": "Seconds to look back (default: all retained windows)"
+                    }
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Top entries per dimension; bytes is an upper bound, bytes - error a lower bound",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "top": {"type": "object"},
+                                        "summary": {"type": "object"}
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/capture": {
+            "get": {
+                "summary": "Stream a packet capture",
+                "description": "Streams pcapng (or pcap) from a live interface. A bounded buffer drops the oldest packets when the client reads too slowly; pcapng streams end with an Interface Statistics Block reporting kernel and buffer drops.",
+                "tags": ["Monitoring"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {
+                        "name": "interface",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "string"},
+                        "description": "Interface to capture on (default: active target interface)"
+                    },
+                    {
+                        "name": "filter",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "string"},
+                        "description": "BPF filter expression, e.g. 'tcp port 443'"
+                    },
+                    {
+                        "name": "snaplen",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "integer", "default": 262144},
+                        "description": "Bytes kept per packet"
+                    },
+                    {
+                        "name": "duration",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "number", "default": 30},
+                        "description": "Capture duration in seconds (max 3600)"
+                    },
+                    {
+                        "name": "max_bytes",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "integer"},
+                        "description": "Stop after this many bytes of packet records"
+                    },
+                    {
+                        "name": "format",
+                        "in": "query",
+                        "required": False,
+                        "schema": {"type": "string", "enum": ["pcapng", "pcap"], "default": "pcapng"},
+                        "description": "Output format"
+                    }
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Capture stream",
+                        "content": {
+                            "application/x-pcapng": {"schema": {"type": "string", "format": "binary"}},
+                            "application/vnd.tcpdump.pcap": {"schema": {"type": "string", "format": "binary"}}
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
+        },
+        "/api/keys": {
+            "get": {
+                "summary": "List API keys",
+                "description": "Key ids, scopes, tiers, expiry and usage counters. Keys themselves are never stored. Requires the admin scope.",
+                "tags": ["Keys"],
+                "security": [{"ApiKeyAuth": []}],
+                "responses": {
+                    "200": {
+                        "description": "Issued keys",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "keys": {"type": "array", "items": {"$ref": "#/components/schemas/ApiKeyInfo"}},
+                                        "stats": {"type": "object"}
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"}
+                }
+            },
             "post": {
-                "summary": "Start network sharing",
-                "description": "Start sharing internet connection with specified configuration",
-                "tags": ["Control"],
+                "summary": "Create API key",
+                "description": "Issue a key. The response is the only time the key is shown. Requires the admin scope.",
+                "tags": ["Keys"],
                 "security": [{"ApiKeyAuth": []}],
                 "requestBody": {
                     "required": True,
                     "content": {
                         "application/json": {
-                            "schema": {"$ref": "#/components/schemas/ShareConfig"}
+                            "schema": {
+                                "type": "object",
+                                "required": ["name"],
+                                "properties": {
+                                    "name": {"type": "string"},
+                                    "scopes": {
+                                        "type": "array",
+                                        "items": {"type": "string", "enum": ["read", "control", "admin"]},
+                                        "default": ["read", "control"]
+                                    },
+                                    "tier": {"type": "string", "default": "default"},
+                                    "expires_in": {"type": "number", "description": "Seconds until the key expires"}
+                                }
+                            }
                         }
                     }
                 },
                 "responses": {
-                    "200": {
-                        "description": "Sharing started successfully",
+                    "201": {
+                        "description": "Key created",
                         "content": {
                             "application/json": {
-                                "schema": {"$ref": "#/components/schemas/SuccessResponse"}
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "key": {"type": "string"},
+                                        "key_id": {"type": "string"},
+                                        "scopes": {"type": "array", "items": {"type": "string"}},
+                                        "expires": {"type": "number", "nullable": True}
+                                    }
+                                }
                             }
                         }
                     },
                     "400": {"$ref": "#/components/responses/BadRequestError"},
-                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
-                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"}
                 }
             }
         },
-        "/api/stop": {
-            "post": {
-                "summary": "Stop network sharing",
-                "description": "Stop currently active network sharing",
-                "tags": ["Control"],
+        "/api/keys/{key_id}": {
+            "delete": {
+                "summary": "Revoke API key",
+                "description": "Revoke a key by its id; takes effect immediately. Requires the admin scope.",
+                "tags": ["Keys"],
                 "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {"name": "key_id", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
                 "responses": {
                     "200": {
-                        "description": "Sharing stopped successfully",
+                        "description": "Key revoked",
                         "content": {
                             "application/json": {
                                 "schema": {"$ref": "#/components/schemas/SuccessResponse"}
                             }
                         }
                     },
-                    "401": {"$ref": "#/components/responses/UnauthorizedError"}
+                    "404": {"$ref": "#/components/responses/NotFoundError"}
                 }
             }
         },
@@ -130,6 +1049,7 @@ OPENAPI_SPEC = {
                 "description": "Get all saved configuration profiles",
                 "tags": ["Profiles"],
                 "security": [{"ApiKeyAuth": []}],
+                "parameters": [{"$ref": "#/components/parameters/IfNoneMatch"}],
                 "responses": {
                     "200": {
                         "description": "List of profile names",
@@ -146,7 +1066,8 @@ OPENAPI_SPEC = {
                                 }
                             }
                         }
-                    }
+                    },
+                    "304": {"$ref": "#/components/responses/NotModified"}
                 }
             },
             "post": {
@@ -188,7 +1109,8 @@ OPENAPI_SPEC = {
                         "required": True,
                         "schema": {"type": "string"},
                         "description": "Profile name"
-                    }
+                    },
+                    {"$ref": "#/components/parameters/IfNoneMatch"}
                 ],
                 "responses": {
                     "200": {
@@ -204,6 +1126,7 @@ OPENAPI_SPEC = {
                             }
                         }
                     },
+                    "304": {"$ref": "#/components/responses/NotModified"},
                     "404": {"$ref": "#/components/responses/NotFoundError"}
                 }
             },
@@ -233,6 +1156,54 @@ OPENAPI_SPEC = {
                     "404": {"$ref": "#/components/responses/NotFoundError"}
                 }
             }
+        },
+        "/api/profiles/{name}/{action}": {
+            "post": {
+                "summary": "Prepare or start a profile",
+                "description": "Background job: prepare puts the profile in standby, start activates it (only flipping switches when its standby is prepared)",
+                "tags": ["Profiles"],
+                "security": [{"ApiKeyAuth": []}],
+                "parameters": [
+                    {"name": "name", "in": "path", "required": True, "schema": {"type": "string"}},
+                    {"name": "action", "in": "path", "required": True,
+                     "schema": {"type": "string", "enum": ["prepare", "start"]}},
+                    {
+                        "name": "Idempotency-Key",
+                        "in": "header",
+                        "schema": {"type": "string", "maxLength": 255}
+                    }
+                ],
+                "requestBody": {
+                    "required": False,
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "type": "object",
+                                "properties": {
+                                    "session": {"type": "string", "default": "default"}
+                                }
+                            }
+                        }
+                    }
+                },
+                "responses": {
+                    "202": {
+                        "description": "Job accepted; follow it at the Location header",
+                        "headers": {
+                            "Location": {"schema": {"type": "string"}, "description": "Job URL"}
+                        },
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/JobAccepted"}
+                            }
+                        }
+                    },
+                    "400": {"$ref": "#/components/responses/BadRequestError"},
+                    "401": {"$ref": "#/components/responses/UnauthorizedError"},
+                    "404": {"$ref": "#/components/responses/NotFoundError"},
+                    "429": {"$ref": "#/components/responses/RateLimitError"}
+                }
+            }
         }
     },
     "components": {
@@ -241,7 +1212,7 @@ OPENAPI_SPEC = {
                 "type": "apiKey",
                 "in": "header",
                 "name": "X-API-Key",
-                "description": "API key for authentication. Get your key from the web UI or server logs."
+                "description": "API key for authentication. The first server start prints the default key; more keys come from POST /api/keys. Keys have scopes: read, control (start/stop/configure) and admin (key management)."
             }
         },
         "schemas": {
@@ -284,6 +1255,12 @@ OPENAPI_SPEC = {
                         "example": True,
                         "description": "Whether sharing is active"
                     },
+                    "state": {
+                        "type": "string",
+                        "enum": ["idle", "starting", "active", "stopping", "preparing", "standby"],
+                        "example": "active",
+                        "description": "Session state machine state"
+                    },
                     "mode": {
                         "type": "string",
                         "enum": ["hotspot", "bridge", "none"],
@@ -309,7 +1286,36 @@ OPENAPI_SPEC = {
                         "type": "string",
                         "example": "macOS",
                         "description": "Operating platform"
-                    }
+                    },
+                    "latency": {"$ref": "#/components/schemas/LatencySummary"}
+                }
+            },
+            "LatencySummary": {
+                "type": "object",
+                "properties": {
+                    "clients": {"type": "integer"},
+                    "handshakes": {"type": "integer"},
+                    "uplink_p50_ms": {"type": "number", "description": "Median SYN to SYN/ACK time"},
+                    "uplink_p90_ms": {"type": "number"},
+                    "wlan_p50_ms": {"type": "number", "description": "Median SYN/ACK to ACK time"},
+                    "wlan_p90_ms": {"type": "number"},
+                    "retransmit_rate_up": {"type": "number"},
+                    "retransmit_rate_down": {"type": "number"}
+                }
+            },
+            "ClientTraffic": {
+                "type": "object",
+                "properties": {
+                    "client": {"type": "string", "example": "192.168.137.101"},
+                    "tx_bytes": {"type": "integer", "description": "Bytes sent by the client"},
+                    "rx_bytes": {"type": "integer", "description": "Bytes received by the client"},
+                    "tx_packets": {"type": "integer"},
+                    "rx_packets": {"type": "integer"},
+                    "tx_bps": {"type": "number", "description": "Current upload rate (bits/s)"},
+                    "rx_bps": {"type": "number", "description": "Current download rate (bits/s)"},
+                    "first_seen": {"type": "number"},
+                    "last_seen": {"type": "number"},
+                    "window": {"type": "object", "description": "Totals over the requested window"}
                 }
             },
             "ShareConfig": {
@@ -356,6 +1362,21 @@ OPENAPI_SPEC = {
                     }
                 }
             },
+            "ApiKeyInfo": {
+                "type": "object",
+                "properties": {
+                    "key_id": {"type": "string"},
+                    "key": {"type": "string", "description": "Masked key"},
+                    "name": {"type": "string"},
+                    "created": {"type": "number"},
+                    "enabled": {"type": "boolean"},
+                    "tier": {"type": "string"},
+                    "scopes": {"type": "array", "items": {"type": "string"}},
+                    "expires": {"type": "number", "nullable": True},
+                    "requests": {"type": "integer"},
+                    "last_used": {"type": "number", "nullable": True}
+                }
+            },
             "ProfileSave": {
                 "type": "object",
                 "required": ["name", "config"],
@@ -370,6 +1391,98 @@ OPENAPI_SPEC = {
                     }
                 }
             },
+            "JobAccepted": {
+                "type": "object",
+                "properties": {
+                    "job_id": {"type": "string"},
+                    "kind": {"type": "string", "description": "start, stop, reconfigure or prepare; jobs of other sessions than default are <action>:<session>", "example": "start"},
+                    "status": {"type": "string", "enum": ["queued", "running", "succeeded", "failed"]},
+                    "created": {"type": "boolean", "description": "False when an earlier request with the same Idempotency-Key created the job"},
+                    "links": {
+                        "type": "object",
+                        "properties": {
+                            "self": {"type": "string"},
+                            "events": {"type": "string"}
+                        }
+                    }
+                }
+            },
+            "JobEvent": {
+                "type": "object",
+                "properties": {
+                    "seq": {"type": "integer"},
+                    "job_id": {"type": "string"},
+                    "kind": {"type": "string"},
+                    "step": {"type": "string", "example": "dhcp"},
+                    "message": {"type": "string", "example": "Starting dnsmasq"},
+                    "status": {"type": "string"},
+                    "timestamp": {"type": "number"}
+                }
+            },
+            "Job": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "kind": {"type": "string"},
+                    "status": {"type": "string", "enum": ["queued", "running", "succeeded", "failed"]},
+                    "created_at": {"type": "number"},
+                    "started_at": {"type": "number", "nullable": True},
+                    "finished_at": {"type": "number", "nullable": True},
+                    "duration": {"type": "number", "nullable": True},
+                    "result": {"nullable": True},
+                    "error": {"type": "string", "nullable": True},
+                    "events": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/JobEvent"}
+                    }
+                }
+            },
+            "SessionsSummary": {
+                "type": "object",
+                "properties": {
+                    "sessions": {"type": "integer"},
+                    "max_sessions": {"type": "integer"},
+                    "states": {
+                        "type": "object",
+                        "additionalProperties": {"type": "integer"},
+                        "example": {"idle": 1, "starting": 0, "active": 2, "stopping": 0, "preparing": 0, "standby": 1}
+                    },
+                    "active": {"type": "integer"}
+                }
+            },
+            "Session": {
+                "type": "object",
+                "properties": {
+                    "session": {"type": "string", "example": "default"},
+                    "state": {"type": "string", "enum": ["idle", "starting", "active", "stopping", "preparing", "standby"]},
+                    "is_active": {"type": "boolean"},
+                    "created_at": {"type": "number"},
+                    "config": {
+                        "type": "object",
+                        "nullable": True,
+                        "description": "Configuration in use (without the password); ip_range may differ from the request"
+                    },
+                    "resources": {
+                        "type": "object",
+                        "properties": {
+                            "bridge_name": {"type": "string", "example": "br-guest"},
+                            "chain": {"type": "string", "example": "FANTASMA-guest"},
+                            "hostapd_conf": {"type": "string"},
+                            "dnsmasq_conf": {"type": "string"}
+                        }
+                    }
+                }
+            },
+            "SessionsStatus": {
+                "type": "object",
+                "properties": {
+                    "summary": {"$ref": "#/components/schemas/SessionsSummary"},
+                    "sessions": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/Session"}
+                    }
+                }
+            },
             "SuccessResponse": {
                 "type": "object",
                 "properties": {
@@ -397,7 +1510,24 @@ OPENAPI_SPEC = {
                 }
             }
         },
+        "parameters": {
+            "IfNoneMatch": {
+                "name": "If-None-Match",
+                "in": "header",
+                "description": "ETag of a previous response; 304 Not Modified if it is still current",
+                "schema": {"type": "string"}
+            }
+        },
         "responses": {
+            "NotModified": {
+                "description": "Unchanged since the ETag in If-None-Match (no body)",
+                "headers": {
+                    "ETag": {
+                        "schema": {"type": "string"},
+                        "description": "Current strong ETag"
+                    }
+                }
+            },
             "UnauthorizedError": {
                 "description": "API key is missing or invalid",
                 "content": {
@@ -459,9 +1589,21 @@ OPENAPI_SPEC = {
             "name": "Control",
             "description": "Start and stop sharing"
         },
+        {
+            "name": "Sessions",
+            "description": "Concurrent sharing sessions"
+        },
         {
             "name": "Profiles",
             "description": "Configuration profile management"
+        },
+        {
+            "name": "Keys",
+            "description": "API key management (admin scope)"
+        },
+        {
+            "name": "Monitoring",
+            "description": "Traffic accounting and analytics"
         }
     ]
 }
@@ -0,0 +1,447 @@
+"""
+FantasmaWiFi-Pro Sessions
+Several concurrent sharing sessions on one host
+
+A session is one target interface being shared: its own FantasmaCore
+(state machine, mutation queue, monitors) over its own platform adapter
+(bridge, configuration files, firewall chains, daemons). The existing core
+is the 'default' session; additional sessions are created on demand where
+the platform supports them (PlatformAdapter.for_session).
+
+SessionManager keeps sessions from colliding - a target interface belongs
+to one session at a time, and each session gets its own client subnet -
+and keeps per-state counts up to date as sessions change state, so the
+aggregate summary costs the same with two sessions or fifty.
+
+With a journal (fantasma_journal) on the default core, every session
+records what it applies, and a new SessionManager recovers sessions a dead
+process left open: adopted when still intact, otherwise rolled back.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import ipaddress
+import logging
+import os
+import re
+import threading
+import time
+
+from fantasma_core import FantasmaConfig, FantasmaCore, NetworkMode, SessionState
+from fantasma_journal import process_alive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = 'default'
+
+# Session ids name bridges (br-<id>, 15 characters at most) and iptables chains
+SESSION_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,11}$')
+
+# Client subnets handed out when a requested ip_range is already in use
+SUBNET_POOL = [f'192.168.{n}.0/24' for n in range(137, 255)] + \
+              [f'10.137.{n}.0/24' for n in range(256)]
+
+
+class SessionError(Exception):
+    """A session request that conflicts with the current sessions"""
+
+
+class Session:
+    """One sharing session and its core"""
+
+    def __init__(self, session_id: str, core: FantasmaCore):
+        self.id = session_id
+        self.core = core
+        self.created_at = time.time()
+        # Configuration reserved while starting, running or in standby:
+        # interfaces and subnet stay claimed from the start (or prepare)
+        # request until a successful stop
+        self.claim: Optional[FantasmaConfig] = None
+        # The configuration as requested (claim may be on another subnet);
+        # None for a claim recovered from the journal
+        self.requested: Optional[FantasmaConfig] = None
+
+    def repeats_claim(self, config: FantasmaConfig) -> bool:
+        """
+        True if config is the request behind the claim (for a recovered
+        claim: the claim itself, possibly before its move to another subnet)
+        """
+        if self.requested is not None:
+            return self.requested.to_dict() == config.to_dict()
+        moved = config.copy()
+        moved.set_subnet(self.claim.ip_range)
+        return moved.to_dict() == self.claim.to_dict()
+
+    def get_status(self) -> Dict[str, Any]:
+        """JSON-ready status of this session"""
+        status = dict(self.core.get_status())
+        config = status.get('config')
+        status['config'] = config.to_dict() if config else None
+        if status['config']:
+            # Status is served to any authenticated reader; keep the passphrase out
+            status['config'].pop('password', None)
+        status['session'] = self.id
+        status['created_at'] = self.created_at
+        adapter = self.core.adapter
+        status['resources'] = {
+            key: getattr(adapter, key) for key in ('bridge_name', 'chain', 'hostapd_conf', 'dnsmasq_conf')
+            if hasattr(adapter, key)
+        }
+        return status
+
+
+class SessionManager:
+    """
+    Sessions on one host, keyed by id
+
+    Args:
+        core: The default session's core; its adapter creates the others
+        max_sessions: Upper bound on sessions, including the default one
+    """
+
+    def __init__(self, core: FantasmaCore, max_sessions: int = 64):
+        self.core = core
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Session] = {}
+        self._counts = {state.value: 0 for state in SessionState}
+        metrics = core.metrics
+        self._sessions_metric = metrics.gauge('fantasma_sessions', 'Sessions by state', ('state',))
+        self._recovered_metric = metrics.counter(
+            'fantasma_sessions_recovered', 'Journaled sessions found open at startup, by outcome', ('result',))
+        self._interface_bytes_metric = metrics.counter(
+            'fantasma_interface_bytes', 'Bytes through each interface', ('interface', 'direction'))
+        self._interface_packets_metric = metrics.counter(
+            'fantasma_interface_packets', 'Packets through each interface', ('interface', 'direction'))
+        self._conntrack_metric = metrics.gauge(
+            'fantasma_conntrack_entries', 'Entries in the host connection tracking table')
+        self._conntrack_max_metric = metrics.gauge(
+            'fantasma_conntrack_max', 'Size limit of the host connection tracking table')
+        self._add(Session(DEFAULT_SESSION, core))
+        # Link events come from the default adapter's monitor; every
+        # session's cached status depends on them
+        core.adapter.add_event_listener(self._on_adapter_event)
+        # Outcome of startup recovery by session id: adopted, rolled_back or owned
+        self.recovered: Dict[str, str] = {}
+
+    def _add(self, session: Session):
+        self._sessions[session.id] = session
+        self._counts[session.core.state.value] += 1
+        session.core.state_listeners.append(self._on_transition)
+
+    def _on_transition(self, event: Dict[str, Any]):
+        with self._lock:
+            self._counts[event['from']] -= 1
+            self._counts[event['to']] += 1
+
+    def _on_adapter_event(self, kind: str):
+        for session in self.list():
+            if session.core is not self.core:
+                session.core._on_adapter_event(kind)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Session by id, or None"""
+        return self._sessions.get(session_id)
+
+    def list(self) -> List[Session]:
+        """All sessions, default first"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def create(self, session_id: str) -> Session:
+        """
+        Create an idle session (returns the existing one if it exists)
+
+        Raises:
+            SessionError: invalid id, too many sessions, or the platform
+            shares to one target only
+        """
+        with self._lock:
+            return self._create_locked(session_id)
+
+    def _create_locked(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise SessionError(
+                "Session ids are 1-12 characters: lowercase letters, digits, '-' and '_'"
+            )
+        if len(self._sessions) >= self.max_sessions:
+            raise SessionError(f"Session limit reached ({self.max_sessions})")
+        adapter = self.core.adapter.for_session(session_id)
+        if adapter is None:
+            raise SessionError("This platform supports a single sharing session")
+        core = FantasmaCore(adapter, cache_ttls=self.core.cache.ttls,
+                            journal=self.core.journal, session_id=session_id, metrics=self.core.metrics)
+        session = Session(session_id, core)
+        self._add(session)
+        logger.info(f"Created session {session_id}")
+        return session
+
+    def remove(self, session_id: str):
+        """
+        Forget an idle session
+
+        Raises:
+            SessionError: the default session, or a session still sharing
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            if session.core is self.core:
+                raise SessionError("The default session cannot be removed")
+            if session.core.state != SessionState.IDLE or session.claim is not None:
+                raise SessionError(f"Session {session_id} is still {session.core.state.value}")
+            self._discard_locked(session)
+
+    def _discard_locked(self, session: Session):
+        del self._sessions[session.id]
+        self._counts[session.core.state.value] -= 1
+        session.core.state_listeners.remove(self._on_transition)
+        self.core.metrics.discard('session', session.id)
+
+    def _claim(self, session: Session, config: FantasmaConfig) -> FantasmaConfig:
+        """
+        Reserve config's interfaces and a free subnet for session
+
+        Returns the configuration to start with: config itself, or a copy
+        moved to a free subnet when its ip_range overlaps another session's.
+        """
+        others = [other.claim for other in self._sessions.values()
+                  if other is not session and other.claim is not None]
+        target = config.target_interface.name
+        source = config.source_interface.name
+        for other in others:
+            used = {other.target_interface.name}
+            if other.mode == NetworkMode.BRIDGE:
+                used.add(other.source_interface.name)
+            if target in used:
+                raise SessionError(f"{target} is already shared by another session")
+            if config.mode == NetworkMode.BRIDGE and source in used:
+                raise SessionError(f"{source} is already bridged by another session")
+            if target == other.source_interface.name:
+                raise SessionError(f"{target} is the uplink of another session")
+
+        taken = [other.network for other in others]
+        if config.mode == NetworkMode.HOTSPOT and any(config.network.overlaps(net) for net in taken):
+            for candidate in SUBNET_POOL:
+                network = ipaddress.ip_network(candidate)
+                if not any(network.overlaps(net) for net in taken):
+                    config = config.copy()
+                    config.set_subnet(candidate)
+                    logger.info(f"Session {session.id} moved to subnet {candidate}")
+                    break
+            else:
+                raise SessionError("No free client subnet")
+        session.claim = config
+        return config
+
+    def _reserve(self, session_id: str, config: FantasmaConfig, replace: bool) -> Tuple[Session, FantasmaConfig]:
+        """
+        Session for session_id (created if needed) and the configuration to
+        run it with
+
+        A session holding a claim keeps it unless replace is set; a request
+        repeating the claimed one gets the claimed configuration (subnet
+        included), so a start matches the standby it activates.
+        """
+        with self._lock:
+            created = session_id not in self._sessions
+            session = self._create_locked(session_id)
+            if session.claim is not None and not replace:
+                if session.repeats_claim(config):
+                    return session, session.claim
+                return session, config
+            previous = session.claim, session.requested
+            session.claim = None
+            try:
+                claimed = self._claim(session, config)
+            except SessionError:
+                session.claim, session.requested = previous
+                # Do not leave an empty session behind a rejected request
+                if created:
+                    self._discard_locked(session)
+                raise
+            session.requested = config
+            return session, claimed
+
+    def recover(self) -> Dict[str, str]:
+        """
+        Adopt or roll back the sessions left open in the journal
+
+        Sessions owned by another live process (a daemon, a CLI mid-start)
+        are left alone. Only the process that owns the sessions (the daemon,
+        the web server or a local start/stop) calls this, once, before its
+        first start or stop. Returns the outcome by session id.
+        """
+        journal = self.core.journal
+        if journal is None:
+            return {}
+        began = time.time()
+        for session_id, record in journal.open_sessions().items():
+            if record['owner'] != os.getpid() and process_alive(record['owner']):
+                self.recovered[session_id] = 'owned'
+                continue
+            try:
+                session = self.create(session_id)
+            except SessionError as e:
+                logger.error(f"Cannot recover session {session_id}: {e}")
+                continue
+            result = session.core.recover(record)
+            self._recovered_metric.inc((result,))
+            if result == 'adopted':
+                config = session.core.config or session.core.prepared
+                with self._lock:
+                    session.claim = config
+            self.recovered[session_id] = result
+        if self.recovered:
+            logger.info(f"Recovered {len(self.recovered)} journaled sessions in "
+                        f"{(time.time() - began) * 1000:.1f} ms: {self.recovered}")
+        try:
+            journal.compact()
+        except OSError as e:
+            logger.error(f"Error compacting journal: {e}")
+        return dict(self.recovered)
+
+    def _release_if_idle(self, session: Session):
+        state = session.core.get_state()
+        with self._lock:
+            if state['state'] == SessionState.IDLE.value and not state['pending']:
+                session.claim = None
+                session.requested = None
+
+    def start(self, session_id: str, config: FantasmaConfig,
+              progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        Start sharing in a session, creating it if needed
+
+        A session that is already starting or active keeps its claim; the
+        request then joins or is rejected by the session's core.
+
+        Raises:
+            SessionError: see create(); or config's interfaces belong to
+            another session
+        """
+        if not config.validate():
+            logger.error("Invalid configuration")
+            return False
+        session, config = self._reserve(session_id, config, replace=False)
+        try:
+            return session.core.start(config, progress=progress)
+        finally:
+            self._release_if_idle(session)
+
+    def prepare(self, session_id: str, config: FantasmaConfig,
+                progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        Pre-warm a session (standby), creating it if needed; a later start
+        with the same configuration only activates it
+
+        Raises:
+            SessionError: as for start()
+        """
+        if not config.validate():
+            logger.error("Invalid configuration")
+            return False
+        session = self.get(session_id)
+        # A running session keeps its claim; its core rejects the request
+        busy = session is not None and session.core.state in (SessionState.STARTING, SessionState.ACTIVE)
+        session, config = self._reserve(session_id, config, replace=not busy)
+        try:
+            return session.core.prepare(config, progress=progress)
+        finally:
+            self._release_if_idle(session)
+
+    def stop(self, session_id: str, progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        Stop sharing in a session
+
+        Cleanup also runs for sessions this process does not know about, in
+        case another process started them.
+        """
+        with self._lock:
+            session = self._create_locked(session_id)
+        try:
+            return session.core.stop(progress=progress)
+        finally:
+            self._release_if_idle(session)
+
+    def reconfigure(self, session_id: str, config: FantasmaConfig,
+                    progress: Optional[Callable[[str, str], None]] = None) -> bool:
+        """Restart a session with a new configuration"""
+        if not config.validate():
+            logger.error("Invalid configuration")
+            return False
+        session, config = self._reserve(session_id, config, replace=True)
+        try:
+            return session.core.reconfigure(config, progress=progress)
+        finally:
+            self._release_if_idle(session)
+
+    def stop_all(self) -> bool:
+        """Stop every session that is not idle, concurrently"""
+        sessions = [session for session in self.list() if session.core.state != SessionState.IDLE]
+        results = {}
+
+        def stop(session: Session):
+            results[session.id] = self.stop(session.id)
+
+        threads = [threading.Thread(target=stop, args=(session,)) for session in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return all(results.values())
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Session counts by state (maintained on transitions; no probing)"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'states': dict(self._counts),
+                'active': self._counts[SessionState.ACTIVE.value]
+            }
+
+    def collect_metrics(self):
+        """
+        Sample host and session counters into the metrics registry
+
+        Called periodically by the owner (daemon or web server) so that a
+        scrape only renders; reads kernel counters (no processes spawned).
+        """
+        adapter = self.core.adapter
+        interface_bytes = {}
+        interface_packets = {}
+        for name, counters in adapter.read_interface_counters().items():
+            for direction in ('rx', 'tx'):
+                interface_bytes[(name, direction)] = counters[f'{direction}_bytes']
+                interface_packets[(name, direction)] = counters[f'{direction}_packets']
+        self._interface_bytes_metric.replace(interface_bytes)
+        self._interface_packets_metric.replace(interface_packets)
+        usage = adapter.read_conntrack_usage()
+        if usage is not None:
+            self._conntrack_metric.set((), usage[0])
+            self._conntrack_max_metric.set((), usage[1])
+        with self._lock:
+            counts = dict(self._counts)
+        for state, count in counts.items():
+            self._sessions_metric.set((state,), count)
+        for session in self.list():
+            session.core.collect_metrics()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Status of one session, or None if unknown"""
+        session = self.get(session_id)
+        return session.get_status() if session else None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Aggregate status: summary plus each session's (cached) status"""
+        status = {
+            'summary': self.get_summary(),
+            'sessions': [session.get_status() for session in self.list()]
+        }
+        if self.core.journal is not None:
+            status['journal'] = dict(self.core.journal.get_stats(), recovered=dict(self.recovered))
+        return status
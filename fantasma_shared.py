@@ -0,0 +1,247 @@
+"""
+FantasmaWiFi-Pro Shared API State
+Rate-limit buckets and API keys shared by several web worker processes
+
+Without it every worker process has its own rate limits and its own
+randomly generated default key. With it (see fantasma_api.enable_shared_state)
+all workers enforce one quota per client and accept one set of keys.
+
+Rate limits live in a memory-mapped table of fixed-size token buckets.
+A client hashes to a window of WINDOW consecutive slots; a check takes an
+fcntl lock on just that byte range, refills and takes a token in place,
+and unlocks - O(1), and checks for different clients rarely contend. A
+client without a slot takes an empty one, else one whose bucket has
+refilled completely (indistinguishable from a new one), else the least
+recently used one in its window, so the table never grows.
+
+API keys (hashed records by key id, see fantasma_api.APIAuth) live in
+SQLite in WAL mode (readers never block the writer). Each worker keeps them
+in memory and validates against that copy; a change bumps a generation
+counter in a small memory-mapped file, which workers read lock-free on
+every check and reload the keys when it moved.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'FRLT'
+LAYOUT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHI4x')       # magic, layout, reserved, slots
+_SLOT = struct.Struct('<QddI4x')          # client hash, tokens, last refill, limit
+_GENERATION = struct.Struct('<Q')
+
+# Slots a client may occupy (and that one check locks)
+WINDOW = 8
+
+
+def _client_hash(client_id: str) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(client_id.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class BucketTable:
+    """
+    Token buckets in a shared memory-mapped file
+
+    Args:
+        path: Table file (created if missing, 0600)
+        slots: Buckets in the table (fixed once the file exists)
+    """
+
+    def __init__(self, path: str, slots: int = 16384):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Size and format the file once, under a whole-file lock, so
+        # workers starting together agree on the layout
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and header[:4] == MAGIC:
+                _, layout, _, slots = _HEADER.unpack(header)
+            else:
+                layout = None
+            if layout != LAYOUT_VERSION:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, _HEADER.size + slots * _SLOT.size)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, LAYOUT_VERSION, 0, slots), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self.slots = slots
+        self._map = mmap.mmap(self._fd, _HEADER.size + slots * _SLOT.size)
+        self.evicted = 0
+
+    def _window(self, client_id: str) -> Tuple[int, int]:
+        key = _client_hash(client_id)
+        return key, key % (self.slots - WINDOW + 1)
+
+    def _locked(self, first: int, operation):
+        start = _HEADER.size + first * _SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, WINDOW * _SLOT.size, start)
+        try:
+            return operation(start)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, WINDOW * _SLOT.size, start)
+
+    def take(self, client_id: str, limit: int, now: float) -> Tuple[bool, int, float]:
+        """
+        Take a token from client_id's bucket (full at limit, refilling at
+        limit per minute)
+
+        Returns:
+            (allowed, remaining, retry_after)
+        """
+        key, first = self._window(client_id)
+
+        def operation(start: int) -> Tuple[bool, int, float]:
+            victim = None
+            victim_rank = None
+            for offset in range(start, start + WINDOW * _SLOT.size, _SLOT.size):
+                slot_key, tokens, last, slot_limit = _SLOT.unpack_from(self._map, offset)
+                if slot_key == key and slot_limit == limit:
+                    tokens = min(float(limit), tokens + (now - last) * limit / 60.0)
+                    break
+                if slot_key == key:
+                    # Tier changed: start over with a full bucket
+                    tokens = float(limit)
+                    break
+                # Empty slots first, then refilled buckets, then the least recently used
+                if slot_key == 0:
+                    rank = (0, 0.0)
+                elif tokens + (now - last) * slot_limit / 60.0 >= slot_limit:
+                    rank = (1, last)
+                else:
+                    rank = (2, last)
+                if victim_rank is None or rank < victim_rank:
+                    victim, victim_rank = offset, rank
+            else:
+                if victim_rank[0] == 2:
+                    self.evicted += 1
+                offset, tokens = victim, float(limit)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            _SLOT.pack_into(self._map, offset, key, tokens, now, limit)
+            retry_after = 0.0 if allowed else (1.0 - tokens) * 60.0 / limit
+            return allowed, int(tokens), retry_after
+
+        return self._locked(first, operation)
+
+    def peek(self, client_id: str, limit: int, now: float) -> int:
+        """Tokens client_id has left (takes none)"""
+        key, first = self._window(client_id)
+
+        def operation(start: int) -> int:
+            for offset in range(start, start + WINDOW * _SLOT.size, _SLOT.size):
+                slot_key, tokens, last, slot_limit = _SLOT.unpack_from(self._map, offset)
+                if slot_key == key and slot_limit == limit:
+                    return int(min(float(limit), tokens + (now - last) * limit / 60.0))
+            return limit
+
+        return self._locked(first, operation)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Slots, slots in use and evictions by this process"""
+        used = sum(1 for offset in range(_HEADER.size, len(self._map), _SLOT.size)
+                   if _SLOT.unpack_from(self._map, offset)[0])
+        return {'path': self.path, 'slots': self.slots, 'used': used, 'evicted': self.evicted}
+
+
+class KeyStore:
+    """
+    API keys in SQLite (WAL) with a memory-mapped change counter
+
+    The generation is incremented in the same transaction as the change it
+    announces, then published to the counter file, which only ever moves
+    forward - a reader that sees it move reloads, and reads keys and
+    generation in one transaction, so it never records a generation newer
+    than the keys it got.
+
+    Args:
+        path: SQLite database; the counter is kept in <path>.gen
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        os.chmod(path, 0o600)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS api_keys (key_id TEXT PRIMARY KEY, info TEXT NOT NULL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+        self._generation_fd = os.open(f"{path}.gen", os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._generation_fd).st_size < _GENERATION.size:
+            os.ftruncate(self._generation_fd, _GENERATION.size)
+        self._generation = mmap.mmap(self._generation_fd, _GENERATION.size)
+
+    @property
+    def generation(self) -> int:
+        """Published change counter (a plain memory read)"""
+        return _GENERATION.unpack_from(self._generation, 0)[0]
+
+    def _publish(self, generation: int):
+        fcntl.lockf(self._generation_fd, fcntl.LOCK_EX)
+        try:
+            if generation > self.generation:
+                _GENERATION.pack_into(self._generation, 0, generation)
+        finally:
+            fcntl.lockf(self._generation_fd, fcntl.LOCK_UN)
+
+    def _write(self, change) -> Optional[int]:
+        """Run change(db) in a write transaction with a generation bump; None if it declined"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if change(self._db) is False:
+                    self._db.execute('ROLLBACK')
+                    return None
+                row = self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+                generation = int(row[0]) + 1 if row else 1
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        self._publish(generation)
+        return generation
+
+    def load(self) -> Tuple[int, Optional[str], Dict[str, dict]]:
+        """(generation, default key, keys) as stored now"""
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                meta = dict(self._db.execute('SELECT name, value FROM meta'))
+                keys = {key: json.loads(info) for key, info in self._db.execute('SELECT key_id, info FROM api_keys')}
+            finally:
+                self._db.execute('COMMIT')
+        generation = int(meta.get('generation', 0))
+        # Heal a counter left behind by a process that died between commit and publish
+        self._publish(generation)
+        return generation, meta.get('default_key_id'), keys
+
+    def initialize(self, default_key_id: str, keys: Dict[str, dict]) -> bool:
+        """Store keys and the default key's id unless another process already did; True if stored"""
+        def change(db):
+            if db.execute("SELECT 1 FROM meta WHERE name = 'default_key_id'").fetchone():
+                return False
+            db.executemany('INSERT OR REPLACE INTO api_keys VALUES (?, ?)',
+                           [(key_id, json.dumps(info)) for key_id, info in keys.items()])
+            db.execute("INSERT INTO meta VALUES ('default_key_id', ?)", (default_key_id,))
+        return self._write(change) is not None
+
+    def put(self, key_id: str, info: dict):
+        """Insert or update one key record"""
+        self._write(lambda db: db.execute('INSERT OR REPLACE INTO api_keys VALUES (?, ?)',
+                                          (key_id, json.dumps(info))))
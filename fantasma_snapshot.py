@@ -0,0 +1,254 @@
+"""
+FantasmaWiFi-Pro Status Snapshot
+Fixed-layout status published in a memory-mapped file
+
+The process owning FantasmaCore (normally the daemon) writes the current
+status into a small file with a fixed binary layout. Readers map the file
+once and then read it with plain memory accesses - no socket, no
+subprocess, no syscall - so any number of dashboards, CLIs and monitoring
+agents can poll it without loading the adapter.
+
+Consistency uses a seqlock: the writer makes the sequence number odd,
+writes the body, then makes it even again. A reader copies the body
+between two reads of the sequence and retries if they differ or are odd.
+Readers never block the writer. Every snapshot carries the time it was
+written, so a reader can tell a live snapshot from one left behind by a
+dead writer.
+"""
+
+from typing import Any, Dict, Optional
+import json
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'FSNP'
+LAYOUT_VERSION = 3
+
+# Session states by their code in the snapshot
+STATES = ('idle', 'starting', 'active', 'stopping', 'preparing', 'standby')
+
+_HEADER = struct.Struct('<4sHHQ')  # magic, layout, reserved, sequence
+_SEQ = struct.Struct('<Q')
+_SEQ_OFFSET = 8
+_BODY = struct.Struct(
+    '<'
+    'ddQI?B2x'      # updated_at, started_at, status version, writer pid, is_active, state
+    '8s16s16s16s32s'  # mode, platform, source, target, ssid
+    'IIdddddd'      # latency: clients, handshakes, uplink/wlan p50/p90, retransmit rates
+    'II'            # traffic: clients, tracked flows
+    'H6x512s'       # platform details (compact JSON)
+)
+SNAPSHOT_SIZE = _HEADER.size + _BODY.size
+
+
+def _text(value: Optional[str], size: int) -> bytes:
+    return (value or '').encode('utf-8')[:size]
+
+
+def _untext(value: bytes) -> str:
+    return value.rstrip(b'\0').decode('utf-8', 'replace')
+
+
+class SnapshotWriter:
+    """Publishes status snapshots (single writer per file)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started_at = time.time()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Reuse an existing file in place so readers that already mapped it
+        # keep seeing updates across writer restarts
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != SNAPSHOT_SIZE:
+                os.ftruncate(fd, SNAPSHOT_SIZE)
+            self._map = mmap.mmap(fd, SNAPSHOT_SIZE)
+        finally:
+            os.close(fd)
+
+        magic, layout, _, seq = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            seq = 0
+        self._seq = (seq + 1) & ~1  # start from an even (stable) value
+        _HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, 0, self._seq)
+
+    def publish(self, status: Dict[str, Any], traffic: Optional[Dict[str, int]] = None,
+                version: int = 0):
+        """
+        Write a snapshot of a FantasmaCore status dict
+
+        Args:
+            status: FantasmaCore.get_status() output
+            traffic: FantasmaCore.get_traffic_summary() output
+            version: FantasmaCore.get_version() taken before status
+        """
+        config = status.get('config')
+        latency = status.get('latency') or {}
+        traffic = traffic or {}
+        details = {
+            key: value for key, value in status.items()
+            if key not in ('platform', 'is_active', 'state', 'config', 'latency', 'updated_at')
+        }
+        details_json = json.dumps(details, separators=(',', ':'), default=str).encode()
+        if len(details_json) > 512:
+            details_json = b'{}'
+
+        body = _BODY.pack(
+            time.time(),
+            self.started_at,
+            version,
+            os.getpid(),
+            bool(status.get('is_active')),
+            STATES.index(status.get('state', 'idle')),
+            _text(config.mode.value if config else None, 8),
+            _text(status.get('platform'), 16),
+            _text(config.source_interface.name if config else None, 16),
+            _text(config.target_interface.name if config else None, 16),
+            _text(config.ssid if config else None, 32),
+            latency.get('clients', 0),
+            latency.get('handshakes', 0),
+            latency.get('uplink_p50_ms', 0.0),
+            latency.get('uplink_p90_ms', 0.0),
+            latency.get('wlan_p50_ms', 0.0),
+            latency.get('wlan_p90_ms', 0.0),
+            latency.get('retransmit_rate_up', 0.0),
+            latency.get('retransmit_rate_down', 0.0),
+            traffic.get('clients', 0),
+            traffic.get('tracked_flows', 0),
+            len(details_json),
+            details_json
+        )
+
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)   # odd: write in progress
+        self._map[_HEADER.size:SNAPSHOT_SIZE] = body
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)   # even: stable
+
+    def close(self):
+        """Unmap the file (it stays on disk for readers)"""
+        self._map.close()
+
+
+class SnapshotReader:
+    """Lock-free reader for a file published by SnapshotWriter"""
+
+    def __init__(self, path: str, retries: int = 100):
+        self.path = path
+        self.retries = retries
+        self._map: Optional[mmap.mmap] = None
+
+    def _open(self) -> bool:
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size != SNAPSHOT_SIZE:
+                    return False
+                self._map = mmap.mmap(f.fileno(), SNAPSHOT_SIZE, access=mmap.ACCESS_READ)
+        except OSError:
+            return False
+        return True
+
+    def read_raw(self) -> Optional[tuple]:
+        """Consistent (sequence, body fields) pair, or None if unavailable"""
+        if self._map is None and not self._open():
+            return None
+        magic, layout, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            return None
+
+        for _ in range(self.retries):
+            before = _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]
+            if before & 1:
+                continue
+            body = self._map[_HEADER.size:SNAPSHOT_SIZE]
+            if _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0] == before:
+                return before, _BODY.unpack(body)
+        return None
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the current snapshot
+
+        Returns:
+            Status dict with seq, updated_at, age (seconds) and version
+            (see FantasmaCore.get_version) fields, or
+            None if no snapshot has been published (or the writer kept
+            changing it for all retries)
+        """
+        raw = self.read_raw()
+        if raw is None:
+            return None
+        seq, fields = raw
+        (updated_at, started_at, version, pid, is_active, state, mode, platform, source, target, ssid,
+         latency_clients, handshakes, uplink_p50, uplink_p90, wlan_p50, wlan_p90,
+         retrans_up, retrans_down, traffic_clients, tracked_flows,
+         details_len, details) = fields
+        if not seq:
+            return None
+        try:
+            details = json.loads(details[:details_len] or b'{}')
+        except ValueError:
+            details = {}
+
+        return {
+            'seq': seq,
+            'updated_at': updated_at,
+            'age': time.time() - updated_at,
+            'started_at': started_at,
+            'version': version,
+            'writer_pid': pid,
+            'is_active': is_active,
+            'state': STATES[state] if state < len(STATES) else 'idle',
+            'mode': _untext(mode) or None,
+            'platform': _untext(platform),
+            'source_interface': _untext(source),
+            'target_interface': _untext(target),
+            'ssid': _untext(ssid),
+            'latency': {
+                'clients': latency_clients,
+                'uplink_p50_ms': uplink_p50,
+                'uplink_p90_ms': uplink_p90,
+                'wlan_p50_ms': wlan_p50,
+                'wlan_p90_ms': wlan_p90,
+                'handshakes': handshakes,
+                'retransmit_rate_up': retrans_up,
+                'retransmit_rate_down': retrans_down
+            },
+            'traffic': {
+                'clients': traffic_clients,
+                'tracked_flows': tracked_flows
+            },
+            'details': details
+        }
+
+    def close(self):
+        """Unmap the file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def main():
+    """Print the current snapshot as JSON (for monitoring agents)"""
+    import argparse
+    import sys
+    from fantasma_daemon import default_snapshot_path
+
+    parser = argparse.ArgumentParser(description='Print the FantasmaWiFi-Pro status snapshot')
+    parser.add_argument('path', nargs='?', default=None, help='Snapshot file')
+    args = parser.parse_args()
+
+    snapshot = SnapshotReader(args.path or default_snapshot_path()).read()
+    if snapshot is None:
+        print('No status snapshot available', file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(snapshot, indent=2))
+
+
+if __name__ == '__main__':
+    main()
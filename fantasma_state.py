@@ -0,0 +1,55 @@
+"""
+FantasmaWiFi-Pro State File
+Web server state that outlives the process (profiles, API keys, events)
+
+The file is a single JSON document, replaced atomically (temporary file,
+fsync, rename) so a reader or a crash never sees half of it. It holds API
+keys, so it is created readable by its owner only.
+"""
+
+from typing import Any, Dict
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class StateFile:
+    """
+    JSON document persisted atomically at path
+
+    Args:
+        path: State file (created 0600)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, Any]:
+        """Saved state ({} if there is none or it cannot be read)"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, data: Dict[str, Any]):
+        """
+        Replace the saved state with data
+
+        Raises:
+            OSError: the file could not be written
+        """
+        tmp = f"{self.path}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, json.dumps(data, separators=(',', ':')).encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, self.path)
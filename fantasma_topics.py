@@ -0,0 +1,439 @@
+"""
+FantasmaWiFi-Pro Topics
+Change-driven state streams for WebSocket subscribers
+
+A topic holds the latest value of one piece of state (status, clients,
+metrics, logs). Publishing a new value diffs it against the previous one;
+when something changed, subscribers get only the changes as JSON Patch
+operations (RFC 6902 add/remove/replace) with the topic's next sequence
+number. A subscriber starts from a full snapshot and applies deltas in
+sequence order; a gap means it missed one and subscribes again.
+
+Each delta is built and serialized once and sent to all subscribers of the
+topic (one Socket.IO room), so the cost of an update does not grow with the
+number of connections - only the socket writes do.
+
+Slow consumers: a connection whose outgoing queue passes a high-water mark
+is taken out of the rooms, so nothing more piles up for it. Its missed
+deltas are coalesced (latest value wins): when the queue drains it gets one
+snapshot per topic at the current seq, and the sequenced events it missed
+are replayed from the event bus - or it is told to resync when more than a
+bounded number were missed. A connection that stays behind longer than the
+allowed lag is disconnected.
+
+The same deltas are kept in a bounded ring with stream-wide ids for
+Server-Sent Events consumers (see open_stream). Each entry is rendered as
+an SSE frame once, on first use, and that text is shared by every stream.
+"""
+
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(key: str) -> str:
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token: str) -> str:
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def diff(old: Any, new: Any, path: str = '') -> List[Dict[str, Any]]:
+    """
+    JSON Patch operations turning old into new
+
+    Objects are compared key by key; anything else (lists included) that
+    differs is replaced as a whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': f"{path}/{_escape(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                ops.extend(diff(old[key], value, child))
+            else:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+        return ops
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(value: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Apply operations from diff() or TopicPublisher (value is modified in place) and return the result"""
+    for op in ops:
+        if op['path'] == '':
+            value = op.get('value')
+            continue
+        *parents, last = [_unescape(token) for token in op['path'].split('/')[1:]]
+        target = value
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        if isinstance(target, list):
+            if op['op'] == 'remove':
+                del target[int(last)]
+            elif last == '-':
+                target.append(op['value'])
+            elif op['op'] == 'add':
+                target.insert(int(last), op['value'])
+            else:
+                target[int(last)] = op['value']
+        elif op['op'] == 'remove':
+            target.pop(last, None)
+        else:
+            target[last] = op['value']
+    return value
+
+
+class _Client:
+    __slots__ = ('topics', 'lagging_since', 'event_seq')
+
+    def __init__(self):
+        self.topics: set = set()
+        self.lagging_since: Optional[float] = None
+        self.event_seq = 0      # last bus event delivered before lagging
+
+
+class _Topic:
+    __slots__ = ('seq', 'value', 'subscribers', 'deltas', 'streams', 'snapshot_frame')
+
+    def __init__(self):
+        self.seq = 0
+        self.value: Any = None
+        self.subscribers: set = set()
+        self.deltas = 0
+        self.streams = 0        # open SSE streams including this topic
+        self.snapshot_frame: Optional[Tuple[int, str]] = None   # (stream id, frame)
+
+
+def _frame(stream_id: int, event: str, message: Dict[str, Any]) -> str:
+    return f"id: {stream_id}\nevent: {event}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+
+class _Entry:
+    """A delta in the stream ring; its SSE frame is rendered once, when first needed"""
+    __slots__ = ('id', 'topic', 'message', '_frame')
+
+    def __init__(self, stream_id: int, topic: str, message: Dict[str, Any]):
+        self.id = stream_id
+        self.topic = topic
+        self.message = message
+        self._frame: Optional[str] = None
+
+    @property
+    def frame(self) -> str:
+        if self._frame is None:
+            self._frame = _frame(self.id, 'delta', self.message)
+        return self._frame
+
+
+class TopicPublisher:
+    """
+    Topics with sequenced deltas and snapshots, and slow-consumer handling
+
+    Args:
+        emit: Callable(event, message, to, skip) sending one message to a
+            room (see room()), a single connection id, or everyone (to=None)
+            except the ids in skip
+        topics: Names subscribers may subscribe to
+        enter_room: Callable(sid, room) adding a connection to a room
+        leave_room: Callable(sid, room) removing it
+        events: EventBus whose events broadcast() sends (replayed to
+            connections that fell behind)
+        high_water: Queued messages at which a connection counts as lagging
+        low_water: Queued messages at which a lagging connection catches up
+        max_lag: Seconds a connection may lag before it is disconnected
+        max_events: Missed events replayed on catching up (more: resync)
+        history: Deltas kept for SSE streams to resume from
+    """
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any], Optional[str], List[str]], None],
+                 topics: Iterable[str], enter_room: Callable[[str, str], None],
+                 leave_room: Callable[[str, str], None], events=None,
+                 high_water: int = 64, low_water: int = 8, max_lag: float = 30.0,
+                 max_events: int = 100, history: int = 1000):
+        self._emit = emit
+        self._enter_room = enter_room
+        self._leave_room = leave_room
+        self.events = events
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_lag = max_lag
+        self.max_events = max_events
+        # Reentrant: an emit may log, and a log handler may append to a topic
+        self._lock = threading.RLock()
+        self._topics: Dict[str, _Topic] = {name: _Topic() for name in topics}
+        self._clients: Dict[str, _Client] = {}
+        self._event_seq = 0
+        # SSE ring; ids start at the creation time (microseconds) so an id
+        # from before a restart never looks resumable
+        self._changed = threading.Condition(self._lock)
+        self._ring: deque = deque(maxlen=history)
+        self._stream_id = time.time_ns() // 1000
+        self._counters = {'lagged': 0, 'recovered': 0, 'disconnected': 0,
+                          'coalesced': 0, 'replayed': 0, 'resyncs': 0}
+
+    @staticmethod
+    def room(topic: str) -> str:
+        """Socket.IO room of a topic's subscribers"""
+        return f"topic:{topic}"
+
+    @property
+    def topics(self) -> List[str]:
+        return list(self._topics)
+
+    def subscribers(self, topic: str) -> int:
+        """Number of subscribers of topic (WebSocket and SSE)"""
+        state = self._topics[topic]
+        return len(state.subscribers) + state.streams
+
+    def attach(self, sid: str):
+        """Track a new connection (for broadcasts and lag checks)"""
+        with self._lock:
+            self._clients.setdefault(sid, _Client()).event_seq = self._event_seq
+
+    def _snapshot(self, sid: str, topic: str):
+        state = self._topics[topic]
+        self._emit('snapshot', {'topic': topic, 'seq': state.seq, 'value': state.value}, sid, [])
+
+    def subscribe(self, sid: str, topic: str) -> bool:
+        """
+        Add a subscriber to topic's room and send it a snapshot ({topic,
+        seq, value}); deltas sent before the snapshot are older than it
+
+        A lagging connection gets its snapshot when it catches up.
+
+        Returns:
+            bool: False if there is no such topic
+        """
+        with self._lock:
+            state = self._topics.get(topic)
+            if state is None:
+                return False
+            client = self._clients.setdefault(sid, _Client())
+            client.topics.add(topic)
+            state.subscribers.add(sid)
+            if client.lagging_since is None:
+                self._enter_room(sid, self.room(topic))
+                self._snapshot(sid, topic)
+        return True
+
+    def unsubscribe(self, sid: str, topic: str):
+        """Remove a subscriber from one topic"""
+        with self._lock:
+            client = self._clients.get(sid)
+            if topic in self._topics and client is not None and topic in client.topics:
+                client.topics.discard(topic)
+                self._topics[topic].subscribers.discard(sid)
+                self._leave_room(sid, self.room(topic))
+
+    def drop(self, sid: str):
+        """Forget a connection (on disconnect)"""
+        with self._lock:
+            self._clients.pop(sid, None)
+            for state in self._topics.values():
+                state.subscribers.discard(sid)
+
+    def _send(self, topic: str, state: _Topic, ops: List[Dict[str, Any]]):
+        # Caller holds the lock, so deltas leave in seq order
+        message = {'topic': topic, 'seq': state.seq, 'ops': ops}
+        self._stream_id += 1
+        self._ring.append(_Entry(self._stream_id, topic, message))
+        self._changed.notify_all()
+        if state.subscribers:
+            self._emit('delta', message, self.room(topic), [])
+            state.deltas += 1
+            # Lagging subscribers are out of the room: their snapshot on
+            # catching up stands in for this delta
+            self._counters['coalesced'] += sum(
+                1 for sid in state.subscribers if self._clients[sid].lagging_since is not None)
+
+    def broadcast(self, event: Dict[str, Any]):
+        """
+        Send an event bus event ({seq, event, data}) to every connection
+        that keeps up; lagging ones get it replayed when they catch up
+        """
+        with self._lock:
+            self._event_seq = max(self._event_seq, event['seq'])
+            lagging = [sid for sid, client in self._clients.items() if client.lagging_since is not None]
+            self._emit(event['event'], dict(event['data'], event_seq=event['seq']), None, lagging)
+
+    def check_lag(self, backlog: Callable[[str], Optional[int]], now: Optional[float] = None) -> List[str]:
+        """
+        Update every connection's lag state from its outgoing queue length
+
+        Args:
+            backlog: Callable(sid) returning messages queued for a
+                connection, or None if it is gone
+            now: Current monotonic time
+
+        Returns:
+            Connections lagging for longer than max_lag (to disconnect)
+        """
+        now = time.monotonic() if now is None else now
+        too_slow = []
+        with self._lock:
+            for sid, client in list(self._clients.items()):
+                queued = backlog(sid)
+                if queued is None:
+                    self.drop(sid)
+                elif client.lagging_since is None:
+                    if queued >= self.high_water:
+                        self._lag(sid, client, now)
+                elif queued <= self.low_water:
+                    self._catch_up(sid, client)
+                elif now - client.lagging_since > self.max_lag:
+                    too_slow.append(sid)
+                    self._counters['disconnected'] += 1
+        return too_slow
+
+    def _lag(self, sid: str, client: _Client, now: float):
+        client.lagging_since = now
+        client.event_seq = self._event_seq
+        for topic in client.topics:
+            self._leave_room(sid, self.room(topic))
+        self._counters['lagged'] += 1
+        logger.debug(f"Connection {sid} is lagging; coalescing its updates")
+
+    def _catch_up(self, sid: str, client: _Client):
+        client.lagging_since = None
+        for topic in sorted(client.topics):
+            self._enter_room(sid, self.room(topic))
+            self._snapshot(sid, topic)
+        if self.events is not None and client.event_seq < self._event_seq:
+            missed = self.events.since(client.event_seq)
+            if missed is None or len(missed) > self.max_events:
+                self._emit('resync', self.events.position(), sid, [])
+                self._counters['resyncs'] += 1
+            else:
+                for event in missed:
+                    self._emit(event['event'], dict(event['data'], event_seq=event['seq']), sid, [])
+                self._counters['replayed'] += len(missed)
+        self._counters['recovered'] += 1
+
+    def update(self, topic: str, value: Any) -> Optional[int]:
+        """
+        Publish the latest value of topic (not modified afterwards)
+
+        Returns:
+            The new seq, or None if nothing changed
+        """
+        with self._lock:
+            state = self._topics[topic]
+            ops = diff(state.value, value)
+            if not ops:
+                return None
+            state.seq += 1
+            state.value = value
+            self._send(topic, state, ops)
+            return state.seq
+
+    def append(self, topic: str, item: Any, limit: int) -> int:
+        """
+        Append item to a topic holding a list under 'entries', keeping the
+        newest limit items (an add and, when full, a remove of the oldest)
+
+        Returns:
+            The new seq
+        """
+        with self._lock:
+            state = self._topics[topic]
+            entries = (state.value or {}).get('entries', [])
+            ops = [{'op': 'add', 'path': '/entries/-', 'value': item}]
+            if len(entries) >= limit:
+                entries = entries[len(entries) - limit + 1:]
+                ops.append({'op': 'remove', 'path': '/entries/0'})
+            if state.value is None:
+                ops = [{'op': 'replace', 'path': '', 'value': {'entries': [item]}}]
+            state.seq += 1
+            state.value = {'entries': entries + [item]}
+            self._send(topic, state, ops)
+            return state.seq
+
+    # Server-Sent Events
+
+    def _snapshot_frames(self, topics: List[str]) -> List[str]:
+        # Caller holds the lock; one frame per topic and stream position,
+        # shared by all streams starting there
+        frames = []
+        for topic in topics:
+            state = self._topics[topic]
+            if state.snapshot_frame is None or state.snapshot_frame[0] != self._stream_id:
+                message = {'topic': topic, 'seq': state.seq, 'value': state.value}
+                state.snapshot_frame = (self._stream_id, _frame(self._stream_id, 'snapshot', message))
+            frames.append(state.snapshot_frame[1])
+        return frames
+
+    def _entries_after(self, position: int, topics: List[str]) -> Optional[List[_Entry]]:
+        # Caller holds the lock; None if the ring no longer reaches back to position
+        if position > self._stream_id or (self._ring and self._ring[0].id > position + 1) \
+                or (not self._ring and position != self._stream_id):
+            return None
+        return [entry for entry in self._ring if entry.id > position and entry.topic in topics]
+
+    def open_stream(self, topics: List[str], last_id: Optional[int] = None) -> Tuple[int, List[str]]:
+        """
+        Start an SSE stream of topics
+
+        Resumes after last_id (a Last-Event-ID) while the ring still has
+        everything after it; otherwise starts with a snapshot per topic.
+        Call close_stream(topics) when the consumer goes away.
+
+        Returns:
+            (position, frames): frames to send now and the position to
+            pass to frames_after()
+        """
+        with self._lock:
+            for topic in topics:
+                self._topics[topic].streams += 1
+            entries = self._entries_after(last_id, topics) if last_id is not None else None
+            if entries is None:
+                return self._stream_id, self._snapshot_frames(topics)
+            position = self._stream_id
+        return position, [entry.frame for entry in entries]
+
+    def frames_after(self, position: int, topics: List[str],
+                     timeout: Optional[float] = None) -> Tuple[int, List[str]]:
+        """
+        Frames of topics after position, waiting up to timeout for one
+
+        A stream that fell behind the ring gets fresh snapshots instead
+        (latest value wins).
+
+        Returns:
+            (position, frames); frames is empty on timeout
+        """
+        with self._changed:
+            if position == self._stream_id:
+                self._changed.wait(timeout)
+            entries = self._entries_after(position, topics)
+            if entries is None:
+                return self._stream_id, self._snapshot_frames(topics)
+            position = self._stream_id
+        return position, [entry.frame for entry in entries]
+
+    def close_stream(self, topics: List[str]):
+        """End an SSE stream started with open_stream(topics)"""
+        with self._lock:
+            for topic in topics:
+                self._topics[topic].streams -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Seq, subscribers and deltas sent per topic; connections and lag counters"""
+        with self._lock:
+            return {
+                'topics': {
+                    name: {'seq': state.seq, 'subscribers': len(state.subscribers), 'deltas': state.deltas,
+                           'streams': state.streams}
+                    for name, state in self._topics.items()
+                },
+                'connections': len(self._clients),
+                'lagging': sum(1 for client in self._clients.values() if client.lagging_since is not None),
+                **self._counters
+            }
@@ -4,20 +4,55 @@ FantasmaWiFi-Pro Web UI Server
 Web-based control panel for managing WiFi sharing
 """
 
-from flask import Flask, render_template, jsonify, request, Response
+from flask import Flask, g, render_template, jsonify, request, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO, emit
 import threading
 import time
 import logging
-from typing import Dict, Any
+import json
+import os
+import re
+import subprocess
+import signal
+import sys
+from typing import Callable, Dict, Any, Optional, Tuple
 
 from fantasma_core import (
     FantasmaCore,
     FantasmaConfig,
-    NetworkMode,
-    get_platform_adapter
+    NetworkMode
 )
-from fantasma_api import api_auth, rate_limiter, require_api_key, rate_limit, optional_auth
+from fantasma_analytics import HeavyHitterTracker
+from fantasma_daemon import (
+    DaemonError,
+    connect_core,
+    connect_sessions,
+    default_snapshot_path,
+    default_web_state_path,
+    read_snapshot
+)
+from fantasma_events import EventBus
+from fantasma_topics import TopicPublisher
+from fantasma_state import StateFile
+from fantasma_snapshot import SnapshotReader
+from fantasma_api import (
+    api_auth,
+    auth_error,
+    enable_shared_state,
+    rate_limiter,
+    require_api_key,
+    require_scope,
+    rate_limit,
+    optional_auth,
+    timed_phase
+)
+from fantasma_capture import stream_capture
+from fantasma_jobs import IdempotencyConflict, JobFailed, JobManager
+from fantasma_metrics import OPENMETRICS_CONTENT_TYPE, RequestMetrics, registry as metrics_registry
+import fantasma_batch as batch
+from fantasma_batch import BatchError, Operation
+from fantasma_sessions import DEFAULT_SESSION, SESSION_ID_PATTERN, SessionError
 from fantasma_openapi import OPENAPI_SPEC, get_openapi_html
 
 # Initialize Flask app
@@ -27,23 +62,303 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Global Fantasma instance
 fantasma = None
+sessions = None
+status_snapshot = None
 config_profiles = {}
+# Moves on every profile change (ETag of the profile routes); starts at the
+# process start time in microseconds so it is not reused after a restart
+profiles_version = time.time_ns() // 1000
+state_file = None
+jobs = JobManager()
+jobs.listeners.append(lambda job, event: publish('job_progress', event))
+
+# Sequenced WebSocket events; clients resume from the last seq they saw
+events = EventBus()
+
+# Seconds between metrics samples of a local core (a daemon samples its own)
+METRICS_INTERVAL = 5.0
+
+# Requests taking longer are logged with a phase breakdown (--slow-request-ms)
+SLOW_REQUEST_MS = 500.0
+request_metrics = RequestMetrics(SLOW_REQUEST_MS)
+
+# Seconds between status change checks (a version compare, no probe)
+STREAM_STATUS_INTERVAL = 1.0
+# Seconds between client and metrics samples
+STREAM_SAMPLE_INTERVAL = 5.0
+# Log lines kept in the logs topic
+LOG_TOPIC_ENTRIES = 200
+# Packets queued for a connection at which it counts as lagging, and at
+# which it has caught up again
+STREAM_HIGH_WATER = 64
+STREAM_LOW_WATER = 8
+# Seconds a connection may lag before it is disconnected (--stream-max-lag)
+STREAM_MAX_LAG = 30.0
+
+# Change-driven topic streams (see handle_subscribe); a delta is serialized
+# once and sent to the topic's room. Connections that fall behind leave the
+# rooms and catch up from snapshots (see fantasma_topics).
+STREAM_TOPICS = ('status', 'clients', 'metrics', 'logs')
+# Topics that need an API key with the read scope
+PRIVATE_TOPICS = ('metrics', 'logs')
+# Socket.IO connections that presented such a key when they connected
+stream_readers = set()
+topics = TopicPublisher(
+    lambda event, message, to, skip: socketio.emit(event, message, to=to, skip_sid=skip or None),
+    STREAM_TOPICS,
+    enter_room=lambda sid, room: socketio.server.enter_room(sid, room),
+    leave_room=lambda sid, room: socketio.server.leave_room(sid, room),
+    events=events,
+    high_water=STREAM_HIGH_WATER,
+    low_water=STREAM_LOW_WATER,
+    max_lag=STREAM_MAX_LAG
+)
+events.listeners.append(topics.broadcast)
+stream_wakeup = threading.Event()
+
+# Seconds a shutdown waits for running jobs before saving state and exiting
+SHUTDOWN_DRAIN_TIMEOUT = 30.0
+
+# Conditional GETs: the body last rendered per resource and its ETag
+_representations: Dict[str, Tuple[str, bytes]] = {}
+_representations_lock = threading.Lock()
+
+# Operations accepted by one /api/batch request
+MAX_BATCH_OPERATIONS = 50
+
+# Seconds between SSE keep-alive comments on an idle event stream
+SSE_HEARTBEAT = 15.0
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class TopicLogHandler(logging.Handler):
+    """Append log records to the logs topic"""
+
+    # Socket.IO and the HTTP server log about the messages we send
+    IGNORED = ('socketio', 'engineio', 'werkzeug')
+
+    def emit(self, record: logging.LogRecord):
+        if record.name.split('.')[0] in self.IGNORED:
+            return
+        try:
+            topics.append('logs', {
+                'ts': record.created,
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage()
+            }, LOG_TOPIC_ENTRIES)
+        except Exception:
+            self.handleError(record)
+
+
+logging.getLogger().addHandler(TopicLogHandler(logging.INFO))
+
+# Worker processes of one deployment share API keys and rate limits through
+# this directory (set it when running several workers, e.g. under gunicorn)
+if os.environ.get('FANTASMA_API_STATE'):
+    enable_shared_state(os.environ['FANTASMA_API_STATE'])
+
+
 def initialize_fantasma():
     """Initialize Fantasma core instance"""
-    global fantasma
+    global fantasma, sessions, status_snapshot
     try:
-        adapter = get_platform_adapter()
-        fantasma = FantasmaCore(adapter)
-        logger.info(f"Fantasma initialized with {adapter.__class__.__name__}")
+        fantasma = connect_core()
+        sessions = connect_sessions(fantasma)
+        if isinstance(fantasma, FantasmaCore):
+            logger.info(f"Fantasma initialized with {fantasma.adapter.__class__.__name__}")
+            fantasma.watch_events()
+            fantasma.state_listeners.append(lambda event: publish('state_change', event))
+            sessions.recover()
+        else:
+            logger.info(f"Fantasma connected to daemon at {fantasma.client.socket_path}")
+            status_snapshot = SnapshotReader(default_snapshot_path())
     except Exception as e:
         logger.error(f"Failed to initialize Fantasma: {e}")
         fantasma = None
+        sessions = None
+
+
+def publish(name: str, data: Dict[str, Any]):
+    """Emit a sequenced event to WebSocket clients (replayable on resume)"""
+    events.publish(name, data)
+    # Something happened: check the topics now rather than at the next tick
+    stream_wakeup.set()
+
+
+def load_state(path: Optional[str] = None):
+    """
+    Restore profiles, API keys and the event history saved by a previous
+    server process, and persist keys and profiles from now on
+
+    Event history is only saved on a clean shutdown and is removed from the
+    file once loaded: after a crash subscribers resynchronize instead of
+    resuming from numbers the crashed process may have reused.
+    """
+    global state_file
+    state_file = StateFile(path or default_web_state_path())
+    data = state_file.load()
+    config_profiles.update(data.get('profiles', {}))
+    api_auth.restore(data.get('api_keys', {}))
+    if data.get('events'):
+        events.restore(data['events'])
+        logger.info(f"Resuming events at seq {events.seq} (epoch {events.epoch})")
+    api_auth.listeners.append(save_state)
+    save_state()
+
+
+def save_state(with_events: bool = False):
+    """Persist profiles and API keys (and the event history on shutdown)"""
+    if state_file is None:
+        return
+    data = {'profiles': config_profiles, 'api_keys': api_auth.to_dict()}
+    if with_events:
+        data['events'] = events.to_dict()
+    try:
+        state_file.save(data)
+    except OSError as e:
+        logger.error(f"Error saving web state to {state_file.path}: {e}")
+
+
+def profiles_changed():
+    """Persist profiles and move their ETag version"""
+    global profiles_version
+    profiles_version += 1
+    save_state()
+
+
+def conditional_json(resource: str, version: int, render) -> Response:
+    """
+    JSON response with a strong ETag derived from version
+
+    Answers 304 Not Modified without calling render() when If-None-Match
+    has the current ETag. Otherwise a body is rendered once per ETag and
+    reused, so one ETag always stands for the same bytes.
+
+    Args:
+        resource: Name the body is remembered under
+        version: Changes whenever render() may return something else
+        render: Builds the JSON-ready body
+    """
+    etag = f'{resource}-{version:x}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        with _representations_lock:
+            cached = _representations.get(resource)
+            if cached is None or cached[0] != etag:
+                cached = (etag, jsonify(render()).get_data())
+                _representations[resource] = cached
+        response = Response(cached[1], mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate before using it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def shutdown():
+    """
+    Graceful exit: let running jobs finish, then save state for the next
+    process. Sharing is left running (the daemon, or a local core's
+    journal, hands it to the next process).
+    """
+    if not jobs.drain(SHUTDOWN_DRAIN_TIMEOUT):
+        logger.warning("Exiting with jobs still running")
+    save_state(with_events=True)
+    logger.info(f"Web state saved (events up to seq {events.seq})")
+
+
+def status_payload(status: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a core status dict into the JSON shape served to clients"""
+    config = status.get('config')
+    return {
+        'active': status.get('is_active', False),
+        'mode': config.mode.value if config else 'none',
+        'source_interface': config.source_interface.name if config else '',
+        'target_interface': config.target_interface.name if config else '',
+        'state': status.get('state', 'idle'),
+        'uptime': status.get('uptime', 0),
+        'platform': status.get('platform', 'unknown'),
+        'latency': status.get('latency', {})
+    }
+
+
+def interfaces_payload() -> Dict[str, Any]:
+    """Interfaces as served by /api/interfaces"""
+    return {
+        'interfaces': [
+            {
+                'name': iface.name,
+                'type': iface.type.value,
+                'status': 'up' if iface.is_active else 'down',
+                'mac': iface.mac_address
+            }
+            for iface in fantasma.detect_interfaces()
+        ]
+    }
+
+
+def status_version() -> int:
+    """Version of current_status() (see FantasmaCore.get_version), read without probing"""
+    snapshot = read_snapshot(status_snapshot) if status_snapshot else None
+    if snapshot is None:
+        return fantasma.get_version()
+    return snapshot['version']
+
+
+def current_status() -> Dict[str, Any]:
+    """Status payload, read from the daemon's shared snapshot while it is fresh"""
+    snapshot = read_snapshot(status_snapshot) if status_snapshot else None
+    if snapshot is None:
+        return status_payload(fantasma.get_status())
+    return {
+        'active': snapshot['is_active'],
+        'state': snapshot['state'],
+        'mode': snapshot['mode'] or 'none',
+        'source_interface': snapshot['source_interface'],
+        'target_interface': snapshot['target_interface'],
+        'uptime': 0,
+        'platform': snapshot['platform'],
+        'latency': snapshot['latency']
+    }
+
+
+# Request metrics: latency by route and status, phases, in-flight requests
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider counting encoding time as the request's serialize phase"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        with timed_phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+app.json = TimedJSONProvider(app)
+
+
+@app.before_request
+def begin_request_metrics():
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    g.metrics_route = f"{request.method} {rule}"
+    g.metrics_start = time.perf_counter()
+    request_metrics.begin(g.metrics_route)
+
+
+@app.after_request
+def note_response_status(response: Response) -> Response:
+    g.metrics_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def end_request_metrics(error):
+    # Streamed bodies (SSE, capture) count until their response starts
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        request_metrics.end(g.metrics_route, request.path, g.get('metrics_status', 500),
+                            (time.perf_counter() - start) * 1000, g.get('phases_ms'))
 
 
 # Web Routes
@@ -66,28 +381,44 @@ def openapi_spec():
     return jsonify(OPENAPI_SPEC)
 
 
+@app.route('/metrics', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_metrics():
+    """
+    Metrics in OpenMetrics text format for Prometheus
+
+    Rendered from the metrics registry, which is kept up to date as things
+    happen and by a background sampler; a scrape never probes the system.
+    With a daemon its metrics come first, then this process's (requests).
+    """
+    text = metrics_registry.render()
+    if fantasma and not isinstance(fantasma, FantasmaCore):
+        try:
+            text = fantasma.get_metrics() + text
+        except (OSError, DaemonError) as e:
+            logger.error(f"Error getting daemon metrics: {e}")
+    return Response(text + '# EOF\n', content_type=OPENMETRICS_CONTENT_TYPE)
+
+
+@app.route('/api/metrics/requests', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_request_metrics():
+    """Request latency histograms by route and status, in-flight requests and slow requests"""
+    return jsonify(request_metrics.to_dict())
+
+
 @app.route('/api/interfaces', methods=['GET'])
 @optional_auth
 @rate_limit
 def get_interfaces():
-    """Get available network interfaces"""
+    """Get available network interfaces (conditional on If-None-Match)"""
     if not fantasma:
         return jsonify({'error': 'Fantasma not initialized'}), 500
     
     try:
-        interfaces = fantasma.list_interfaces()
-        return jsonify({
-            'interfaces': [
-                {
-                    'name': iface.name,
-                    'type': iface.type.value,
-                    'status': iface.status,
-                    'ip': iface.ip_address,
-                    'mac': iface.mac_address
-                }
-                for iface in interfaces
-            ]
-        })
+        return conditional_json('interfaces', fantasma.get_interfaces_version(), interfaces_payload)
     except Exception as e:
         logger.error(f"Error getting interfaces: {e}")
         return jsonify({'error': str(e)}), 500
@@ -96,59 +427,153 @@ def get_interfaces():
 @app.route('/api/status', methods=['GET'])
 @optional_auth
 def get_status():
-    """Get current sharing status"""
+    """Get current sharing status (conditional on If-None-Match)"""
     if not fantasma:
         return jsonify({'error': 'Fantasma not initialized'}), 500
     
     try:
-        status = fantasma.get_status()
-        return jsonify({
-            'active': status.get('active', False),
-            'mode': status.get('mode', 'none'),
-            'source_interface': status.get('source_interface', ''),
-            'target_interface': status.get('target_interface', ''),
-            'uptime': status.get('uptime', 0),
-            'platform': status.get('platform', 'unknown')
-        })
+        return conditional_json('status', status_version(), current_status)
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/status/latency', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_latency():
+    """Get per-client handshake RTT histograms and retransmission rates"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    return jsonify({
+        'summary': fantasma.get_latency_summary(),
+        'clients': fantasma.get_latency()
+    })
+
+
+@app.route('/api/state', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_state():
+    """Get session state, transition history and queued operations"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    return jsonify(fantasma.get_state())
+
+
+@app.route('/api/status/cache', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_cache_stats():
+    """Get adapter probe cache hit rates"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    return jsonify({'cache': fantasma.get_cache_stats()})
+
+
+@app.route('/api/status/latency/<client>', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_client_latency(client):
+    """Get latency analysis for a single client"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    latency = fantasma.get_latency(client)
+    if latency is None:
+        return jsonify({'error': 'Client not found'}), 404
+    return jsonify({'client': client, 'latency': latency})
+
+
+def config_from_request(data: Dict[str, Any]) -> Tuple[Optional[FantasmaConfig], Optional[str]]:
+    """Build a FantasmaConfig from a start/reconfigure body (or an error message)"""
+    mode = NetworkMode.HOTSPOT if data.get('mode') == 'hotspot' else NetworkMode.BRIDGE
+    
+    # Resolve interface names
+    interfaces = {iface.name: iface for iface in fantasma.detect_interfaces()}
+    source = interfaces.get(data.get('source'))
+    target = interfaces.get(data.get('target'))
+    if not source or not target:
+        return None, 'Unknown source or target interface'
+    
+    config = FantasmaConfig(
+        source_interface=source,
+        target_interface=target,
+        mode=mode,
+        ssid=data.get('ssid', 'FantasmaWiFi'),
+        password=data.get('password', ''),
+        ip_range=data.get('ip_range', '192.168.137.0/24')
+    )
+    if not config.validate():
+        return None, 'Invalid configuration'
+    return config, None
+
+
+def job_kind(action: str, session_id: str = DEFAULT_SESSION) -> str:
+    """
+    Job kind of a session action: the action for the default session,
+    <action>:<session> for the others
+
+    Every route builds kinds here, so the same operation retried through
+    another route with the same Idempotency-Key attaches to its job, and a
+    key cannot attach a request to another session's job.
+    """
+    return action if session_id == DEFAULT_SESSION else f'{action}:{session_id}'
+
+
+def submit_job(kind: str, target):
+    """
+    Run target(job) as a background job and answer 202 Accepted
+
+    A request repeating the Idempotency-Key header of an earlier one gets
+    the earlier job back instead of starting another.
+    """
+    key = request.headers.get('Idempotency-Key') or None
+    if key is not None and len(key) > 255:
+        return jsonify({'error': 'Idempotency-Key too long (max 255)'}), 400
+    try:
+        job, created = jobs.submit(kind, target, idempotency_key=key)
+    except IdempotencyConflict as e:
+        return jsonify({'error': str(e)}), 409
+    
+    response = jsonify({
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'created': created,
+        'links': {
+            'self': f'/api/jobs/{job.id}',
+            'events': f'/api/jobs/{job.id}/events'
+        }
+    })
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response, 202
+
+
 @app.route('/api/start', methods=['POST'])
 @require_api_key
 @rate_limit
 def start_sharing():
-    """Start WiFi sharing"""
+    """Start WiFi sharing as a background job"""
     if not fantasma:
         return jsonify({'error': 'Fantasma not initialized'}), 500
     
     try:
-        data = request.json
-        
-        # Parse mode
-        mode = NetworkMode.HOTSPOT if data.get('mode') == 'hotspot' else NetworkMode.BRIDGE
-        
-        # Create configuration
-        config = FantasmaConfig(
-            source_interface=data.get('source'),
-            target_interface=data.get('target'),
-            mode=mode,
-            ssid=data.get('ssid', 'FantasmaWiFi'),
-            password=data.get('password', ''),
-            channel=int(data.get('channel', 6)),
-            ip_range=data.get('ip_range', '192.168.137.0/24')
-        )
+        config, error = config_from_request(request.json or {})
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Start sharing
-        success = fantasma.start_sharing(config)
+        def run(job):
+            success = sessions.start(DEFAULT_SESSION, config, progress=job.progress)
+            if success:
+                # Emit status update via WebSocket
+                publish('status_update', {'active': True, 'mode': config.mode.value})
+            return success
         
-        if success:
-            # Emit status update via WebSocket
-            socketio.emit('status_update', {'active': True, 'mode': mode.value})
-            return jsonify({'success': True, 'message': 'Sharing started successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to start sharing'}), 500
+        return submit_job(job_kind('start'), run)
             
     except Exception as e:
         logger.error(f"Error starting sharing: {e}")
@@ -159,30 +584,427 @@ def start_sharing():
 @require_api_key
 @rate_limit
 def stop_sharing():
-    """Stop WiFi sharing"""
+    """Stop WiFi sharing as a background job"""
     if not fantasma:
         return jsonify({'error': 'Fantasma not initialized'}), 500
     
-    try:
-        success = fantasma.stop_sharing()
-        
+    def run(job):
+        success = sessions.stop(DEFAULT_SESSION, progress=job.progress)
         if success:
             # Emit status update via WebSocket
-            socketio.emit('status_update', {'active': False})
-            return jsonify({'success': True, 'message': 'Sharing stopped successfully'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to stop sharing'}), 500
+            publish('status_update', {'active': False})
+        return success
+    
+    return submit_job(job_kind('stop'), run)
+
+
+@app.route('/api/reconfigure', methods=['POST'])
+@require_api_key
+@rate_limit
+def reconfigure_sharing():
+    """Restart sharing with a new configuration as a background job"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        config, error = config_from_request(request.json or {})
+        if error:
+            return jsonify({'error': error}), 400
+        
+        def run(job):
+            success = sessions.reconfigure(DEFAULT_SESSION, config, progress=job.progress)
+            publish('status_update', {'active': success, 'mode': config.mode.value if success else 'none'})
+            return success
+        
+        return submit_job(job_kind('reconfigure'), run)
+            
+    except Exception as e:
+        logger.error(f"Error reconfiguring sharing: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/prepare', methods=['POST'])
+@require_api_key
+@rate_limit
+def prepare_sharing():
+    """Pre-warm sharing (standby) as a background job; /api/start with the same body activates it"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        config, error = config_from_request(request.json or {})
+        if error:
+            return jsonify({'error': error}), 400
+        
+        def run(job):
+            return sessions.prepare(DEFAULT_SESSION, config, progress=job.progress)
+        
+        return submit_job(job_kind('prepare'), run)
+            
+    except Exception as e:
+        logger.error(f"Error preparing standby: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/sessions', methods=['GET'])
+@optional_auth
+@rate_limit
+def list_sessions():
+    """Aggregate status: session counts by state plus every session's status"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        return jsonify(sessions.get_status())
+    except Exception as e:
+        logger.error(f"Error listing sessions: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/sessions/summary', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_sessions_summary():
+    """Session counts by state (constant cost, no probing)"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        return jsonify(sessions.get_summary())
+    except Exception as e:
+        logger.error(f"Error getting session summary: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_session(session_id):
+    """Get one session's status"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        status = sessions.get_session(session_id)
+        if status is None:
+            return jsonify({'error': 'Session not found'}), 404
+        return jsonify(status)
+    except Exception as e:
+        logger.error(f"Error getting session: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+@require_api_key
+@rate_limit
+def delete_session(session_id):
+    """Forget an idle session"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        sessions.remove(session_id)
+        return jsonify({'success': True, 'message': f'Session {session_id} removed'})
+    except SessionError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error removing session: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/sessions/<session_id>/<action>', methods=['POST'])
+@require_api_key
+@rate_limit
+def session_action(session_id, action):
+    """Start, stop, reconfigure or prepare one session as a background job"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    if action not in ('start', 'stop', 'reconfigure', 'prepare'):
+        return jsonify({'error': 'Unknown action'}), 404
+    if session_id != DEFAULT_SESSION and not SESSION_ID_PATTERN.match(session_id):
+        return jsonify({'error': "Session ids are 1-12 characters: lowercase letters, digits, '-' and '_'"}), 400
+    
+    try:
+        config = None
+        if action != 'stop':
+            config, error = config_from_request(request.json or {})
+            if error:
+                return jsonify({'error': error}), 400
+        
+        def run(job):
+            if action == 'stop':
+                return sessions.stop(session_id, progress=job.progress)
+            if action == 'start':
+                return sessions.start(session_id, config, progress=job.progress)
+            if action == 'prepare':
+                return sessions.prepare(session_id, config, progress=job.progress)
+            return sessions.reconfigure(session_id, config, progress=job.progress)
+        
+        return submit_job(job_kind(action, session_id), run)
             
     except Exception as e:
-        logger.error(f"Error stopping sharing: {e}")
+        logger.error(f"Error in session {action}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs', methods=['GET'])
+@optional_auth
+@rate_limit
+def list_jobs():
+    """List recent start/stop/reconfigure jobs, newest first"""
+    limit = max(1, min(request.args.get('limit', default=50, type=int), 200))
+    return jsonify({'jobs': [job.to_dict(events=False) for job in jobs.list()[:limit]]})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_job(job_id):
+    """Get a job's status, result and progress events"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@optional_auth
+@rate_limit
+def stream_job_events(job_id):
+    """
+    Stream a job's progress events as Server-Sent Events
+
+    Events already recorded are replayed first (after Last-Event-ID when
+    reconnecting); the stream ends once the job has finished.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    seq = request.headers.get('Last-Event-ID', default=0, type=int)
+    
+    def generate(seq):
+        while True:
+            events = job.events_after(seq, timeout=SSE_HEARTBEAT)
+            for event in events:
+                seq = event['seq']
+                yield f"id: {seq}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            if job.done and seq >= len(job.events):
+                yield f"event: done\ndata: {json.dumps(job.to_dict(events=False))}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+    
+    return Response(
+        generate(seq),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/stream', methods=['GET'])
+@optional_auth
+@rate_limit
+def stream_topics():
+    """
+    Stream topics as Server-Sent Events
+
+    ?topics=status,metrics (default: status). Starts with a 'snapshot'
+    event per topic, then 'delta' events (the WebSocket messages, see
+    handle_subscribe). Reconnecting with Last-Event-ID (or ?last_event_id=)
+    resumes after that event while it is still buffered, else starts over
+    from snapshots.
+    """
+    names = [name for name in request.args.get('topics', 'status').split(',') if name]
+    unknown = [name for name in names if name not in STREAM_TOPICS]
+    if unknown or not names:
+        return jsonify({'error': f"Unknown topics: {', '.join(unknown)}", 'topics': list(STREAM_TOPICS)}), 400
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', type=int)
+    
+    for name in names:
+        try:
+            refresh_topic(name)
+        except Exception as e:
+            logger.error(f"Error refreshing topic {name}: {e}")
+    if any(name in PRIVATE_TOPICS for name in names) and not request.headers.get('X-API-Key'):
+        # optional_auth has checked any key that was sent; these topics need one
+        return auth_error('read')
+    
+    position, frames = topics.open_stream(names, last_id)
+    stream_wakeup.set()
+    
+    def generate(position, frames):
+        try:
+            while True:
+                for frame in frames:
+                    yield frame
+                if not frames:
+                    yield ": keep-alive\n\n"
+                position, frames = topics.frames_after(position, names, timeout=SSE_HEARTBEAT)
+        finally:
+            topics.close_stream(names)
+    
+    return Response(
+        generate(position, frames),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/traffic', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_traffic():
+    """Get per-client traffic accounting"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    try:
+        window = request.args.get('window', type=float)
+        return jsonify({
+            'clients': fantasma.get_traffic(window=window),
+            'summary': fantasma.get_traffic_summary()
+        })
+    except Exception as e:
+        logger.error(f"Error getting traffic: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/traffic/<client>', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_client_traffic(client):
+    """Get traffic accounting for a single client"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    window = request.args.get('window', type=float)
+    traffic = fantasma.get_traffic(client=client, window=window)
+    if traffic is None:
+        return jsonify({'error': 'Client not found'}), 404
+    return jsonify({'client': traffic})
+
+
+@app.route('/api/top', methods=['GET'])
+@optional_auth
+@rate_limit
+def get_top():
+    """Get heavy-hitter talkers, destinations and ports"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    window = request.args.get('window', type=float)
+    k = request.args.get('k', default=10, type=int)
+    dimensions = request.args.getlist('dimension') or list(HeavyHitterTracker.DIMENSIONS)
+    
+    try:
+        return jsonify({
+            'top': {dim: fantasma.get_top(dim, k=k, window=window) for dim in dimensions},
+            'summary': fantasma.get_top_summary()
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/capture', methods=['GET'])
+@require_api_key
+@rate_limit
+def capture():
+    """Stream a live pcap/pcapng capture from a session interface"""
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    interface = request.args.get('interface')
+    if not interface:
+        config = fantasma.get_status().get('config')
+        if config:
+            interface = config.target_interface.name
+    if not interface or not re.match(r'^[\w.:@-]{1,15}$', interface):
+        return jsonify({'error': 'Missing or invalid interface'}), 400
+    
+    fmt = request.args.get('format', 'pcapng')
+    if fmt not in ('pcap', 'pcapng'):
+        return jsonify({'error': 'format must be pcap or pcapng'}), 400
+    
+    duration = min(request.args.get('duration', default=30.0, type=float), 3600.0)
+    snaplen = max(64, min(request.args.get('snaplen', default=262144, type=int), 262144))
+    max_bytes = request.args.get('max_bytes', type=int)
+    
+    try:
+        stream = stream_capture(
+            interface,
+            bpf_filter=request.args.get('filter') or None,
+            snaplen=snaplen,
+            duration=duration,
+            max_bytes=max_bytes,
+            fmt=fmt
+        )
+    except subprocess.CalledProcessError as e:
+        return jsonify({'error': f"Invalid filter: {(e.stderr or '').strip() or e}"}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error starting capture: {e}")
         return jsonify({'error': str(e)}), 500
+    
+    mimetype = 'application/x-pcapng' if fmt == 'pcapng' else 'application/vnd.tcpdump.pcap'
+    return Response(
+        stream,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=fantasma-{interface}.{fmt}'}
+    )
+
+
+@app.route('/api/keys', methods=['GET'])
+@require_scope('admin')
+def list_keys():
+    """API keys: ids, scopes, expiry and usage (never the keys themselves)"""
+    return jsonify({'keys': api_auth.list_keys(), 'stats': api_auth.get_stats()})
+
+
+@app.route('/api/keys', methods=['POST'])
+@require_scope('admin')
+@rate_limit
+def create_key():
+    """
+    Issue an API key; the response is the only place the key appears
+
+    Body: {"name": ..., "scopes": ["read", "control"], "tier": "default",
+    "expires_in": <seconds>} (all but name optional)
+    """
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Missing key name'}), 400
+    expires_in = data.get('expires_in')
+    if expires_in is not None and (not isinstance(expires_in, (int, float)) or expires_in <= 0):
+        return jsonify({'error': 'expires_in must be a positive number of seconds'}), 400
+    try:
+        key = api_auth.create_key(name, tier=data.get('tier', 'default'),
+                                  scopes=data.get('scopes', ['read', 'control']), expires_in=expires_in)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    info = api_auth.get_key_info(key)
+    return jsonify({'key': key, 'key_id': info['key_id'], 'scopes': info['scopes'],
+                    'expires': info['expires']}), 201
+
+
+@app.route('/api/keys/<key_id>', methods=['DELETE'])
+@require_scope('admin')
+def revoke_key(key_id):
+    """Revoke an API key by its id (takes effect immediately)"""
+    if not api_auth.revoke_key(key_id):
+        return jsonify({'error': 'Key not found'}), 404
+    return jsonify({'success': True, 'message': f'Key {key_id} revoked'})
 
 
 @app.route('/api/profiles', methods=['GET'])
 @optional_auth
 def get_profiles():
-    """Get saved configuration profiles"""
-    return jsonify({'profiles': list(config_profiles.keys())})
+    """Get saved configuration profiles (conditional on If-None-Match)"""
+    return conditional_json('profiles', profiles_version,
+                            lambda: {'profiles': list(config_profiles.keys())})
 
 
 @app.route('/api/profiles', methods=['POST'])
@@ -199,6 +1021,7 @@ def save_profile():
             return jsonify({'error': 'Missing profile name or config'}), 400
         
         config_profiles[profile_name] = config_data
+        profiles_changed()
         return jsonify({'success': True, 'message': f'Profile "{profile_name}" saved'})
         
     except Exception as e:
@@ -209,9 +1032,10 @@ def save_profile():
 @app.route('/api/profiles/<name>', methods=['GET'])
 @optional_auth
 def get_profile(name):
-    """Get a specific configuration profile"""
+    """Get a specific configuration profile (conditional on If-None-Match)"""
     if name in config_profiles:
-        return jsonify({'profile': config_profiles[name]})
+        return conditional_json(f'profile:{name}', profiles_version,
+                                lambda: {'profile': config_profiles[name]})
     else:
         return jsonify({'error': 'Profile not found'}), 404
 
@@ -222,47 +1046,347 @@ def delete_profile(name):
     """Delete a configuration profile"""
     if name in config_profiles:
         del config_profiles[name]
+        _representations.pop(f'profile:{name}', None)
+        profiles_changed()
         return jsonify({'success': True, 'message': f'Profile "{name}" deleted'})
     else:
         return jsonify({'error': 'Profile not found'}), 404
 
 
+@app.route('/api/profiles/<name>/<action>', methods=['POST'])
+@require_api_key
+@rate_limit
+def profile_action(name, action):
+    """
+    Prepare (standby) or start a saved profile as a background job
+
+    Starting a profile whose standby is prepared only activates it.
+    Optional body: {"session": "<id>"} (default session otherwise).
+    """
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    if action not in ('prepare', 'start'):
+        return jsonify({'error': 'Unknown action'}), 404
+    if name not in config_profiles:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    session_id = (request.get_json(silent=True) or {}).get('session', DEFAULT_SESSION)
+    if session_id != DEFAULT_SESSION and not SESSION_ID_PATTERN.match(str(session_id)):
+        return jsonify({'error': "Session ids are 1-12 characters: lowercase letters, digits, '-' and '_'"}), 400
+    
+    try:
+        config, error = config_from_request(config_profiles[name])
+        if error:
+            return jsonify({'error': f'Profile "{name}": {error}'}), 400
+        
+        def run(job):
+            if action == 'prepare':
+                return sessions.prepare(session_id, config, progress=job.progress)
+            success = sessions.start(session_id, config, progress=job.progress)
+            if success and session_id == DEFAULT_SESSION:
+                publish('status_update', {'active': True, 'mode': config.mode.value})
+            return success
+        
+        return submit_job(job_kind(action, session_id), run)
+            
+    except Exception as e:
+        logger.error(f"Error in profile {action}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+# Batch operations: each takes the step's args (references resolved)
+def batch_session(args: Dict[str, Any]) -> str:
+    session_id = args.get('session', DEFAULT_SESSION)
+    if session_id != DEFAULT_SESSION and not SESSION_ID_PATTERN.match(str(session_id)):
+        raise BatchError("Session ids are 1-12 characters: lowercase letters, digits, '-' and '_'")
+    return session_id
+
+
+def batch_config(args: Dict[str, Any]) -> FantasmaConfig:
+    """Configuration from a saved profile ({"profile": name}) or start fields"""
+    data = args
+    if 'profile' in args:
+        if args['profile'] not in config_profiles:
+            raise BatchError(f'Profile "{args["profile"]}" not found')
+        data = config_profiles[args['profile']]
+    config, error = config_from_request(data)
+    if error:
+        raise BatchError(error)
+    return config
+
+
+def batch_get_profile(args: Dict[str, Any]) -> Dict[str, Any]:
+    if args.get('name') not in config_profiles:
+        raise BatchError(f'Profile "{args.get("name")}" not found')
+    return {'profile': config_profiles[args['name']]}
+
+
+def batch_save_profile(args: Dict[str, Any]) -> Dict[str, Any]:
+    if not args.get('name') or not args.get('config'):
+        raise BatchError('Missing profile name or config')
+    config_profiles[args['name']] = args['config']
+    profiles_changed()
+    return {'name': args['name']}
+
+
+def batch_delete_profile(args: Dict[str, Any]) -> Dict[str, Any]:
+    if args.get('name') not in config_profiles:
+        raise BatchError(f'Profile "{args.get("name")}" not found')
+    del config_profiles[args['name']]
+    _representations.pop(f"profile:{args['name']}", None)
+    profiles_changed()
+    return {'name': args['name']}
+
+
+def batch_sharing(action: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Operation running a session action (start, prepare, stop, reconfigure) to completion"""
+    def handler(args: Dict[str, Any]) -> Dict[str, Any]:
+        session_id = batch_session(args)
+        if action == 'stop':
+            config = None
+            success = sessions.stop(session_id)
+        else:
+            config = batch_config(args)
+            success = getattr(sessions, action)(session_id, config)
+        if not success:
+            raise BatchError(f'{action} failed')
+        if session_id == DEFAULT_SESSION and action == 'stop':
+            publish('status_update', {'active': False})
+        elif session_id == DEFAULT_SESSION and action != 'prepare':
+            publish('status_update', {'active': True, 'mode': config.mode.value})
+        # get_session works on local and daemon session managers alike
+        session = sessions.get_session(session_id)
+        return {'session': session_id, 'state': session['state'] if session else 'idle'}
+    return handler
+
+
+BATCH_OPERATIONS = {
+    'status': Operation(lambda args: current_status()),
+    'interfaces': Operation(lambda args: interfaces_payload()),
+    'list_profiles': Operation(lambda args: {'profiles': list(config_profiles.keys())}),
+    'get_profile': Operation(batch_get_profile),
+    'save_profile': Operation(batch_save_profile, 'control'),
+    'delete_profile': Operation(batch_delete_profile, 'control'),
+    'prepare': Operation(batch_sharing('prepare'), 'control', mutating=True),
+    'start': Operation(batch_sharing('start'), 'control', mutating=True),
+    'reconfigure': Operation(batch_sharing('reconfigure'), 'control', mutating=True),
+    'stop': Operation(batch_sharing('stop'), 'control', mutating=True),
+}
+
+
+@app.route('/api/batch', methods=['POST'])
+@rate_limit
+def run_batch():
+    """
+    Run several operations in one request (see fantasma_batch)
+
+    Body: {"operations": [{"id": ..., "op": ..., "args": {...}}, ...],
+    "stop_on_error": true}. One auth check covers the broadest scope the
+    operations need. A batch that only reads answers 200 with the results;
+    one that changes sharing runs as a single background job (202, results
+    in the job's result) whose steps go through the session queue in order.
+    """
+    if not fantasma:
+        return jsonify({'error': 'Fantasma not initialized'}), 500
+    
+    body = request.get_json(silent=True)
+    try:
+        steps = batch.parse(body, BATCH_OPERATIONS, MAX_BATCH_OPERATIONS)
+    except BatchError as e:
+        return jsonify({'error': str(e), 'operations': sorted(BATCH_OPERATIONS)}), 400
+    scope = batch.required_scope(steps, BATCH_OPERATIONS)
+    error = auth_error(scope, required=scope != 'read')
+    if error:
+        return error
+    stop_on_error = bool(body.get('stop_on_error', True))
+    
+    if not batch.is_mutating(steps, BATCH_OPERATIONS):
+        return jsonify(batch.run(steps, BATCH_OPERATIONS, stop_on_error))
+    
+    def run(job):
+        outcome = batch.run(steps, BATCH_OPERATIONS, stop_on_error, progress=job.progress)
+        if not outcome['success']:
+            failed = next(entry for entry in outcome['results'] if entry['status'] == 'error')
+            raise JobFailed(f"{failed['id']} ({failed['op']}): {failed['error']}", outcome)
+        return outcome
+    
+    return submit_job('batch', run)
+
+
 # WebSocket Events
 @socketio.on('connect')
-def handle_connect():
-    """Handle client connection"""
+def handle_connect(auth=None):
+    """Handle client connection (auth: {"api_key": ...}, or an X-API-Key header)"""
+    api_key = auth.get('api_key') if isinstance(auth, dict) else None
+    api_key = api_key or request.headers.get('X-API-Key')
+    if api_key and api_auth.check_key(api_key, 'read') is None:
+        stream_readers.add(request.sid)
+    topics.attach(request.sid)
     logger.info('Client connected')
-    emit('connected', {'message': 'Connected to Fantasma server'})
+    emit('connected', dict(events.position(), message='Connected to Fantasma server'))
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
+    topics.drop(request.sid)
+    stream_readers.discard(request.sid)
     logger.info('Client disconnected')
 
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """
+    Subscribe to topics
+
+    data: {"topics": ["status", "clients", "metrics", "logs"]}. Each topic
+    answers with 'snapshot' {topic, seq, value}, then sends 'delta' {topic,
+    seq, ops} (JSON Patch operations) whenever it changes. A client that
+    sees a gap in seq subscribes again for a fresh snapshot. metrics and
+    logs need a connection made with a read-scope API key.
+    """
+    names = data.get('topics', []) if isinstance(data, dict) else []
+    unknown = [name for name in names if name not in STREAM_TOPICS]
+    if unknown:
+        emit('subscribe_error', {'unknown': unknown, 'topics': list(STREAM_TOPICS)})
+    denied = [name for name in names if name in PRIVATE_TOPICS and request.sid not in stream_readers]
+    if denied:
+        emit('subscribe_error', {'unauthorized': denied,
+                                 'message': 'Connect with an API key with the read scope'})
+    for name in names:
+        if name in unknown or name in denied:
+            continue
+        try:
+            refresh_topic(name)
+        except Exception as e:
+            logger.error(f"Error refreshing topic {name}: {e}")
+        topics.subscribe(request.sid, name)
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """Stop the deltas of topics: data {"topics": [...]}"""
+    names = data.get('topics', []) if isinstance(data, dict) else []
+    for name in names:
+        if name in STREAM_TOPICS:
+            topics.unsubscribe(request.sid, name)
+
+
+@socketio.on('resume')
+def handle_resume(data):
+    """
+    Replay the events a reconnecting client missed
+
+    data: {"epoch": ..., "seq": <last event_seq seen>}. Answers with the
+    missed events then 'resumed', or 'resync' when they are no longer
+    available (the client should reload full state).
+    """
+    data = data if isinstance(data, dict) else {}
+    try:
+        seq = int(data.get('seq', 0))
+    except (TypeError, ValueError):
+        seq = -1
+    missed = events.since(seq, data.get('epoch')) if seq >= 0 else None
+    if missed is None:
+        emit('resync', events.position())
+        return
+    for event in missed:
+        emit(event['event'], dict(event['data'], event_seq=event['seq']))
+    emit('resumed', dict(events.position(), replayed=len(missed)))
+
+
 @socketio.on('request_status')
 def handle_status_request():
     """Handle status request from client"""
     if fantasma:
         try:
-            status = fantasma.get_status()
-            emit('status_update', status)
+            emit('status_update', current_status())
         except Exception as e:
             logger.error(f"Error sending status: {e}")
 
 
-# Background task for periodic status updates
-def status_broadcast_task():
-    """Periodically broadcast status to all connected clients"""
+def socket_backlog(sid: str) -> Optional[int]:
+    """Packets queued for a Socket.IO connection, or None once it is gone"""
+    eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+    socket = socketio.server.eio.sockets.get(eio_sid) if eio_sid else None
+    if socket is None or socket.closed:
+        return None
+    return socket.queue.qsize()
+
+
+def topic_value(name: str) -> Any:
+    """Current value of a sampled topic"""
+    if name == 'status':
+        return current_status()
+    if name == 'clients':
+        return {client['client']: client for client in fantasma.get_traffic()}
+    if name == 'metrics':
+        return {
+            'latency': fantasma.get_latency_summary(),
+            'traffic': fantasma.get_traffic_summary(),
+            'cache': fantasma.get_cache_stats(),
+            'rate_limit': rate_limiter.get_stats(),
+            'streams': topics.get_stats(),
+            'requests': request_metrics.get_summary()
+        }
+    raise KeyError(name)
+
+
+def refresh_topic(name: str):
+    """Publish a sampled topic's current value (logs are pushed as they happen)"""
+    if fantasma and name != 'logs':
+        topics.update(name, topic_value(name))
+
+
+# Background task sampling a local core's metrics
+def metrics_task():
+    """Copy host and session counters into the metrics registry every METRICS_INTERVAL"""
     while True:
-        time.sleep(5)  # Update every 5 seconds
-        if fantasma:
+        time.sleep(METRICS_INTERVAL)
+        if isinstance(fantasma, FantasmaCore) and sessions is not None:
             try:
-                status = fantasma.get_status()
-                socketio.emit('status_update', status)
+                sessions.collect_metrics()
             except Exception as e:
-                logger.error(f"Error broadcasting status: {e}")
+                logger.error(f"Error collecting metrics: {e}")
+
+
+# Background task publishing topic changes
+def stream_task():
+    """
+    Publish changes to topic subscribers
+
+    Status is republished only when its version moved (no probe to find
+    out); clients and metrics are sampled every STREAM_SAMPLE_INTERVAL.
+    Topics nobody subscribed to are not sampled. Each round also checks
+    for lagging connections and disconnects those behind for too long.
+    """
+    status_version_seen = None
+    last_sample = 0.0
+    while True:
+        stream_wakeup.wait(STREAM_STATUS_INTERVAL)
+        stream_wakeup.clear()
+        try:
+            for sid in topics.check_lag(socket_backlog):
+                logger.warning(f"Disconnecting WebSocket client {sid}: behind for over {topics.max_lag:.0f}s")
+                socketio.server.disconnect(sid)
+        except Exception as e:
+            logger.error(f"Error checking WebSocket backlogs: {e}")
+        if not fantasma:
+            continue
+        try:
+            if topics.subscribers('status'):
+                version = status_version()
+                if version != status_version_seen:
+                    topics.update('status', current_status())
+                    status_version_seen = version
+            now = time.monotonic()
+            if now - last_sample >= STREAM_SAMPLE_INTERVAL:
+                last_sample = now
+                for name in ('clients', 'metrics'):
+                    if topics.subscribers(name):
+                        topics.update(name, topic_value(name))
+        except Exception as e:
+            logger.error(f"Error publishing topics: {e}")
 
 
 def main():
@@ -273,15 +1397,26 @@ def main():
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8080, help='Port to bind to')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--state', default=None,
+                        help='State file for profiles, API keys and events across restarts')
+    parser.add_argument('--stream-max-lag', type=float, default=STREAM_MAX_LAG,
+                        help='Seconds a slow WebSocket client may stay behind before it is disconnected')
+    parser.add_argument('--slow-request-ms', type=float, default=SLOW_REQUEST_MS,
+                        help='Log API requests taking longer than this (0 disables)')
     
     args = parser.parse_args()
     
-    # Initialize Fantasma
+    # Restore state from a previous process, then initialize Fantasma
+    # (a local core adopts a session the previous process left running)
+    load_state(args.state)
+    topics.max_lag = args.stream_max_lag
+    request_metrics.slow_ms = args.slow_request_ms
     initialize_fantasma()
     
-    # Start background status broadcast thread
-    status_thread = threading.Thread(target=status_broadcast_task, daemon=True)
-    status_thread.start()
+    # Start the topic publisher and the metrics sampler
+    stream_thread = threading.Thread(target=stream_task, daemon=True)
+    stream_thread.start()
+    threading.Thread(target=metrics_task, daemon=True).start()
     
     # Print startup info
     print("=" * 60)
@@ -293,14 +1428,23 @@ def main():
     print(f"  → http://127.0.0.1:{args.port}")
     print("\nAPI Documentation:")
     print(f"  → http://localhost:{args.port}/api/docs")
-    print("\n⚠️  IMPORTANT - Save your API key securely!")
-    print(f"  API Key: {api_auth.default_key}")
-    print("  (Store this in a secure location, not in code or logs)")
+    if api_auth.default_key:
+        print("\n⚠️  IMPORTANT - Save your API key securely!")
+        print(f"  API Key: {api_auth.default_key}")
+        print("  (Only its hash is stored: it cannot be shown again)")
+    else:
+        print(f"\nUsing the saved API keys (default key id {api_auth.default_key_id})")
     print("\nPress Ctrl+C to stop the server")
     print("=" * 60)
     
-    # Run server
-    socketio.run(app, host=args.host, port=args.port, debug=args.debug)
+    # Run server; SIGTERM (e.g. a service restart) exits through shutdown()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        socketio.run(app, host=args.host, port=args.port, debug=args.debug)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
 
 
 if __name__ == '__main__':
@@ -55,6 +55,7 @@ setup(
             "fantasma=fantasma_cli:main",
             "fantasma-web=fantasma_web:main",
             "fantasma-doctor=fantasma_doctor:main",
+            "fantasma-daemon=fantasma_daemon:main",
         ],
     },
 )
@@ -1,12 +1,21 @@
 // FantasmaWiFi-Pro Web UI JavaScript
 
-// Initialize Socket.IO connection
-const socket = io();
+// Initialize Socket.IO connection; the request metrics panel needs a key
+// with the read scope, saved as localStorage.fantasmaApiKey
+const socket = io({ auth: { api_key: localStorage.getItem('fantasmaApiKey') } });
 
 // Global state
 let interfaces = [];
 let currentStatus = null;
 
+// Position in the server's event stream, to resume after a reconnect
+let eventEpoch = null;
+let lastEventSeq = null;
+let disconnectTimer = null;
+
+// Subscribed topics: latest value and seq, kept current by deltas
+const topicState = {};
+
 // DOM Elements
 const statusBadge = document.getElementById('statusBadge');
 const statusDot = document.getElementById('statusDot');
@@ -31,6 +40,8 @@ const interfacesList = document.getElementById('interfacesList');
 const profilesList = document.getElementById('profilesList');
 const saveProfileBtn = document.getElementById('saveProfileBtn');
 const loadProfileBtn = document.getElementById('loadProfileBtn');
+const requestsSummary = document.getElementById('requestsSummary');
+const requestsList = document.getElementById('requestsList');
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -44,19 +55,130 @@ document.addEventListener('DOMContentLoaded', () => {
 // Socket.IO Event Handlers
 socket.on('connect', () => {
     console.log('Connected to server');
+    clearTimeout(disconnectTimer);
+    subscribeTopics(['status', 'metrics']);
+});
+
+socket.on('connected', (position) => {
+    if (eventEpoch !== null && lastEventSeq !== null) {
+        // Reconnected (e.g. the server restarted): ask for what we missed
+        socket.emit('resume', { epoch: eventEpoch, seq: lastEventSeq });
+        return;
+    }
+    eventEpoch = position.epoch;
+    lastEventSeq = position.seq;
     showAlert('Connected to Fantasma server', 'success');
 });
 
+socket.on('resumed', (position) => {
+    console.log(`Resumed event stream, ${position.replayed} missed events replayed`);
+});
+
+socket.on('resync', (position) => {
+    // Missed events are gone: reload full state instead
+    eventEpoch = position.epoch;
+    lastEventSeq = position.seq;
+    loadStatus();
+    loadProfiles();
+});
+
 socket.on('disconnect', () => {
     console.log('Disconnected from server');
-    showAlert('Disconnected from server', 'error');
+    // A server restart reconnects within seconds; only report longer outages
+    disconnectTimer = setTimeout(() => showAlert('Disconnected from server', 'error'), 5000);
+});
+
+function trackEvent(payload) {
+    if (payload && payload.event_seq !== undefined) {
+        lastEventSeq = payload.event_seq;
+    }
+}
+
+function subscribeTopics(names) {
+    socket.emit('subscribe', { topics: names });
+}
+
+socket.on('subscribe_error', (error) => {
+    console.warn('Topic subscription refused:', error);
+});
+
+socket.on('snapshot', (message) => {
+    topicState[message.topic] = { seq: message.seq, value: message.value, resyncing: false };
+    onTopicChange(message.topic);
+});
+
+socket.on('delta', (message) => {
+    const state = topicState[message.topic];
+    if (!state || state.resyncing || message.seq <= state.seq) {
+        return;  // sent before our snapshot, or already covered by it
+    }
+    if (message.seq !== state.seq + 1) {
+        // Missed a delta: start over from a snapshot
+        state.resyncing = true;
+        subscribeTopics([message.topic]);
+        return;
+    }
+    state.value = applyPatch(state.value, message.ops);
+    state.seq = message.seq;
+    onTopicChange(message.topic);
 });
 
+function onTopicChange(topic) {
+    const value = topicState[topic].value;
+    if (topic === 'status' && value) {
+        updateStatus(value);
+    } else if (topic === 'metrics' && value && value.requests) {
+        updateRequestMetrics(value.requests);
+    }
+}
+
+// Apply JSON Patch add/remove/replace operations (as sent in deltas)
+function applyPatch(value, ops) {
+    for (const op of ops) {
+        if (op.path === '') {
+            value = op.value;
+            continue;
+        }
+        const tokens = op.path.split('/').slice(1).map((t) => t.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = tokens.pop();
+        let target = value;
+        for (const token of tokens) {
+            target = target[token];
+        }
+        if (Array.isArray(target)) {
+            if (op.op === 'remove') {
+                target.splice(Number(last), 1);
+            } else if (last === '-') {
+                target.push(op.value);
+            } else if (op.op === 'add') {
+                target.splice(Number(last), 0, op.value);
+            } else {
+                target[Number(last)] = op.value;
+            }
+        } else if (op.op === 'remove') {
+            delete target[last];
+        } else {
+            target[last] = op.value;
+        }
+    }
+    return value;
+}
+
 socket.on('status_update', (status) => {
+    trackEvent(status);
     console.log('Status update:', status);
     updateStatus(status);
 });
 
+socket.on('state_change', (event) => {
+    trackEvent(event);
+});
+
+socket.on('job_progress', (event) => {
+    trackEvent(event);
+    console.log('Job progress:', event);
+});
+
 // Event Listeners
 function setupEventListeners() {
     // Mode selection change
@@ -158,17 +280,24 @@ async function startSharing() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': newIdempotencyKey()
             },
             body: JSON.stringify(data)
         });
 
         const result = await response.json();
 
-        if (result.success) {
+        if (response.status !== 202) {
+            showAlert(result.error || 'Failed to start sharing', 'error');
+            return;
+        }
+
+        const job = await waitForJob(result.job_id, startBtn);
+        if (job.status === 'succeeded') {
             showAlert('Sharing started successfully!', 'success');
-            setTimeout(() => loadStatus(), 1000);
+            loadStatus();
         } else {
-            showAlert(result.message || 'Failed to start sharing', 'error');
+            showAlert(job.error || 'Failed to start sharing', 'error');
         }
     } catch (error) {
         console.error('Error starting sharing:', error);
@@ -188,16 +317,23 @@ async function stopSharing() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': newIdempotencyKey()
             }
         });
 
         const result = await response.json();
 
-        if (result.success) {
+        if (response.status !== 202) {
+            showAlert(result.error || 'Failed to stop sharing', 'error');
+            return;
+        }
+
+        const job = await waitForJob(result.job_id, stopBtn);
+        if (job.status === 'succeeded') {
             showAlert('Sharing stopped successfully', 'success');
-            setTimeout(() => loadStatus(), 1000);
+            loadStatus();
         } else {
-            showAlert(result.message || 'Failed to stop sharing', 'error');
+            showAlert(job.error || 'Failed to stop sharing', 'error');
         }
     } catch (error) {
         console.error('Error stopping sharing:', error);
@@ -208,6 +344,33 @@ async function stopSharing() {
     }
 }
 
+// Background jobs
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+async function waitForJob(jobId, button) {
+    // Poll until the job finishes, showing its latest step on the button
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            return {status: 'failed', error: job.error};
+        }
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job;
+        }
+        const last = job.events[job.events.length - 1];
+        if (last && last.message) {
+            button.textContent = last.message + '...';
+        }
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+}
+
 async function loadProfiles() {
     try {
         const response = await fetch('/api/profiles');
@@ -379,6 +542,31 @@ function updateInterfacesList() {
     `).join('');
 }
 
+function updateRequestMetrics(requests) {
+    requestsSummary.textContent =
+        `${requests.in_flight} in flight • ${requests.slow_requests} slow`;
+    const routes = Object.entries(requests.routes)
+        .filter(([route]) => route.includes(' /api/'))
+        .sort((a, b) => b[1].p99_ms - a[1].p99_ms);
+    if (routes.length === 0) {
+        requestsList.innerHTML = '<p class="empty-state">No API requests yet</p>';
+        return;
+    }
+    requestsList.innerHTML = routes.map(([route, stats]) => `
+        <div class="request-item">
+            <div>
+                <div class="request-route">${route}</div>
+                <div class="interface-details">
+                    ${stats.requests} requests • ${stats.errors} errors • ${stats.in_flight} in flight
+                </div>
+            </div>
+            <span class="request-latency" title="p50 / p99 / max">
+                ${stats.p50_ms} / ${stats.p99_ms} / ${stats.max_ms.toFixed(1)} ms
+            </span>
+        </div>
+    `).join('');
+}
+
 function populateInterfaceSelects() {
     // Clear existing options (except first)
     sourceSelect.innerHTML = '<option value="">-- Select Source --</option>';
@@ -0,0 +1,103 @@
+"""conntrack line parsing and FlowTable counter deltas"""
+from fantasma_accounting import FlowEvent, FlowTable, TrafficAccountant, parse_conntrack_line
+
+
+LISTED = (
+    "ipv4     2 tcp      6 431999 ESTABLISHED src=192.168.137.10 dst=93.184.216.34 "
+    "sport=51234 dport=443 packets=10 bytes=1500 src=93.184.216.34 dst=192.168.137.10 "
+    "sport=443 dport=51234 packets=8 bytes=9000 [ASSURED] mark=0 use=1 id=3456789012"
+)
+DESTROYED = (
+    "[DESTROY] ipv4     2 udp      17 src=192.168.137.11 dst=1.1.1.1 sport=40000 dport=53 "
+    "packets=1 bytes=70 src=1.1.1.1 dst=192.168.137.11 sport=53 dport=40000 packets=1 bytes=120 id=77"
+)
+
+
+def flow(orig_bytes, reply_bytes=0, event='update', flow_id=1):
+    return FlowEvent(event=event, protocol='tcp', src='192.168.137.10', dst='93.184.216.34',
+                     sport=51234, dport=443, orig_bytes=orig_bytes, reply_bytes=reply_bytes,
+                     orig_packets=orig_bytes // 100, reply_packets=reply_bytes // 100,
+                     flow_id=flow_id, timestamp=1000.0)
+
+
+def test_parse_extended_line_with_id():
+    """Original and reply counters, ports and the flow id of a table dump line"""
+    event = parse_conntrack_line(LISTED, timestamp=5.0)
+    assert event.event == 'update'
+    assert event.protocol == 'tcp'
+    assert (event.src, event.dst, event.sport, event.dport) == ('192.168.137.10', '93.184.216.34', 51234, 443)
+    assert (event.orig_packets, event.orig_bytes) == (10, 1500)
+    assert (event.reply_packets, event.reply_bytes) == (8, 9000)
+    assert event.flow_id == 3456789012
+    assert event.timestamp == 5.0
+
+
+def test_parse_event_line():
+    """Event lines carry their type; ids are optional"""
+    event = parse_conntrack_line(DESTROYED)
+    assert event.event == 'destroy'
+    assert event.protocol == 'udp'
+    assert (event.orig_bytes, event.reply_bytes) == (70, 120)
+    assert event.flow_id == 77
+    assert parse_conntrack_line(DESTROYED.replace(' id=77', '')).flow_id is None
+
+
+def test_parse_ignores_non_flow_lines():
+    """Summary lines and garbage are not flows"""
+    assert parse_conntrack_line("conntrack v1.4.6 (conntrack-tools): 12 flow entries have been shown.") is None
+    assert parse_conntrack_line("") is None
+    assert parse_conntrack_line("tcp 6 ESTABLISHED sport=1 dport=2") is None
+
+
+def test_flow_table_deltas():
+    """Each observation yields the growth since the previous one"""
+    table = FlowTable()
+    assert table.observe(flow(1000, 5000)).orig_bytes == 1000
+    delta = table.observe(flow(1500, 9000))
+    assert (delta.orig_bytes, delta.reply_bytes) == (500, 4000)
+    assert table.observe(flow(1500, 9000)).orig_bytes == 0
+    assert len(table) == 1
+
+
+def test_flow_table_counter_reset():
+    """Counters that went down restarted from zero: their value is the delta"""
+    table = FlowTable()
+    table.observe(flow(10000, 20000))
+    delta = table.observe(flow(300, 400))
+    assert (delta.orig_bytes, delta.reply_bytes) == (300, 400)
+    assert table.observe(flow(800, 400)).orig_bytes == 500
+
+
+def test_flow_table_destroy_and_reused_id():
+    """A destroyed flow is forgotten; flows with different ids are separate"""
+    table = FlowTable()
+    table.observe(flow(1000))
+    assert table.observe(flow(1200, event='destroy')).orig_bytes == 200
+    assert len(table) == 0
+    assert table.observe(flow(100)).orig_bytes == 100
+    assert table.observe(flow(50, flow_id=2)).orig_bytes == 50
+    assert len(table) == 2
+
+
+def test_flow_table_bounded():
+    """The least recently updated flows are dropped first"""
+    table = FlowTable(max_flows=2)
+    for flow_id in (1, 2, 3):
+        table.observe(flow(100, flow_id=flow_id))
+    assert len(table) == 2
+    # Flow 1 was dropped, so its next observation counts from zero
+    assert table.observe(flow(150, flow_id=1)).orig_bytes == 150
+    assert table.observe(flow(150, flow_id=3)).orig_bytes == 50
+
+
+def test_accountant_counts_clients_in_subnet():
+    """Deltas from the shared subnet are added to the client's totals"""
+    accountant = TrafficAccountant(subnet='192.168.137.0/24')
+    table = FlowTable()
+    accountant.process_event(table.observe(flow(1000, 4000)))
+    accountant.process_event(table.observe(flow(1500, 5000)))
+    remote = FlowEvent(event='update', protocol='tcp', src='10.0.0.1', dst='1.1.1.1', orig_bytes=99, timestamp=1000.0)
+    accountant.process_event(remote)
+    client = accountant.get_client('192.168.137.10')
+    assert (client['tx_bytes'], client['rx_bytes']) == (1500, 5000)
+    assert accountant.get_client('10.0.0.1') is None
@@ -0,0 +1,20 @@
+"""Accuracy and memory of the heavy-hitter tracker on a Zipf flow trace"""
+import math
+
+from fantasma_analytics import HeavyHitterTracker
+from fantasma_benchmark import FantasmaBenchmark
+
+
+def test_heavy_hitters_on_zipf_trace():
+    """Top-k recall, the epsilon * N error bound and fixed sketch memory"""
+    epsilon, delta = 0.005, 0.01
+    result = FantasmaBenchmark().benchmark_heavy_hitters(
+        flows=20000, clients=2000, capacity=64, epsilon=epsilon, k=10
+    )
+
+    assert result.recall >= 0.9
+    # Estimates are off by at most epsilon * N: relative error <= epsilon * N / count
+    assert result.max_error_bytes <= epsilon * result.total_bytes
+    # One window (the trace shares a timestamp): one Count-Min sketch per dimension
+    bound = len(HeavyHitterTracker.DIMENSIONS) * math.ceil(math.e / epsilon) * math.ceil(math.log(1 / delta)) * 8
+    assert result.sketch_bytes <= bound
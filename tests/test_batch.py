@@ -0,0 +1,122 @@
+"""Batch validation, $ref resolution and execution"""
+import pytest
+
+import fantasma_batch as batch
+from fantasma_batch import BatchError, Operation
+
+
+def fail(args):
+    raise BatchError('no such profile')
+
+
+OPERATIONS = {
+    'status': Operation(lambda args: {'state': 'idle', 'clients': [{'ip': '192.168.137.2'}]}),
+    'echo': Operation(lambda args: args),
+    'load': Operation(lambda args: {'profile': {'ssid': 'Home', 'a/b': 1, 'm~n': 2}}),
+    'fail': Operation(fail),
+    'start': Operation(lambda args: True, scope='control', mutating=True),
+    'keys': Operation(lambda args: [], scope='admin'),
+}
+
+
+def parse(*items):
+    return batch.parse({'operations': list(items)}, OPERATIONS)
+
+
+def test_parse_assigns_ids_by_position():
+    """Steps keep their order; ids default to the position"""
+    steps = parse({'op': 'status'}, {'op': 'echo', 'id': 'e', 'args': {'x': 1}})
+    assert steps == [{'id': '0', 'op': 'status', 'args': {}}, {'id': 'e', 'op': 'echo', 'args': {'x': 1}}]
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    [],
+    {'operations': []},
+    {'operations': 'status'},
+    {'operations': [{'op': 'nope'}]},
+    {'operations': [{'op': ['status']}]},
+    {'operations': [{'op': {'name': 'status'}}]},
+    {'operations': [{'args': {}}]},
+    {'operations': ['status']},
+    {'operations': [{'op': 'echo', 'args': [1]}]},
+    {'operations': [{'op': 'status', 'id': 'a'}, {'op': 'status', 'id': 'a'}]},
+    {'operations': [{'op': 'status', 'id': 'a/b'}]},
+    {'operations': [{'op': 'echo', 'args': {'x': {'$ref': 'later'}}}, {'op': 'status', 'id': 'later'}]},
+    {'operations': [{'op': 'echo', 'args': {'x': {'$ref': 0}}}]},
+    {'operations': [{'op': 'status'}] * 51},
+])
+def test_invalid_batches_raise_batch_error(body):
+    """Malformed bodies are rejected as a whole with BatchError, never another exception"""
+    with pytest.raises(BatchError):
+        batch.parse(body, OPERATIONS)
+
+
+def test_reference_to_itself_is_rejected():
+    """A step can only reference steps before it"""
+    with pytest.raises(BatchError):
+        parse({'op': 'echo', 'id': 'self', 'args': {'x': {'$ref': 'self'}}})
+
+
+def test_scope_and_mutation():
+    """The batch needs the broadest scope of its steps"""
+    steps = parse({'op': 'status'}, {'op': 'start'})
+    assert batch.required_scope(steps, OPERATIONS) == 'control'
+    assert batch.is_mutating(steps, OPERATIONS)
+    steps = parse({'op': 'keys'}, {'op': 'status'})
+    assert batch.required_scope(steps, OPERATIONS) == 'admin'
+    assert not batch.is_mutating(steps, OPERATIONS)
+
+
+def test_resolve_pointers():
+    """A $ref names a step and an optional JSON pointer into its result"""
+    results = {'load': {'profile': {'ssid': 'Home', 'a/b': 1, 'm~n': 2}}, 's': {'clients': [{'ip': 'x'}]}}
+    value = {
+        'whole': {'$ref': 'load'},
+        'ssid': {'$ref': 'load/profile/ssid'},
+        'escaped': [{'$ref': 'load/profile/a~1b'}, {'$ref': 'load/profile/m~0n'}],
+        'index': {'$ref': 's/clients/0/ip'},
+        'plain': {'$ref': 'load', 'other': 1},
+    }
+    assert batch.resolve(value, results) == {
+        'whole': results['load'],
+        'ssid': 'Home',
+        'escaped': [1, 2],
+        'index': 'x',
+        'plain': {'$ref': 'load', 'other': 1},
+    }
+
+
+@pytest.mark.parametrize('ref', ['missing', 'load/profile/none', 's/clients/5', 's/clients/first', 'load/profile/ssid/deeper'])
+def test_resolve_missing_targets(ref):
+    """A pointer that leads nowhere is a BatchError"""
+    results = {'load': {'profile': {'ssid': 'Home'}}, 's': {'clients': [{'ip': 'x'}]}}
+    with pytest.raises(BatchError):
+        batch.resolve({'$ref': ref}, results)
+
+
+def test_run_passes_results_along():
+    """Later steps receive earlier results through $ref"""
+    steps = parse({'op': 'load', 'id': 'p'}, {'op': 'echo', 'args': {'ssid': {'$ref': 'p/profile/ssid'}}})
+    report = batch.run(steps, OPERATIONS)
+    assert report['success']
+    assert report['results'][1] == {'id': '1', 'op': 'echo', 'status': 'ok', 'result': {'ssid': 'Home'}}
+
+
+def test_run_stops_at_first_failure():
+    """By default the steps after a failure are skipped"""
+    steps = parse({'op': 'status'}, {'op': 'fail'}, {'op': 'status'})
+    report = batch.run(steps, OPERATIONS)
+    assert not report['success']
+    assert [entry['status'] for entry in report['results']] == ['ok', 'error', 'skipped']
+    assert report['results'][1]['error'] == 'no such profile'
+
+    report = batch.run(steps, OPERATIONS, stop_on_error=False)
+    assert [entry['status'] for entry in report['results']] == ['ok', 'error', 'ok']
+
+
+def test_ref_to_failed_step_fails_the_step():
+    """A step referencing a failed one has no result to use"""
+    steps = parse({'op': 'fail', 'id': 'f'}, {'op': 'echo', 'args': {'x': {'$ref': 'f'}}})
+    report = batch.run(steps, OPERATIONS, stop_on_error=False)
+    assert [entry['status'] for entry in report['results']] == ['error', 'error']
@@ -0,0 +1,157 @@
+"""ProbeCache TTLs, singleflight loading and invalidation"""
+import threading
+import time
+
+import pytest
+
+import fantasma_cache
+from fantasma_cache import ProbeCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fantasma_cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_value_kept_for_ttl(clock):
+    """A fresh entry is served without probing; an expired one probes again"""
+    cache = ProbeCache({'status': 2.0})
+    calls = []
+    loader = lambda: calls.append(1) or len(calls)
+    assert cache.get('status', loader) == 1
+    clock.now += 1.9
+    assert cache.get('status', loader) == 1
+    clock.now += 0.2
+    assert cache.get('status', loader) == 2
+    stats = cache.get_stats()['status']
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_unlisted_keys_use_default_ttl(clock):
+    """default_ttl 0 disables caching for keys without a TTL"""
+    cache = ProbeCache({'status': 5.0})
+    calls = []
+    for _ in range(3):
+        cache.get('interfaces', lambda: calls.append(1))
+    assert len(calls) == 3
+
+
+def test_invalidate_drops_entry_and_moves_version(clock):
+    """Invalidation forces a probe and changes the version"""
+    cache = ProbeCache({'status': 60.0})
+    cache.get('status', lambda: 'a')
+    version = cache.version('status')
+    cache.invalidate('status')
+    assert cache.version('status') != version
+    assert cache.get('status', lambda: 'b') == 'b'
+
+
+def test_version_moves_only_when_value_changes(clock):
+    """A reload returning the same value keeps the version"""
+    cache = ProbeCache({'status': 1.0})
+    cache.get('status', lambda: 'same')
+    version = cache.version('status')
+    clock.now += 2
+    cache.get('status', lambda: 'same')
+    assert cache.version('status') == version
+    clock.now += 2
+    cache.get('status', lambda: 'changed')
+    assert cache.version('status') == version + 1
+
+
+def test_concurrent_misses_share_one_load():
+    """Callers arriving while a probe runs wait for its result"""
+    cache = ProbeCache({'status': 60.0})
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'probed'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get('status', loader)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get('status', loader))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    # Followers block on the flight until the leader finishes
+    while cache.get_stats()['status']['coalesced'] < 5:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == ['probed'] * 6
+    assert len(calls) == 1
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    """An exception is raised in the leader and the waiters; the next get retries"""
+    cache = ProbeCache({'status': 60.0})
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise OSError('probe failed')
+
+    errors = []
+
+    def call():
+        try:
+            cache.get('status', failing)
+        except OSError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while cache.get_stats()['status']['coalesced'] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert errors == ['probe failed', 'probe failed']
+    assert cache.get('status', lambda: 'ok') == 'ok'
+
+
+def test_invalidation_during_load_is_not_cached(clock):
+    """A result an invalidation raced with is returned but not kept"""
+    cache = ProbeCache({'status': 60.0})
+
+    def loader():
+        cache.invalidate('status')
+        return 'stale'
+
+    assert cache.get('status', loader) == 'stale'
+    assert cache.get('status', lambda: 'fresh') == 'fresh'
+
+
+def test_lookup_and_store(clock):
+    """The asyncio path: lookup misses, store caches unless invalidated since"""
+    cache = ProbeCache({'status': 60.0})
+    hit, generation = cache.lookup('status')
+    assert not hit
+    cache.store('status', 'loaded', generation)
+    assert cache.lookup('status') == (True, 'loaded')
+
+    cache.invalidate('status')
+    hit, generation = cache.lookup('status')
+    cache.invalidate('status')
+    cache.store('status', 'raced', generation)
+    assert cache.lookup('status')[0] is False
@@ -0,0 +1,111 @@
+"""Coalescing of queued start/stop operations in FantasmaCore"""
+import threading
+import time
+
+from fantasma_core import (
+    ConnectionType, FantasmaConfig, FantasmaCore, NetworkInterface, NetworkMode,
+    PlatformAdapter, SessionState
+)
+
+
+class FakeAdapter(PlatformAdapter):
+    """Records adapter calls; start_bridge waits for release when gated"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        self.gate = None
+        self.entered = threading.Event()
+
+    def detect_interfaces(self):
+        return []
+
+    def start_hotspot(self, config):
+        self.calls.append(('start', config.target_interface.name))
+        return True
+
+    def start_bridge(self, config):
+        self.calls.append(('start', config.target_interface.name))
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return True
+
+    def stop_sharing(self):
+        self.calls.append(('stop',))
+        return True
+
+    def get_status(self):
+        return {'platform': 'Fake'}
+
+    def is_supported(self):
+        return True
+
+
+def bridge(target='eth1'):
+    return FantasmaConfig(mode=NetworkMode.BRIDGE,
+                          source_interface=NetworkInterface('eth0', ConnectionType.ETHERNET),
+                          target_interface=NetworkInterface(target, ConnectionType.ETHERNET))
+
+
+def test_identical_requests_join_the_last_queued_operation():
+    """Repeated starts or stops share one operation; a different one queues anew"""
+    core = FantasmaCore(FakeAdapter())
+    first = core.enqueue('start', bridge(), core._adapter_start)
+    assert core.enqueue('start', bridge(), core._adapter_start) is first
+    assert first.waiters == 2
+    other = core.enqueue('start', bridge('eth2'), core._adapter_start)
+    assert other is not first
+    stop = core.enqueue('stop', None, core._adapter_stop)
+    assert core.enqueue('stop', None, core._adapter_stop) is stop
+    # Only the last queued operation is joined, not an earlier identical one
+    assert core.enqueue('start', bridge(), core._adapter_start) is not first
+    assert [operation['waiters'] for operation in core.get_state()['pending']] == [2, 1, 2, 1]
+
+
+def test_queued_operations_run_once_in_order():
+    """Draining runs each distinct operation once and releases every waiter"""
+    adapter = FakeAdapter()
+    core = FantasmaCore(adapter)
+    start = core.enqueue('start', bridge(), core._adapter_start)
+    core.enqueue('start', bridge(), core._adapter_start)
+    stop = core.enqueue('stop', None, core._adapter_stop)
+    core.enqueue('stop', None, core._adapter_stop)
+    core.drain()
+    assert adapter.calls == [('start', 'eth1'), ('stop',)]
+    assert start.done.is_set() and start.result
+    assert stop.done.is_set() and stop.result
+    assert core.state == SessionState.IDLE
+    assert core.get_state()['pending'] == []
+
+
+def test_start_during_identical_start_joins_it():
+    """A caller arriving while the same start runs waits for its result"""
+    adapter = FakeAdapter()
+    adapter.gate = threading.Event()
+    core = FantasmaCore(adapter)
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(core.start(bridge())))]
+    callers[0].start()
+    assert adapter.entered.wait(5)
+    callers.append(threading.Thread(target=lambda: results.append(core.start(bridge()))))
+    callers[1].start()
+    deadline = time.time() + 5
+    while core.get_state()['pending'][0]['waiters'] < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    adapter.gate.set()
+    for caller in callers:
+        caller.join(5)
+    assert results == [True, True]
+    assert adapter.calls == [('start', 'eth1')]
+    assert core.state == SessionState.ACTIVE
+
+
+def test_start_while_active_is_rejected():
+    """A second start after the first finished is a new operation and fails"""
+    adapter = FakeAdapter()
+    core = FantasmaCore(adapter)
+    assert core.start(bridge())
+    assert not core.start(bridge())
+    assert core.stop()
+    assert adapter.calls == [('start', 'eth1'), ('stop',)]
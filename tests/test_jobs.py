@@ -0,0 +1,104 @@
+"""JobManager results, idempotency keys and retention"""
+import threading
+
+import pytest
+
+from fantasma_jobs import (
+    JOB_FAILED, JOB_SUCCEEDED, IdempotencyConflict, JobFailed, JobManager
+)
+
+
+def test_job_result_and_events():
+    """A truthy result succeeds; progress is recorded in order"""
+    jobs = JobManager()
+
+    def target(job):
+        job.progress('step', 'halfway')
+        return {'ok': True}
+
+    job, created = jobs.submit('start', target)
+    assert created
+    assert job.wait(5)
+    assert job.status == JOB_SUCCEEDED
+    assert job.result == {'ok': True}
+    assert [event['step'] for event in job.events] == ['queued', 'running', 'step', 'succeeded']
+    assert [event['seq'] for event in job.events] == [1, 2, 3, 4]
+
+
+def test_failures():
+    """A falsy result, JobFailed (keeping its result) and exceptions fail the job"""
+    jobs = JobManager()
+    falsy, _ = jobs.submit('stop', lambda job: False)
+    raised, _ = jobs.submit('stop', lambda job: 1 / 0)
+
+    def partial(job):
+        raise JobFailed('second step failed', result=[1])
+
+    failed, _ = jobs.submit('batch', partial)
+    for job in (falsy, raised, failed):
+        assert job.wait(5)
+        assert job.status == JOB_FAILED
+    assert falsy.error == 'stop failed'
+    assert 'division' in raised.error
+    assert (failed.error, failed.result) == ('second step failed', [1])
+
+
+def test_idempotency_key_attaches_to_existing_job():
+    """A repeated key returns the first job instead of running the target again"""
+    jobs = JobManager()
+    release = threading.Event()
+    calls = []
+
+    def target(job):
+        calls.append(1)
+        release.wait(5)
+        return True
+
+    first, created = jobs.submit('start', target, idempotency_key='k1')
+    again, created_again = jobs.submit('start', target, idempotency_key='k1')
+    assert created and not created_again
+    assert again is first
+    release.set()
+    assert first.wait(5)
+    # Still attached once the job has finished
+    assert jobs.submit('start', target, idempotency_key='k1')[0] is first
+    assert len(calls) == 1
+
+
+def test_idempotency_key_of_another_kind_conflicts():
+    """Reusing a key for a different kind of job is refused"""
+    jobs = JobManager()
+    jobs.submit('start', lambda job: True, idempotency_key='k1')
+    with pytest.raises(IdempotencyConflict):
+        jobs.submit('stop', lambda job: True, idempotency_key='k1')
+
+
+def test_idempotency_key_expires():
+    """After idempotency_ttl a key starts a new job"""
+    jobs = JobManager(idempotency_ttl=60.0)
+    first, _ = jobs.submit('start', lambda job: True, idempotency_key='k1')
+    first.wait(5)
+    first.created_at -= 61.0
+    second, created = jobs.submit('start', lambda job: True, idempotency_key='k1')
+    assert created and second is not first
+    # The expired key no longer conflicts with other kinds either
+    first_stop, _ = jobs.submit('stop', lambda job: True, idempotency_key='k2')
+    first_stop.created_at -= 61.0
+    assert jobs.submit('start', lambda job: True, idempotency_key='k2')[1]
+
+
+def test_finished_jobs_trimmed_running_kept():
+    """Only finished jobs are dropped beyond max_jobs, oldest first"""
+    jobs = JobManager(max_jobs=2)
+    release = threading.Event()
+    running, _ = jobs.submit('start', lambda job: release.wait(5))
+    finished = []
+    for _ in range(3):
+        job, _ = jobs.submit('stop', lambda job: True)
+        job.wait(5)
+        finished.append(job)
+    jobs.submit('stop', lambda job: True)[0].wait(5)
+    assert jobs.get(running.id) is running
+    assert jobs.get(finished[0].id) is None
+    release.set()
+    assert jobs.drain(5)
@@ -0,0 +1,111 @@
+"""SessionJournal replay, torn tails and compaction"""
+import json
+import os
+import subprocess
+
+from fantasma_journal import SessionJournal
+
+
+CONFIG = {'mode': 'bridge', 'source_interface': 'eth0', 'target_interface': 'eth1'}
+
+
+def dead_pid():
+    """The pid of a process that has exited"""
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def begin(journal, session='default', pid=None):
+    journal.append(session, 'begin', kind='start', config=CONFIG, pid=pid or dead_pid())
+
+
+def test_replay_open_sessions(tmp_path):
+    """A reopened journal reports begun sessions with their steps, ended ones not at all"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path)
+    begin(journal)
+    journal.append('default', 'step', kind='address', interface='eth1', address='192.168.137.1/24')
+    journal.record('default', 'state', state='active')
+    begin(journal, 'guest')
+    journal.record('guest', 'end')
+    journal.close()
+
+    sessions = SessionJournal(path).open_sessions()
+    assert list(sessions) == ['default']
+    record = sessions['default']
+    assert (record['state'], record['kind'], record['config']) == ('active', 'start', CONFIG)
+    assert record['steps'] == [{'kind': 'address', 'interface': 'eth1', 'address': '192.168.137.1/24'}]
+
+
+def test_torn_tail_is_skipped_and_later_entries_survive(tmp_path):
+    """A line cut short by a crash is dropped without losing what is written after it"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path)
+    begin(journal)
+    journal.record('default', 'step', kind='sysctl', name='ip_forward', previous='0')
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"seq":3,"ts":1.0,"session":"default","op":"st')
+
+    journal = SessionJournal(path)
+    assert len(journal.open_sessions()['default']['steps']) == 1
+    journal.record('default', 'state', state='active')
+    journal.close()
+
+    reopened = SessionJournal(path).open_sessions()['default']
+    assert reopened['state'] == 'active'
+    assert len(reopened['steps']) == 1
+
+
+def test_sequence_numbers_continue_after_reopen(tmp_path):
+    """Entries keep increasing sequence numbers across processes"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path)
+    begin(journal)
+    journal.close()
+    assert SessionJournal(path).append('default', 'state', state='active') == 2
+
+
+def test_compaction_keeps_only_live_sessions(tmp_path):
+    """Ended sessions are dropped from the file; live ones replay the same"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path)
+    for index in range(20):
+        begin(journal, f's{index}')
+        journal.append(f's{index}', 'step', kind='bridge', name=f'br{index}')
+        journal.append(f's{index}', 'end')
+    begin(journal, 'default')
+    journal.record('default', 'state', state='standby')
+    before = journal.open_sessions()
+    size = os.path.getsize(path)
+
+    assert journal.compact()
+    assert os.path.getsize(path) < size
+    with open(path) as f:
+        assert {json.loads(line)['session'] for line in f} == {'default'}
+    journal.append('default', 'step', kind='nat', chain='FANTASMA')
+    journal.close()
+
+    after = SessionJournal(path).open_sessions()
+    assert after['default']['state'] == before['default']['state'] == 'standby'
+    assert after['default']['steps'] == [{'kind': 'nat', 'chain': 'FANTASMA'}]
+
+
+def test_compaction_waits_for_live_owners(tmp_path):
+    """A session owned by another live process keeps the file as it is"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path)
+    begin(journal, pid=os.getppid())
+    assert not journal.compact()
+
+
+def test_end_past_max_bytes_compacts(tmp_path):
+    """Ending a session compacts once the file exceeds max_bytes"""
+    path = str(tmp_path / 'journal')
+    journal = SessionJournal(path, max_bytes=2048)
+    for index in range(30):
+        begin(journal, f's{index}')
+        journal.append(f's{index}', 'end')
+    assert os.path.getsize(path) <= 2048
+    assert journal.open_sessions() == {}
@@ -0,0 +1,101 @@
+"""Token-bucket rate limiting and Retry-After"""
+import math
+
+import pytest
+from flask import Flask, jsonify
+
+import fantasma_api
+from fantasma_api import RateLimiter, rate_limit
+
+
+class FakeRequest:
+    def __init__(self, remote_addr='10.0.0.1', api_key=''):
+        self.remote_addr = remote_addr
+        self.headers = {'X-API-Key': api_key} if api_key else {}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fantasma_api.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_up_to_limit_then_retry_after(clock):
+    """A full bucket allows limit requests; the next one waits for one token"""
+    limiter = RateLimiter(requests_per_minute=6)
+    request = FakeRequest()
+    for expected_remaining in range(5, -1, -1):
+        allowed, limit, remaining, retry_after = limiter.check(request)
+        assert (allowed, limit, remaining, retry_after) == (True, 6, expected_remaining, 0.0)
+    allowed, _, remaining, retry_after = limiter.check(request)
+    assert not allowed and remaining == 0
+    # 6 per minute: one token every 10 seconds
+    assert retry_after == pytest.approx(10.0)
+
+
+def test_retry_after_shrinks_as_tokens_refill(clock):
+    """Retry-After is the time to the next whole token, and waiting it is enough"""
+    limiter = RateLimiter(requests_per_minute=6)
+    request = FakeRequest()
+    for _ in range(6):
+        limiter.check(request)
+    clock.now += 4.0
+    allowed, _, _, retry_after = limiter.check(request)
+    assert not allowed
+    assert retry_after == pytest.approx(6.0)
+    clock.now += retry_after
+    assert limiter.check(request)[0]
+
+
+def test_clients_have_separate_buckets(clock):
+    """Buckets are per API key, else per address"""
+    limiter = RateLimiter(requests_per_minute=1)
+    assert limiter.check(FakeRequest('10.0.0.1'))[0]
+    assert not limiter.check(FakeRequest('10.0.0.1'))[0]
+    assert limiter.check(FakeRequest('10.0.0.2'))[0]
+    assert limiter.check(FakeRequest('10.0.0.1', api_key='fw_other'))[0]
+
+
+def test_idle_full_buckets_are_evicted(clock):
+    """Buckets that refilled completely are dropped, and the client count is capped"""
+    limiter = RateLimiter(requests_per_minute=60, max_clients=2)
+    for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        limiter.check(FakeRequest(address))
+    assert limiter.get_stats()['clients'] == 2
+    clock.now += 61.0
+    limiter.check(FakeRequest('10.0.0.4'))
+    assert limiter.get_stats()['clients'] == 1
+
+
+def test_decorator_answers_429_with_whole_seconds(clock, monkeypatch):
+    """The Retry-After header rounds up, so a client retrying then gets through"""
+    limiter = RateLimiter(requests_per_minute=7)
+    monkeypatch.setattr(fantasma_api, 'rate_limiter', limiter)
+    app = Flask(__name__)
+
+    @app.route('/limited')
+    @rate_limit
+    def limited():
+        return jsonify({'ok': True})
+
+    client = app.test_client()
+    for _ in range(7):
+        assert client.get('/limited').status_code == 200
+    response = client.get('/limited')
+    assert response.status_code == 429
+    seconds = int(response.headers['Retry-After'])
+    assert seconds == math.ceil(60 / 7)
+    assert response.get_json()['retry_after'] == seconds
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+    clock.now += seconds
+    assert client.get('/limited').status_code == 200
+
@@ -0,0 +1,85 @@
+"""JSON Patch diff/apply_patch round trips"""
+import copy
+import json
+import random
+
+import pytest
+
+from fantasma_topics import apply_patch, diff
+
+
+CASES = [
+    ({}, {}),
+    (None, {'state': 'idle'}),
+    ({'state': 'idle'}, None),
+    ({'state': 'idle', 'config': None}, {'state': 'active', 'config': {'mode': 'bridge'}}),
+    ({'a': {'b': {'c': 1, 'd': 2}}}, {'a': {'b': {'c': 1}}, 'e': [1, 2]}),
+    ({'clients': [{'ip': '192.168.137.2'}]}, {'clients': [{'ip': '192.168.137.2'}, {'ip': '192.168.137.3'}]}),
+    ({'list': [1, 2, 3]}, {'list': {'now': 'a dict'}}),
+    ({'odd/key': 1, 'tilde~key': 2, '~1': 3}, {'odd/key': 2, 'tilde~key': 3, '~01': 4}),
+    ({'x': 1}, [1, 2]),
+    ({'rate': 1.5, 'flag': True}, {'rate': 2.5, 'flag': False, 'none': None}),
+]
+
+
+@pytest.mark.parametrize('old,new', CASES)
+def test_round_trip(old, new):
+    """Applying diff(old, new) to a copy of old gives new"""
+    ops = diff(old, new)
+    assert apply_patch(copy.deepcopy(old), ops) == new
+    # Deltas go over the wire as JSON
+    assert json.loads(json.dumps(ops)) == ops
+
+
+def test_equal_values_give_no_operations():
+    """Nothing changed, nothing sent"""
+    value = {'status': {'state': 'active', 'clients': [1, 2]}}
+    assert diff(value, copy.deepcopy(value)) == []
+
+
+def test_only_changed_keys_are_sent():
+    """Unchanged siblings are left out of the patch"""
+    old = {'status': {'state': 'idle', 'platform': 'Linux'}, 'uptime': 5}
+    new = {'status': {'state': 'active', 'platform': 'Linux'}, 'uptime': 5}
+    assert diff(old, new) == [{'op': 'replace', 'path': '/status/state', 'value': 'active'}]
+
+
+def test_keys_are_escaped():
+    """'/' and '~' in keys use the JSON Pointer escapes"""
+    assert diff({}, {'a/b~c': 1}) == [{'op': 'add', 'path': '/a~1b~0c', 'value': 1}]
+
+
+def test_list_operations_from_the_publisher():
+    """Appends with '-' and removals by index, as the logs topic sends them"""
+    value = {'lines': [{'message': 'one'}]}
+    ops = [
+        {'op': 'add', 'path': '/lines/-', 'value': {'message': 'two'}},
+        {'op': 'add', 'path': '/lines/-', 'value': {'message': 'three'}},
+        {'op': 'remove', 'path': '/lines/0'},
+        {'op': 'replace', 'path': '/lines/1/message', 'value': 'THREE'},
+        {'op': 'add', 'path': '/lines/0', 'value': {'message': 'zero'}},
+    ]
+    assert apply_patch(value, ops) == {'lines': [{'message': 'zero'}, {'message': 'two'}, {'message': 'THREE'}]}
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(6 if depth < 3 else 4)
+    if kind == 0:
+        return rng.randrange(5)
+    if kind == 1:
+        return rng.choice(['a', 'b', 'x/y', 'm~n'])
+    if kind == 2:
+        return rng.choice([None, True, False])
+    if kind == 3:
+        return rng.random()
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(3))]
+    return {rng.choice(['k', 'l', 'a/b', '~', 'z']): random_value(rng, depth + 1) for _ in range(rng.randrange(4))}
+
+
+def test_random_round_trips():
+    """Round trips hold for random nested values"""
+    rng = random.Random(7)
+    for _ in range(500):
+        old, new = random_value(rng), random_value(rng)
+        assert apply_patch(copy.deepcopy(old), diff(old, new)) == new